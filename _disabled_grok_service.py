@@ -1,6 +1,7 @@
 import requests
 import logging  # Убрать import json - он не используется
 from config import Config
+from llm_http_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -41,20 +42,19 @@ class GrokService:
             }
 
             logger.info(f"Sending request to Grok API with model: {self.model}")
-            response = requests.post(
+            with get_llm_client('grok').post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
                 timeout=120
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                logger.info("Successfully received response from Grok API")
-                return result['choices'][0]['message']['content']
-            else:
-                logger.error(f"Grok API error: {response.status_code} - {response.text}")
-                return f"ОШИБКА: Grok API вернул код {response.status_code}"
+            ) as response:
+                if response.status_code == 200:
+                    result = response.json()
+                    logger.info("Successfully received response from Grok API")
+                    return result['choices'][0]['message']['content']
+                else:
+                    logger.error(f"Grok API error: {response.status_code} - {response.text}")
+                    return f"ОШИБКА: Grok API вернул код {response.status_code}"
 
         except requests.exceptions.Timeout:
             logger.error("Grok API timeout")
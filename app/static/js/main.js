@@ -163,17 +163,28 @@ class PDFSurge {
         });
 
         try {
-            const response = await fetch('/upload', {
+            // Задача ставится в очередь, обработка идет в фоновом воркере
+            const response = await fetch('/jobs', {
                 method: 'POST',
                 body: formData
             });
 
             const data = await response.json();
 
-            if (response.ok) {
-                this.showReport(data.report);
-            } else {
+            if (!response.ok) {
                 this.showError(data.error || 'Произошла ошибка при обработке файлов');
+                return;
+            }
+
+            // Отчет показываем по мере генерации; без SSE - опрос статуса
+            const job = window.EventSource
+                ? await this.streamJob(data.events_url)
+                : await this.waitForJob(data.status_url);
+
+            if (job.status === 'done') {
+                this.showReport(job.result.report);
+            } else {
+                this.showError(job.error || 'Произошла ошибка при обработке файлов');
             }
         } catch (error) {
             this.showError('Ошибка соединения: ' + error.message);
@@ -182,6 +193,63 @@ class PDFSurge {
         }
     }
 
+    streamJob(eventsUrl) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(eventsUrl);
+            let report = '';
+
+            source.addEventListener('status', (e) => {
+                const data = JSON.parse(e.data);
+                this.setLoadingText(data.stage === 'generating'
+                    ? 'Формирование отчета...'
+                    : 'Обработка документов...');
+            });
+
+            source.addEventListener('reset', () => {
+                // Задача перезапущена: отчет генерируется заново
+                report = '';
+                this.reportText.value = '';
+            });
+
+            source.addEventListener('chunk', (e) => {
+                report += JSON.parse(e.data).text;
+                this.showReport(report);
+            });
+
+            source.addEventListener('done', (e) => {
+                source.close();
+                resolve({status: 'done', result: JSON.parse(e.data)});
+            });
+
+            source.addEventListener('error', (e) => {
+                if (e.data) {
+                    source.close();
+                    resolve({status: 'failed', error: JSON.parse(e.data).error});
+                } else if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('соединение с сервером прервано'));
+                }
+                // Иначе сервер закрыл поток по времени: EventSource переподключится
+                // сам и продолжит отчет с Last-Event-ID
+            });
+        });
+    }
+
+    async waitForJob(statusUrl) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+
+            if (!response.ok) {
+                throw new Error(job.error || 'Задача не найдена');
+            }
+            if (job.status === 'done' || job.status === 'failed') {
+                return job;
+            }
+        }
+    }
+
     showReport(report) {
         this.reportText.value = report;
         this.reportText.placeholder = '';
@@ -229,6 +297,11 @@ class PDFSurge {
     hideLoading() {
         this.loading.style.display = 'none';
         this.processBtn.disabled = false;
+        this.setLoadingText('Обработка документов...');
+    }
+
+    setLoadingText(text) {
+        this.loading.querySelector('p').textContent = text;
     }
 
     showError(message) {
@@ -0,0 +1,61 @@
+"""Сравнение движков OCR: pytesseract (процесс на страницу) и tesserocr.
+
+Запуск из корня проекта:
+    python benchmarks/bench_ocr_backends.py --pages 20 --lang rus+eng
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_backends import PytesseractBackend, TesserocrBackend, find_tessdata_path  # noqa: E402
+
+
+def make_page(seed, width=1240, height=1754):
+    """Синтетическая страница с несколькими строками текста"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width), 255, dtype=np.uint8)
+    y = 120
+    while y < height - 120:
+        words = ' '.join(f"word{rng.integers(0, 1000)}" for _ in range(6))
+        cv2.putText(image, words, (80, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+        y += 60
+    return image
+
+
+def bench(backend, pages, lang):
+    timings = []
+    for image in pages:
+        start = time.perf_counter()
+        backend.image_to_string(image, lang=lang, psm=6)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    pages = [make_page(i) for i in range(args.pages)]
+    backends = [PytesseractBackend()]
+    try:
+        backends.append(TesserocrBackend(find_tessdata_path()))
+    except Exception as e:
+        print(f"tesserocr backend unavailable: {e}")
+
+    for backend in backends:
+        timings = bench(backend, pages, args.lang)
+        first, rest = timings[0], timings[1:] or timings
+        print(f"{backend.name:12s} first page {first * 1000:8.1f} ms, "
+              f"mean {np.mean(rest) * 1000:8.1f} ms/page, total {sum(timings):6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
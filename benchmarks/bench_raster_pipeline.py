@@ -0,0 +1,97 @@
+"""Растровый конвейер страницы: PNG-путь (до) и numpy-путь (после).
+
+До: пиксмап RGB -> PNG -> cv2.imdecode -> дескьюинг -> PNG -> PIL.
+После: пиксмап в градациях серого -> numpy -> дескьюинг -> numpy.
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS
+(ru_maxrss) не смешивался. OCR не вызывается - измеряется только
+подготовка изображения.
+
+Запуск из корня проекта:
+    python benchmarks/bench_raster_pipeline.py --pages 30
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deskew_processor import DeskewProcessor  # noqa: E402
+
+
+def make_document(pages, angle=2.0):
+    """PDF из повернутых синтетических сканов (одна картинка на страницу)"""
+    doc = fitz.open()
+    for i in range(pages):
+        rng = np.random.default_rng(i)
+        image = np.full((1754, 1240), 255, dtype=np.uint8)
+        for y in range(120, 1634, 60):
+            words = ' '.join(f"word{rng.integers(0, 1000)}" for _ in range(6))
+            cv2.putText(image, words, (80, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+        rotation = cv2.getRotationMatrix2D((620, 877), angle, 1.0)
+        image = cv2.warpAffine(image, rotation, (1240, 1754), borderValue=255)
+        _, png = cv2.imencode('.png', image)
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=png.tobytes())
+    return doc.tobytes()
+
+
+def legacy_pipeline(deskew, page):
+    """Прежний путь с двумя PNG-кодированиями"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))
+    image = cv2.imdecode(np.frombuffer(pix.tobytes("png"), np.uint8), cv2.IMREAD_COLOR)
+    angle = deskew.detect_skew_angle(image)
+    rotated = deskew.rotate_image(image, -angle)
+    _, buffer = cv2.imencode('.png', rotated)
+    result = Image.open(io.BytesIO(buffer))
+    result.load()
+    return result
+
+
+def array_pipeline(deskew, page):
+    image, _ = deskew.deskew_image(deskew.render_page(page))
+    return image
+
+
+def run(args):
+    name, data = args
+    pipeline = legacy_pipeline if name == 'png' else array_pipeline
+    deskew = DeskewProcessor()
+    doc = fitz.open(stream=data, filetype='pdf')
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for page in doc:
+        start = time.perf_counter()
+        pipeline(deskew, page)
+        timings.append(time.perf_counter() - start)
+    doc.close()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return name, timings, max_rss, max_rss - baseline_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_document(args.pages)
+    ctx = multiprocessing.get_context('spawn')
+    for name in ('png', 'array'):
+        with ctx.Pool(1) as pool:
+            name, timings, max_rss, growth = pool.map(run, [(name, data)])[0]
+        print(f"{name:6s} mean {np.mean(timings) * 1000:7.1f} ms/page, "
+              f"p95 {np.percentile(timings, 95) * 1000:7.1f} ms, "
+              f"peak RSS {max_rss / 1024:6.1f} MB (+{growth / 1024:.1f} MB over baseline)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Время холодного старта: импорт приложения и готовность воркеров gunicorn.
+
+1. В чистом процессе импортируется main (create_app) - замеряется время
+   и проверяется, что тяжелые библиотеки (HEAVY_MODULES) не загружены.
+2. С --gunicorn запускается gunicorn и опрашиваются /health и /ready:
+   время до первого ответа 200 на каждый из них.
+
+Скрипт завершается с кодом 1, если импорт медленнее --budget секунд
+или тяжелые библиотеки загружаются при импорте, поэтому годится как
+проверка в CI.
+
+Запуск из корня проекта:
+    python benchmarks/bench_startup.py --runs 5 --budget 1.0
+    python benchmarks/bench_startup.py --gunicorn
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+from lazy_modules import HEAVY_MODULES
+loaded = [name for name in HEAVY_MODULES if type(sys.modules.get(name)).__name__ == 'module']
+print(json.dumps({'seconds': elapsed, 'loaded': loaded}))
+"""
+
+
+def measure_import(env):
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url, deadline):
+    until = time.monotonic() + deadline
+    while time.monotonic() < until:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_gunicorn(env, port, deadline=60):
+    env = dict(env, PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'main:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        health = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        health_at = time.perf_counter() - started
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        ready_at = time.perf_counter() - started
+        return (health_at if health else None), (ready_at if ready else None)
+    finally:
+        process.terminate()
+        process.wait(timeout=90)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0, help='max median import time, seconds')
+    parser.add_argument('--gunicorn', action='store_true', help='also measure gunicorn /health and /ready')
+    parser.add_argument('--port', type=int, default=8124)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ,
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+               JOB_DB_PATH=os.path.join(workdir, 'jobs.sqlite3'),
+               EXTRACTION_CACHE_DIR=os.path.join(workdir, 'extraction_cache'))
+
+    failed = False
+    results = [measure_import(env) for _ in range(args.runs)]
+    median = statistics.median(r['seconds'] for r in results)
+    loaded = sorted({name for r in results for name in r['loaded']})
+    print(f"import main: median {median * 1000:.0f} ms over {args.runs} runs "
+          f"(min {min(r['seconds'] for r in results) * 1000:.0f} ms)")
+    if loaded:
+        print(f"FAIL: heavy modules loaded at import: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget:
+        print(f"FAIL: import is slower than the {args.budget:.2f}s budget")
+        failed = True
+
+    if args.gunicorn:
+        health_at, ready_at = measure_gunicorn(env, args.port)
+        print(f"gunicorn: /health after {health_at if health_at is None else f'{health_at:.2f}s'}, "
+              f"/ready after {ready_at if ready_at is None else f'{ready_at:.2f}s'}")
+        if ready_at is None:
+            print("FAIL: workers did not become ready")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Пиковая память сборки текста комплекта: конкатенация строк и потоковая запись.
+
+До: text += по страницам, затем combined_text += и final_text += по документам.
+После: PDFProcessor.process_multiple_pdfs (PageRecord -> временный файл).
+
+Память считается через tracemalloc (только объекты Python), кэш
+извлечения отключен, все страницы текстовые (без OCR). Время потокового
+варианта включает постраничную классификацию гибридного извлечения.
+
+Запуск из корня проекта:
+    python benchmarks/bench_text_assembly.py --pages 1000 --documents 4
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['EXTRACTION_CACHE_ENABLED'] = 'false'
+
+from pdf_processor import PDFProcessor  # noqa: E402
+
+LINE = "Общий анализ крови: гемоглобин 128 г/л, эритроциты 4.2, лейкоциты 6.1, СОЭ 12 мм/ч."
+
+
+def make_documents(directory, documents, pages):
+    paths = []
+    for d in range(documents):
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (40, 40, -40, -40), "\n".join([LINE] * 40),
+                                fontsize=9, fontname='cour')
+        path = os.path.join(directory, f"bundle_{d + 1}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def legacy_assembly(paths):
+    """Прежняя сборка через повторную конкатенацию"""
+    combined_text = ""
+    for i, path in enumerate(paths, 1):
+        doc = fitz.open(path)
+        text = ""
+        for page_num in range(doc.page_count):
+            page_text = doc[page_num].get_text()
+            if page_text.strip():
+                text += f"\n--- Страница {page_num + 1} ---\n{page_text}\n"
+        doc.close()
+        text = text.strip()
+        combined_text += f"\n\n{'=' * 60}\n"
+        combined_text += f"ДОКУМЕНТ {i}: {os.path.basename(path)}\n"
+        combined_text += f"{'=' * 60}\n\n"
+        combined_text += text
+    final_text = f"ОБЪЕДИНЕННЫЙ ТЕКСТ ИЗ {len(paths)} ДОКУМЕНТОВ\n"
+    final_text += combined_text
+    return final_text
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=250, help='страниц в документе')
+    parser.add_argument('--documents', type=int, default=4)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    processor = PDFProcessor()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_documents(directory, args.documents, args.pages)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('uploads', exist_ok=True)
+        try:
+            for name, func in (('concat', legacy_assembly), ('stream', processor.process_multiple_pdfs)):
+                characters, peak, elapsed = measure(func, paths)
+                print(f"{name:7s} {characters / 1e6:6.2f}M chars, peak {peak / 2 ** 20:7.1f} MB "
+                      f"({peak / max(characters, 1):4.1f} bytes/char), {elapsed:6.2f} s")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
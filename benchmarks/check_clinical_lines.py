@@ -0,0 +1,82 @@
+"""Проверка: краткие клинические строки не теряются при сжатии и фильтрации шума OCR.
+
+Записи ЭКГ из одних отведений и римских цифр ("S I Q III") по символам
+похожи на мусор распознавания. Они должны оставаться в сжатом тексте
+страницы с текстовым слоем и в тексте OCR даже при низкой уверенности
+слов, а неуверенные строки без них - выбрасываться. Значения анализов
+отдельной строкой в начале и конце страницы ("Креатинин" / "88") похожи
+на номера страниц и тоже должны оставаться, а настоящие номера страниц -
+удаляться.
+
+Запуск из корня проекта:
+    python benchmarks/check_clinical_lines.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_quality import OCRWord, drop_noise_lines, words_to_text  # noqa: E402
+from prompt_compaction import compact_text  # noqa: E402
+
+CLINICAL_LINES = [
+    "T(-) в I, II, aVL, V5, V6",
+    "ST ↓ в V4 V5 V6",
+    "S I Q III",
+    "ХСН II А ФК III",
+    "зубец Q в III, aVF",
+]
+TEXT_LINE = "Ритм синусовый, ЧСС 72 в мин"
+# Страницы бланка анализов: значения - отдельными строками в колонтитульной зоне
+LAB_PAGES = [
+    ["Лейкоциты", "6", "Тромбоциты", "250"],
+    ["Креатинин", "88"],
+    ["Глюкоза", "5,4", "Холестерин", "7"],
+]
+# Настоящие номера страниц: совпадают с номером страницы или повторяются шаблоном
+PAGE_NUMBER_PAGES = [[f"Выписка, лист {i}", "Диагноз уточняется", f"Стр. {i + 1} из 5"] for i in range(1, 5)]
+
+NOISE_LINES = ["ш ,' ~ i .", "| l : ; \\ ."]
+
+
+def ocr_words(lines):
+    """Слова OCR: строки (текст, уверенность) одного абзаца"""
+    return [OCRWord(text, conf, (10 * i, 20 * n, 10, 10), (1, 1, n))
+            for n, (line, conf) in enumerate(lines) for i, text in enumerate(line.split())]
+
+
+def main():
+    failures = []
+
+    text = "\n".join(["--- Страница 1 ---", "ЭКГ от 12.03.2024", TEXT_LINE] + CLINICAL_LINES)
+    compacted = compact_text(text).text
+    failures += [f"compaction dropped: {line}" for line in CLINICAL_LINES if line not in compacted]
+
+    text = "\n".join(f"--- Страница {i} ---\n" + "\n".join(lines) for i, lines in enumerate(LAB_PAGES, 1))
+    compacted = compact_text(text).text.splitlines()
+    failures += [f"compaction dropped lab value on page {i}: {line}"
+                 for i, lines in enumerate(LAB_PAGES, 1) for line in lines if line not in compacted]
+
+    text = "\n".join(f"--- Страница {i} ---\n" + "\n".join(lines)
+                     for i, lines in enumerate(PAGE_NUMBER_PAGES, 1))
+    compacted = compact_text(text).text
+    failures += [f"compaction kept page number: {lines[-1]}" for lines in PAGE_NUMBER_PAGES
+                 if lines[-1] in compacted]
+
+    # ЭКГ распознана неуверенно, обычный текст - уверенно, шум - неуверенно
+    lines = [(TEXT_LINE, 90)] + [(line, 20) for line in CLINICAL_LINES + NOISE_LINES]
+    words, dropped = drop_noise_lines(ocr_words(lines), threshold=30)
+    recognized = words_to_text(words).splitlines()
+    failures += [f"OCR noise filter dropped: {line}" for line in [TEXT_LINE] + CLINICAL_LINES
+                 if line not in recognized]
+    if dropped != len(NOISE_LINES):
+        failures.append(f"OCR noise filter dropped {dropped} lines, expected {len(NOISE_LINES)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Нагрузочный тест /upload: пропускная способность при росте числа одновременных загрузок.
+
+Каждый запрос отправляет уникальный синтетический скан (кэши извлечения
+и LLM не срабатывают, no_cache=1), поэтому измеряется полный путь:
+прием загрузки, рендеринг, дескьюинг и OCR в пуле процессов, вызов
+заглушки LLM. Для каждого уровня параллельности печатаются
+пропускная способность (запросов/мин, страниц/с) и задержки p50/p95.
+
+Запуск против уже работающего сервиса (заглушка LLM должна быть
+указана ему через YANDEX_GPT_URL):
+    python benchmarks/load_test_uploads.py --url http://127.0.0.1:8000
+
+Или со своим gunicorn и встроенной заглушкой LLM:
+    python benchmarks/load_test_uploads.py --spawn --levels 1 2 4 8 --pages 3
+    CPU_POOL_ENABLED=false python benchmarks/load_test_uploads.py --spawn  # потоковый пул для сравнения
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import fitz
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_llm_server import start_stub_server  # noqa: E402
+
+_counter = 0
+_counter_lock = threading.Lock()
+
+
+def make_scan(pages, seed, angle=1.5):
+    """Уникальный PDF из повернутых синтетических сканов без текстового слоя"""
+    doc = fitz.open()
+    rng = np.random.default_rng(seed)
+    for _ in range(pages):
+        image = np.full((1754, 1240), 255, dtype=np.uint8)
+        for y in range(120, 1634, 60):
+            words = ' '.join(f"word{rng.integers(0, 100000)}" for _ in range(6))
+            cv2.putText(image, words, (80, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+        rotation = cv2.getRotationMatrix2D((620, 877), angle, 1.0)
+        image = cv2.warpAffine(image, rotation, (1240, 1754), borderValue=255)
+        _, png = cv2.imencode('.png', image)
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=png.tobytes())
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def next_seed():
+    global _counter
+    with _counter_lock:
+        _counter += 1
+        return _counter
+
+
+def upload_once(base_url, pages, timeout):
+    """Одна загрузка; возвращает (длительность, HTTP-статус)"""
+    data = make_scan(pages, seed=next_seed() + int(time.time()))
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/upload", params={'no_cache': '1'},
+                             files={'files': ('scan.pdf', data, 'application/pdf')},
+                             timeout=timeout)
+    return time.perf_counter() - started, response.status_code
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_level(base_url, concurrency, requests_per_level, pages, timeout):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        futures = [executor.submit(upload_once, base_url, pages, timeout)
+                   for _ in range(requests_per_level)]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except requests.RequestException as e:
+                results.append((None, type(e).__name__))
+        wall = time.perf_counter() - started
+
+    latencies = [elapsed for elapsed, status in results if status == 200]
+    errors = len(results) - len(latencies)
+    return {
+        'concurrency': concurrency,
+        'ok': len(latencies),
+        'errors': errors,
+        'wall': wall,
+        'rpm': len(latencies) / wall * 60,
+        'pages_per_s': len(latencies) * pages / wall,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p95': percentile(latencies, 0.95) if latencies else float('nan'),
+    }
+
+
+def wait_ready(base_url, deadline=60):
+    until = time.monotonic() + deadline
+    while time.monotonic() < until:
+        try:
+            if requests.get(f"{base_url}/stats", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Service at {base_url} is not responding")
+
+
+def spawn_gunicorn(port, llm_url):
+    env = dict(os.environ,
+               PORT=str(port),
+               YANDEX_GPT_URL=llm_url,
+               YANDEX_GPT_API_KEY='stub',
+               YANDEX_FOLDER_ID='stub',
+               EXTRACTION_CACHE_ENABLED='false')
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'main:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn', action='store_true', help='start gunicorn and the stub LLM locally')
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=None,
+                        help='uploads per level (default: 2 x concurrency)')
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    server = process = None
+    base_url = args.url.rstrip('/')
+    if args.spawn:
+        server, llm_url = start_stub_server(chunk_delay=0.0)
+        process = spawn_gunicorn(args.port, llm_url)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_ready(base_url)
+        print(f"{'conc':>5} {'ok':>4} {'err':>4} {'req/min':>9} {'pages/s':>8} {'p50, s':>8} {'p95, s':>8}")
+        for concurrency in args.levels:
+            result = run_level(base_url, concurrency, args.requests or 2 * concurrency,
+                               args.pages, args.timeout)
+            print(f"{result['concurrency']:>5} {result['ok']:>4} {result['errors']:>4} "
+                  f"{result['rpm']:>9.1f} {result['pages_per_s']:>8.2f} "
+                  f"{result['p50']:>8.2f} {result['p95']:>8.2f}")
+        print(requests.get(f"{base_url}/stats", timeout=5).json().get('cpu_pool'))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=90)
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Набор бенчмарков извлечения текста на синтетическом корпусе.
+
+Для каждого документа корпуса (см. synthetic_corpus.py) в отдельном
+процессе, чтобы пиковый RSS не смешивался:
+  1. постраничное извлечение PDFProcessor.iter_pages: пропускная
+     способность, перцентили времени страницы, разбивка по этапам
+     (metrics.request_trace) и точность по методам извлечения -
+     сходство с эталонным текстом страницы (1 - доля отличий, difflib);
+  2. полный конвейер ReportPipeline.run с заглушкой LLM (stub_llm_server)
+     на копиях файлов: общее время и этапы, включая слияние и LLM.
+
+Кэши извлечения и ответов LLM выключены. Результат пишется в JSON
+(--output); --compare сравнивает его с прошлым прогоном.
+
+Запуск из корня проекта:
+    python benchmarks/run_benchmarks.py --quick --output bench.json
+    python benchmarks/run_benchmarks.py --only scan_ru --compare bench.json
+"""
+import argparse
+import difflib
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_llm_server import start_stub_server  # noqa: E402
+from benchmarks.synthetic_corpus import DEFAULT_CORPUS_DIR, ensure_corpus  # noqa: E402
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return WHITESPACE.sub(' ', text or '').strip()
+
+
+def similarity(expected, actual):
+    """Доля совпадающих символов (1.0 - текст извлечен без искажений)"""
+    expected, actual = normalize(expected), normalize(actual)
+    if not expected:
+        return 1.0 if not actual else 0.0
+    return difflib.SequenceMatcher(None, expected, actual, autojunk=False).ratio()
+
+
+def percentiles(values, points=(0.5, 0.95, 0.99)):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {f"p{int(p * 100)}": round(ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))], 4)
+            for p in points}
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса и его дочерних процессов (tesseract, пул OCR), МБ"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+
+def run_document(document, corpus_dir, pipeline, queue):
+    """Выполняется в отдельном процессе: замеры одного документа корпуса"""
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    from cpu_pool import get_cpu_pool
+    from metrics import request_trace
+    from pdf_processor import PDFProcessor
+    from report_pipeline import PipelineError, ReportPipeline
+    from yandex_gpt_service import YandexGPTService
+
+    processor = PDFProcessor()
+    processor.warm_up()
+
+    expected = {(page['file'], page['page']): page for page in document['pages']}
+    page_times = []
+    by_method = {}
+    by_kind = {}
+
+    started = time.perf_counter()
+    with request_trace() as trace:
+        for name in document['files']:
+            for record in processor.iter_pages(os.path.join(corpus_dir, name)):
+                page = expected.get((name, record.page_num))
+                if page is None:
+                    continue
+                page_times.append(sum(record.timings.values()))
+                score = similarity(page['text'], record.text)
+                by_method.setdefault(record.method, []).append(score)
+                by_kind.setdefault(page['kind'], []).append(score)
+    wall = time.perf_counter() - started
+    pages = len(page_times)
+
+    result = {
+        'pages': pages,
+        'wall_seconds': round(wall, 4),
+        'pages_per_second': round(pages / wall, 3) if wall else None,
+        'page_seconds': percentiles(page_times),
+        'stages': trace.summary()['stages'],
+        'accuracy': {
+            'overall': round(sum(sum(v) for v in by_kind.values()) / max(1, pages), 4),
+            'by_method': {method: {'pages': len(v), 'mean': round(sum(v) / len(v), 4)}
+                          for method, v in sorted(by_method.items())},
+            'by_kind': {kind: {'pages': len(v), 'mean': round(sum(v) / len(v), 4)}
+                        for kind, v in sorted(by_kind.items())},
+        },
+    }
+
+    if pipeline:
+        # Конвейер удаляет загруженные файлы, поэтому работает с копиями
+        workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+        copies = []
+        for name in document['files']:
+            copies.append(shutil.copy(os.path.join(corpus_dir, name), workdir))
+        report_pipeline = ReportPipeline(processor, YandexGPTService(), workdir)
+        started = time.perf_counter()
+        with request_trace() as trace:
+            try:
+                response = report_pipeline.run(copies, 'bench', use_cache=False)
+                error = None
+            except PipelineError as e:
+                response, error = {}, e.message
+        result['pipeline'] = {
+            'wall_seconds': round(time.perf_counter() - started, 4),
+            'characters': response.get('total_characters'),
+            'error': error,
+            'stages': trace.summary()['stages'],
+        }
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Процессы пула нужно остановить явно: при выходе дочерний процесс
+    # multiprocessing ждет их раньше, чем сработает atexit executor'а
+    cpu_pool = get_cpu_pool()
+    if cpu_pool is not None:
+        cpu_pool.executor.shutdown()
+    result['peak_rss_mb'], result['children_peak_rss_mb'] = peak_rss_mb()
+    queue.put(result)
+
+
+def run_isolated(document, corpus_dir, pipeline):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_document, args=(document, corpus_dir, pipeline, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta():
+    from config import Config
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {name: getattr(Config, name) for name in (
+            'OCR_BACKEND', 'OCR_WORKERS', 'OCR_PAGE_PARALLELISM', 'CPU_POOL_ENABLED', 'CPU_WORKERS',
+            'DESKEW_METHOD', 'OCR_OSD_ENABLED', 'OCR_MIN_DPI', 'OCR_MAX_DPI', 'OCR_PSM')},
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('revision')}, {baseline['meta'].get('timestamp')})")
+    print(f"{'document':<36} {'pages/s':>16} {'p95 page, s':>16} {'peak RSS, MB':>16} {'accuracy':>16}")
+
+    def delta(new, old, digits=2):
+        if new is None or old is None:
+            return f"{'-':>16}"
+        change = f"{(new - old) / old * 100:+.0f}%" if old else ''
+        return f"{new:>9.{digits}f} {change:>6}"
+
+    for name, result in current['documents'].items():
+        old = baseline['documents'].get(name)
+        if old is None:
+            continue
+        print(f"{name:<36} {delta(result['pages_per_second'], old['pages_per_second'])} "
+              f"{delta(result['page_seconds'].get('p95'), old['page_seconds'].get('p95'), 3)} "
+              f"{delta(result['peak_rss_mb'], old['peak_rss_mb'], 0)} "
+              f"{delta(result['accuracy']['overall'], old['accuracy']['overall'], 3)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--quick', action='store_true', help='small corpus with one scan variant per language')
+    parser.add_argument('--bundle-pages', type=int, default=500)
+    parser.add_argument('--only', nargs='*', default=None, help='document name prefixes to run')
+    parser.add_argument('--no-pipeline', action='store_true', help='skip the full pipeline with the LLM stub')
+    parser.add_argument('--output', default=None, help='write results as JSON')
+    parser.add_argument('--compare', default=None, help='baseline JSON from a previous run')
+    args = parser.parse_args()
+
+    manifest = ensure_corpus(args.corpus_dir, args.quick, args.bundle_pages)
+
+    server, llm_url = start_stub_server(chunk_delay=0.0)
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    # Настройки читаются Config при импорте в дочерних процессах
+    os.environ.update({
+        'YANDEX_GPT_URL': llm_url,
+        'EXTRACTION_CACHE_ENABLED': 'false',
+        'LLM_CACHE_ENABLED': 'false',
+        'METRICS_ENABLED': 'false',
+        'UPLOAD_FOLDER': workdir,
+    })
+
+    results = {'meta': run_meta(), 'documents': {}}
+    results['meta']['corpus'] = {'key': manifest['key'], 'quick': args.quick, 'bundle_pages': args.bundle_pages}
+    print(f"{'document':<36} {'pages':>6} {'pages/s':>8} {'p50, s':>7} {'p95, s':>7} "
+          f"{'RSS, MB':>8} {'accuracy':>8} {'pipeline, s':>11}")
+    try:
+        for document in manifest['documents']:
+            if args.only and not any(document['name'].startswith(prefix) for prefix in args.only):
+                continue
+            result = run_isolated(document, args.corpus_dir, not args.no_pipeline)
+            result['kind'] = document['kind']
+            result['lang'] = document['lang']
+            results['documents'][document['name']] = result
+            pipeline = result.get('pipeline', {}).get('wall_seconds')
+            print(f"{document['name']:<36} {result['pages']:>6} {result['pages_per_second']:>8.2f} "
+                  f"{result['page_seconds'].get('p50', 0):>7.3f} {result['page_seconds'].get('p95', 0):>7.3f} "
+                  f"{result['peak_rss_mb']:>8.0f} {result['accuracy']['overall']:>8.3f} "
+                  f"{pipeline if pipeline is not None else '-':>11}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
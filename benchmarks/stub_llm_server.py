@@ -0,0 +1,105 @@
+"""Локальная заглушка Yandex GPT completion API для проверки и бенчмарков.
+
+Отвечает синтетическим отчетом; в режиме stream отдает накопленный текст
+по одному JSON-объекту на строку (chunked), как настоящий API.
+
+Запуск:
+    python benchmarks/stub_llm_server.py --port 8090 --chunk-delay 0.05
+    YANDEX_GPT_URL=http://127.0.0.1:8090/foundationModels/v1/completion gunicorn ...
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPORT = (
+    "ДИАГНОЗ:\nЗаглушка: рак молочной железы T2N1M0.\n\n"
+    "МОРФОЛОГИЯ ОПУХОЛИ:\n• Гистология: - \n\n"
+    "ИСТОРИЯ ЗАБОЛЕВАНИЯ:\n• Дебют: - \n\n"
+    "ДИНАМИКА ЗАБОЛЕВАНИЯ:\n• КТ: - \n"
+)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    chunk_delay = 0.05
+    response_delay = 0.0
+    words_per_chunk = 3
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        stream = request.get('completionOptions', {}).get('stream', False)
+
+        time.sleep(self.response_delay)
+
+        if not stream:
+            body = json.dumps(self._result(STUB_REPORT, final=True), ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        words = STUB_REPORT.split(' ')
+        for end in range(self.words_per_chunk, len(words) + self.words_per_chunk, self.words_per_chunk):
+            text = ' '.join(words[:end])
+            final = end >= len(words)
+            line = json.dumps(self._result(text, final), ensure_ascii=False) + "\n"
+            self._send_chunk(line.encode('utf-8'))
+            time.sleep(self.chunk_delay)
+        self._send_chunk(b'')
+
+    @staticmethod
+    def _result(text, final):
+        status = 'ALTERNATIVE_STATUS_FINAL' if final else 'ALTERNATIVE_STATUS_PARTIAL'
+        return {'result': {
+            'alternatives': [{'message': {'role': 'assistant', 'text': text}, 'status': status}],
+            'usage': {'inputTextTokens': '0', 'completionTokens': '0', 'totalTokens': '0'},
+            'modelVersion': 'stub'
+        }}
+
+
+def start_stub_server(port=0, chunk_delay=0.05, response_delay=0.0):
+    """Запуск заглушки в фоновом потоке; возвращает (server, url)"""
+    handler = type('ConfiguredStubLLMHandler', (StubLLMHandler,),
+                   {'chunk_delay': chunk_delay, 'response_delay': response_delay})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/foundationModels/v1/completion"
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--chunk-delay', type=float, default=0.05)
+    parser.add_argument('--response-delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.chunk_delay, args.response_delay)
+    print(f"Stub LLM server listening at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
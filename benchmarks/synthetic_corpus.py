@@ -0,0 +1,202 @@
+"""Синтетический корпус PDF для бенчмарков с эталонным текстом страниц.
+
+Документы:
+    digital_<lang>      - страницы с текстовым слоем
+    scan_<lang>_...     - растровые сканы с заданными DPI, наклоном и шумом
+    mixed_<lang>        - текстовые страницы вперемешку со сканами
+    bundle              - комплект из нескольких файлов на --bundle-pages страниц
+
+Языки: ru (кириллица), en (латиница). Генерация детерминирована (seed),
+готовый корпус переиспользуется, пока совпадают параметры в manifest.json.
+
+Запуск из корня проекта:
+    python benchmarks/synthetic_corpus.py --out /tmp/pdfsurge_corpus --quick
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import cv2
+import fitz
+import numpy as np
+
+CORPUS_VERSION = 1
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), 'pdfsurge_corpus')
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4, пункты
+TEXT_RECT = fitz.Rect(56, 56, PAGE_WIDTH - 56, PAGE_HEIGHT - 56)
+
+WORDS = {
+    'ru': ("пациентка диагноз опухоль молочной железы метастазы лимфоузлы химиотерапия курс "
+           "препарат доза обследование компьютерная томография ультразвуковое исследование "
+           "биопсия гистология иммуногистохимия рецепторы эстрогена прогестерона динамика "
+           "стабилизация прогрессирование ремиссия операция резекция облучение назначено "
+           "рекомендовано контроль анализ крови гемоглобин лейкоциты тромбоциты осмотр жалобы "
+           "состояние удовлетворительное образование размер правой левой без признаков").split(),
+    'en': ("patient diagnosis tumor breast carcinoma metastases lymph nodes chemotherapy cycle "
+           "drug dose examination computed tomography ultrasound biopsy histology "
+           "immunohistochemistry estrogen progesterone receptors response stable disease "
+           "progression remission surgery resection radiotherapy prescribed recommended follow "
+           "blood count hemoglobin leukocytes platelets complaints condition satisfactory lesion "
+           "size right left without signs").split(),
+}
+CODES = ('T2N1M0', 'HER2 3+', 'Ki-67 35%', 'ER 8', 'PR 6', 'ECOG 1', 'AC x4', 'TH x12')
+
+
+def page_text(rng, lang, chars=1100):
+    """Правдоподобный текст страницы примерно из chars символов"""
+    words = WORDS[lang]
+    sentences = []
+    length = 0
+    while length < chars:
+        count = int(rng.integers(6, 14))
+        sentence = ' '.join(words[int(i)] for i in rng.integers(0, len(words), count))
+        if rng.random() < 0.3:
+            sentence += ' ' + CODES[int(rng.integers(0, len(CODES)))]
+        sentence = sentence[0].upper() + sentence[1:] + '.'
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(sentences)
+
+
+def add_text_page(doc, text, fontsize=11):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    writer = fitz.TextWriter(page.rect)
+    writer.fill_textbox(TEXT_RECT, text, font=fitz.Font('tiro'), fontsize=fontsize)
+    writer.write_text(page)
+    return page
+
+
+def scan_image(text, dpi, skew, noise, rng):
+    """Растр страницы в градациях серого: рендеринг, поворот, шум"""
+    source = fitz.open()
+    add_text_page(source, text)
+    pix = source[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+    source.close()
+
+    if skew:
+        height, width = image.shape
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+        image = cv2.warpAffine(image, rotation, (width, height), flags=cv2.INTER_LINEAR, borderValue=255)
+    if noise:
+        # Гауссов шум и "соль с перцем", как у плохого сканера
+        image = image.astype(np.float32) + rng.normal(0, noise * 255, image.shape)
+        speckles = rng.random(image.shape)
+        image[speckles < noise / 10] = 0
+        image[speckles > 1 - noise / 10] = 255
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    return image
+
+
+def add_scan_page(doc, text, dpi, skew, noise, rng):
+    image = scan_image(text, dpi, skew, noise, rng)
+    _, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, stream=encoded.tobytes())
+    return page
+
+
+def corpus_spec(quick=False, bundle_pages=500):
+    """Описание документов корпуса (без генерации)"""
+    spec = []
+    for lang in ('ru', 'en'):
+        spec.append({'name': f'digital_{lang}', 'kind': 'digital', 'lang': lang,
+                     'files': [{'pages': 4 if quick else 20, 'scan_every': 0}]})
+        variants = ([(200, 2.0, 0.03)] if quick else
+                    [(dpi, skew, noise) for dpi in (150, 300) for skew in (0.0, 2.5, -5.0) for noise in (0.0, 0.08)])
+        for dpi, skew, noise in variants:
+            spec.append({'name': f'scan_{lang}_{dpi}dpi_skew{skew:g}_noise{noise:g}', 'kind': 'scan', 'lang': lang,
+                         'scan': {'dpi': dpi, 'skew': skew, 'noise': noise},
+                         'files': [{'pages': 2 if quick else 4, 'scan_every': 1}]})
+        spec.append({'name': f'mixed_{lang}', 'kind': 'mixed', 'lang': lang,
+                     'scan': {'dpi': 200, 'skew': 1.5, 'noise': 0.03},
+                     'files': [{'pages': 4 if quick else 10, 'scan_every': 2}]})
+
+    files = 5
+    per_file = max(1, bundle_pages // files)
+    spec.append({'name': f'bundle_{per_file * files}p', 'kind': 'bundle', 'lang': 'ru+en',
+                 'scan': {'dpi': 200, 'skew': 1.0, 'noise': 0.02},
+                 'files': [{'pages': per_file, 'scan_every': 50 if quick else 20} for _ in range(files)]})
+    return spec
+
+
+def spec_key(spec):
+    return hashlib.sha256(json.dumps([CORPUS_VERSION, spec], sort_keys=True).encode()).hexdigest()[:16]
+
+
+def build_document(entry, directory, seed):
+    """Файлы документа и эталон страниц: [{'file', 'page', 'kind', 'text'}]"""
+    rng = np.random.default_rng(seed)
+    pages = []
+    paths = []
+    for file_index, file_spec in enumerate(entry['files'], 1):
+        lang = entry['lang'] if entry['lang'] != 'ru+en' else ('ru', 'en')[file_index % 2]
+        path = os.path.join(directory, f"{entry['name']}_{file_index}.pdf")
+        doc = fitz.open()
+        for page_num in range(file_spec['pages']):
+            text = page_text(rng, lang)
+            scan_every = file_spec['scan_every']
+            if scan_every and page_num % scan_every == scan_every - 1:
+                scan = entry['scan']
+                add_scan_page(doc, text, scan['dpi'], scan['skew'], scan['noise'], rng)
+                kind = 'scan'
+            else:
+                add_text_page(doc, text)
+                kind = 'digital'
+            pages.append({'file': os.path.basename(path), 'page': page_num, 'kind': kind, 'text': text})
+        doc.save(path, garbage=3, deflate=True)
+        doc.close()
+        paths.append(os.path.basename(path))
+    return paths, pages
+
+
+def ensure_corpus(directory=DEFAULT_CORPUS_DIR, quick=False, bundle_pages=500, seed=42):
+    """Корпус в directory (генерируется при отсутствии); возвращает manifest"""
+    spec = corpus_spec(quick, bundle_pages)
+    key = spec_key([spec, seed])
+    manifest_path = os.path.join(directory, 'manifest.json')
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('key') == key:
+            return manifest
+    except (OSError, ValueError):
+        pass
+
+    if os.path.exists(manifest_path):
+        # Корпус с другими параметрами пересоздается целиком
+        shutil.rmtree(directory)
+    elif os.path.isdir(directory) and os.listdir(directory):
+        raise RuntimeError(f"{directory} is not empty and is not a benchmark corpus")
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    for index, entry in enumerate(spec):
+        files, pages = build_document(entry, directory, seed + index)
+        documents.append(dict(entry, files=files, pages=pages))
+        print(f"generated {entry['name']}: {len(pages)} pages in {len(files)} file(s)", file=sys.stderr)
+
+    manifest = {'key': key, 'version': CORPUS_VERSION, 'seed': seed, 'documents': documents}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--bundle-pages', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    manifest = ensure_corpus(args.out, args.quick, args.bundle_pages, args.seed)
+    total = sum(len(doc['pages']) for doc in manifest['documents'])
+    print(f"{len(manifest['documents'])} documents, {total} pages in {args.out}")
+
+
+if __name__ == '__main__':
+    main()
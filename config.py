@@ -4,14 +4,193 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def available_cpus():
+    """Число ядер, доступных процессу: affinity и квота CPU cgroup (v2 или v1) в Docker"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()[:2]
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        # Дробная квота (например, 1.5 CPU) округляется вверх
+        cpus = min(cpus, max(1, int(-(-quota // 1))))
+    return max(1, cpus)
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 50 * 1024 * 1024)
 
+    # Потоковый прием загрузок: спулинг на диск, лимиты и дедлайны
+    UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or os.path.join(UPLOAD_FOLDER, 'spool')
+    UPLOAD_MAX_FILE_BYTES = int(os.environ.get('UPLOAD_MAX_FILE_BYTES') or MAX_CONTENT_LENGTH)
+    UPLOAD_MAX_FILES = int(os.environ.get('UPLOAD_MAX_FILES', 20))
+    UPLOAD_MAX_PAGES = int(os.environ.get('UPLOAD_MAX_PAGES', 1000))
+    UPLOAD_DEADLINE = float(os.environ.get('UPLOAD_DEADLINE', 120))
+    UPLOAD_READ_TIMEOUT = float(os.environ.get('UPLOAD_READ_TIMEOUT', 30))
+
     # Yandex GPT API настройки
     YANDEX_API_KEY = os.environ.get('YANDEX_GPT_API_KEY', 'your_yandex_api_key_here')
     YANDEX_FOLDER_ID = os.environ.get('YANDEX_FOLDER_ID', 'your_folder_id_here')
+    YANDEX_GPT_URL = os.environ.get('YANDEX_GPT_URL',
+                                    'https://llm.api.cloud.yandex.net/foundationModels/v1/completion')
+
+    # HTTP-клиент LLM: повторы, пул соединений, лимит одновременных запросов на процесс
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 1.0))
+    LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 20.0))
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))
+    LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE', 10))
+
+    # Кэш ответов LLM (общий для воркеров, на диске)
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR') or os.path.join(UPLOAD_FOLDER, 'cache', 'llm')
+    LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))
+
+    # Бюджет токенов модели и map-reduce суммаризация больших комплектов
+    LLM_CONTEXT_TOKENS = int(os.environ.get('LLM_CONTEXT_TOKENS', 32000))
+    LLM_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS', 4000))
+    # Букв слова на токен для локальной оценки (token_budget.estimate_tokens)
+    LLM_CHARS_PER_TOKEN = float(os.environ.get('LLM_CHARS_PER_TOKEN', 4.0))
+    LLM_CHUNK_TOKENS = int(os.environ.get('LLM_CHUNK_TOKENS', 12000))
+    LLM_CHUNK_SUMMARY_TOKENS = int(os.environ.get('LLM_CHUNK_SUMMARY_TOKENS', 1500))
+    LLM_MAP_CONCURRENCY = int(os.environ.get('LLM_MAP_CONCURRENCY', 4))
+
+    # Сжатие текста документов в промпте: баннеры страниц, колонтитулы и пробелы
+    # убираются всегда, шаги PROMPT_TRIM_STEPS (по приоритету) - только
+    # сверх бюджета. Бюджет 0 - весь контекст модели; что не поместилось - map-reduce
+    PROMPT_COMPACTION = os.environ.get('PROMPT_COMPACTION', 'true').lower() in ('1', 'true', 'yes')
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 0))
+    PROMPT_TRIM_STEPS = [step.strip() for step in
+                         os.environ.get('PROMPT_TRIM_STEPS', 'page_markers,repeated_lines').split(',')
+                         if step.strip()]
+
+    # Постраничная классификация при извлечении текста
+    PAGE_MIN_TEXT_CHARS = int(os.environ.get('PAGE_MIN_TEXT_CHARS', 50))
+    PAGE_SCANNED_MIN_TEXT_CHARS = int(os.environ.get('PAGE_SCANNED_MIN_TEXT_CHARS', 200))
+    PAGE_MIN_IMAGE_COVERAGE = float(os.environ.get('PAGE_MIN_IMAGE_COVERAGE', 0.1))
+    PAGE_SCAN_IMAGE_COVERAGE = float(os.environ.get('PAGE_SCAN_IMAGE_COVERAGE', 0.5))
+
+    # Параллельный OCR: общий лимит потоков на процесс и окно страниц на один документ
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS') or available_cpus())
+    OCR_PAGE_PARALLELISM = int(os.environ.get('OCR_PAGE_PARALLELISM') or OCR_WORKERS)
+
+    # Структурное извлечение страниц с текстовым слоем (блоки, строки, таблицы
+    # PyMuPDF): таблицы попадают в текст компактно, построчно, а не ячейка на строку
+    STRUCTURED_EXTRACTION = os.environ.get('STRUCTURED_EXTRACTION', 'false').lower() in ('1', 'true', 'yes')
+    STRUCTURED_TABLES = os.environ.get('STRUCTURED_TABLES', 'true').lower() in ('1', 'true', 'yes')
+
+    # Повторяющиеся страницы загрузки (одна выписка в нескольких файлах): текст
+    # сравнивается по MinHash с точным совпадением чисел и дат, сканы перед этим -
+    # по pHash (пороги - доля совпадения). OCR повторов не пропускается
+    DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    DEDUP_IMAGE_SIMILARITY = float(os.environ.get('DEDUP_IMAGE_SIMILARITY', 0.98))
+    DEDUP_TEXT_SIMILARITY = float(os.environ.get('DEDUP_TEXT_SIMILARITY', 0.9))
+    DEDUP_MIN_TEXT_CHARS = int(os.environ.get('DEDUP_MIN_TEXT_CHARS', 200))
+
+    # Пакетный OCR: до OCR_BATCH_SIZE подряд идущих сканированных страниц документа
+    # распознаются одним запуском движка (1 - постранично). Пакет - одна задача пула,
+    # поэтому он не больше ceil(страниц документа / исполнителей пула), чтобы
+    # короткий документ занимал все ядра; большой пакет держит в памяти больше изображений
+    OCR_BATCH_SIZE = int(os.environ.get('OCR_BATCH_SIZE', 8))
+
+    # Пул процессов для CPU-работы (рендеринг и OCR страниц): ядра делятся
+    # между воркерами gunicorn, процессы пересоздаются по потреблению памяти
+    CPU_POOL_ENABLED = os.environ.get('CPU_POOL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CPU_WORKERS = int(os.environ.get('CPU_WORKERS')
+                      or max(1, available_cpus() // int(os.environ.get('GUNICORN_WORKERS', 2))))
+    CPU_WORKER_MAX_RSS_MB = int(os.environ.get('CPU_WORKER_MAX_RSS_MB', 1024))
+    CPU_POOL_START_METHOD = os.environ.get('CPU_POOL_START_METHOD', 'forkserver')
+
+    # Движок OCR: 'auto' (tesserocr, если установлен), 'tesserocr' или 'pytesseract'
+    OCR_BACKEND = os.environ.get('OCR_BACKEND', 'auto')
+    # Каталог моделей для tesserocr; без него определяется при запуске по tesseract
+    TESSDATA_PATH = os.environ.get('TESSDATA_PATH')
+
+    # Разрешение рендеринга для OCR подбирается по высоте символов из пробного прохода
+    OCR_PROBE_DPI = int(os.environ.get('OCR_PROBE_DPI', 72))
+    OCR_TARGET_GLYPH_HEIGHT = int(os.environ.get('OCR_TARGET_GLYPH_HEIGHT', 30))
+    OCR_MIN_DPI = int(os.environ.get('OCR_MIN_DPI', 100))
+    OCR_MAX_DPI = int(os.environ.get('OCR_MAX_DPI', 400))
+    OCR_MAX_IMAGE_SIDE = int(os.environ.get('OCR_MAX_IMAGE_SIDE', 4000))
+    OCR_PSM = int(os.environ.get('OCR_PSM', 6))
+
+    # Уверенность OCR по словам (0-100, средняя с весом по длине слова). Страница ниже
+    # OCR_RETRY_CONFIDENCE распознается повторно в разрешении x OCR_RETRY_DPI_SCALE (не
+    # выше OCR_RETRY_MAX_DPI): только неуверенные строки, если в них не больше доли
+    # OCR_RETRY_REGION_SHARE слов, иначе вся страница; при предельном разрешении - с
+    # OCR_RETRY_PSM. OCR ниже OCR_MIN_CONFIDENCE не заменяет текстовый слой страницы
+    OCR_RETRY_ENABLED = os.environ.get('OCR_RETRY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    OCR_RETRY_CONFIDENCE = float(os.environ.get('OCR_RETRY_CONFIDENCE', 70))
+    OCR_RETRY_REGION_SHARE = float(os.environ.get('OCR_RETRY_REGION_SHARE', 0.3))
+    OCR_RETRY_DPI_SCALE = float(os.environ.get('OCR_RETRY_DPI_SCALE', 1.5))
+    OCR_RETRY_MAX_DPI = int(os.environ.get('OCR_RETRY_MAX_DPI', 600))
+    OCR_RETRY_PSM = int(os.environ.get('OCR_RETRY_PSM', 3))
+    OCR_MIN_CONFIDENCE = float(os.environ.get('OCR_MIN_CONFIDENCE', 40))
+    # Строки OCR с уверенностью ниже порога - шум (штампы, подписи, рамки) и в текст
+    # не попадают, кроме строк с отведениями ЭКГ и римскими цифрами (0 - не удалять)
+    OCR_NOISE_LINE_CONFIDENCE = float(os.environ.get('OCR_NOISE_LINE_CONFIDENCE', 30))
+
+    # Определение ориентации страницы (OSD, 90/180/270 градусов): только для страниц,
+    # распознанных с уверенностью ниже OCR_RETRY_CONFIDENCE; повернутая страница
+    # распознается заново
+    OCR_OSD_ENABLED = os.environ.get('OCR_OSD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    OCR_OSD_MIN_CONFIDENCE = float(os.environ.get('OCR_OSD_MIN_CONFIDENCE', 2.0))
+
+    # Определение наклона: 'projection' (профиль проекций на уменьшенной копии) или 'contour'
+    DESKEW_METHOD = os.environ.get('DESKEW_METHOD', 'projection')
+    DESKEW_MAX_ANGLE = float(os.environ.get('DESKEW_MAX_ANGLE', 10.0))
+    DESKEW_MIN_CONFIDENCE = float(os.environ.get('DESKEW_MIN_CONFIDENCE', 0.3))
+    DESKEW_DETECT_WIDTH = int(os.environ.get('DESKEW_DETECT_WIDTH', 600))
+
+    # Кэш извлечения текста (по SHA-256 файла и хэшам страниц)
+    EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    EXTRACTION_CACHE_DIR = os.environ.get('EXTRACTION_CACHE_DIR') or os.path.join(UPLOAD_FOLDER, 'cache', 'extraction')
+    EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES') or 512 * 1024 * 1024)
+
+    # Постраничные контрольные точки извлечения: продолжение прерванной обработки
+    CHECKPOINTS_ENABLED = os.environ.get('CHECKPOINTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CHECKPOINT_DB_PATH = os.environ.get('CHECKPOINT_DB_PATH') or os.path.join(UPLOAD_FOLDER, 'checkpoints.sqlite3')
+    CHECKPOINT_RETENTION = int(os.environ.get('CHECKPOINT_RETENTION', 24 * 3600))
+    CHECKPOINT_FLUSH_INTERVAL = float(os.environ.get('CHECKPOINT_FLUSH_INTERVAL', 1.0))
+
+    # Очередь фоновых задач (/jobs)
+    JOB_DB_PATH = os.environ.get('JOB_DB_PATH') or os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 120))
+    JOB_EVENTS_POLL_INTERVAL = float(os.environ.get('JOB_EVENTS_POLL_INTERVAL', 0.25))
+    # Поток событий задачи (SSE) закрывается через JOB_EVENTS_MAX_DURATION секунд, и
+    # EventSource переподключается через JOB_EVENTS_RETRY секунд с Last-Event-ID; в
+    # тишине каждые JOB_EVENTS_KEEPALIVE секунд идет комментарий, чтобы прокси не рвали
+    # соединение, а закрытое клиентом выявлялось
+    JOB_EVENTS_MAX_DURATION = float(os.environ.get('JOB_EVENTS_MAX_DURATION', 60))
+    JOB_EVENTS_RETRY = float(os.environ.get('JOB_EVENTS_RETRY', 1.0))
+    JOB_EVENTS_KEEPALIVE = float(os.environ.get('JOB_EVENTS_KEEPALIVE', 15))
+
+    # Метрики этапов обработки (/metrics): снимки процессов в общем каталоге
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(UPLOAD_FOLDER, 'metrics')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
 
     # Разрешенные расширения файлов
     ALLOWED_EXTENSIONS = {'pdf'}
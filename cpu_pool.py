@@ -0,0 +1,128 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from lazy_modules import HEAVY_MODULES
+from ocr_pool import OCRPagePool
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _current_rss():
+    """Текущий RSS процесса в байтах"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _run_measured(func, arg):
+    """Выполняется в процессе пула: результат и RSS процесса после задачи"""
+    return func(arg), _current_rss()
+
+
+class CPUWorkPool(OCRPagePool):
+    """Пул процессов для CPU-работы (рендеринг, дескьюинг, OCR).
+
+    Процессы порождаются через forkserver с заранее импортированными
+    тяжелыми модулями и не делят GIL с потоками веб-воркера, которые
+    только ставят задачи и ждут результат. Вместо перезапуска по числу
+    запросов процессы пересоздаются по памяти: если после задачи RSS
+    процесса превысил max_rss_bytes, пул заменяется новым поколением,
+    а старое дорабатывает свои задачи и завершается.
+    """
+
+    def __init__(self, max_workers, max_rss_bytes, start_method='forkserver', preload=()):
+        self.max_workers = max_workers
+        self.max_rss_bytes = max_rss_bytes
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver' and preload:
+            self._context.set_forkserver_preload(list(preload))
+
+        self._lock = threading.Lock()
+        self._counters = {'tasks': 0, 'failures': 0, 'recycles': 0, 'max_rss': 0}
+        self.generation = 0
+        self.executor = None
+        self._new_generation()
+        logger.info(f"CPU work pool started with {max_workers} {start_method} processes")
+
+    def _new_generation(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+        self.generation += 1
+
+    def recycle(self, executor, reason):
+        """Замена поколения пула, если executor все еще текущий"""
+        with self._lock:
+            if executor is not self.executor:
+                return
+            self._new_generation()
+            self._counters['recycles'] += 1
+        logger.info(f"CPU work pool recycled ({reason}), generation {self.generation}")
+        # Старые процессы завершатся после уже поставленных задач
+        executor.shutdown(wait=False)
+
+    def submit(self, func, arg):
+        with self._lock:
+            executor = self.executor
+        result = Future()
+        try:
+            inner = executor.submit(_run_measured, func, arg)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Процесс пула убит (например, OOM) или пул уже остановлен
+            self.recycle(executor, e.__class__.__name__)
+            with self._lock:
+                executor = self.executor
+            inner = executor.submit(_run_measured, func, arg)
+
+        def done(inner_future):
+            try:
+                value, rss = inner_future.result()
+            except BaseException as e:
+                with self._lock:
+                    self._counters['failures'] += 1
+                if isinstance(e, BrokenProcessPool):
+                    self.recycle(executor, 'broken pool')
+                result.set_exception(e)
+                return
+
+            with self._lock:
+                self._counters['tasks'] += 1
+                self._counters['max_rss'] = max(self._counters['max_rss'], rss)
+            if rss > self.max_rss_bytes:
+                self.recycle(executor, f"worker RSS {rss // (1024 * 1024)} MB")
+            result.set_result(value)
+
+        inner.add_done_callback(done)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['generation'] = self.generation
+        stats['max_workers'] = self.max_workers
+        return stats
+
+
+def get_cpu_pool():
+    """Пул процессов текущего воркера gunicorn или None, если он выключен"""
+    global _pool, _pool_pid
+    if not Config.CPU_POOL_ENABLED:
+        return None
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = CPUWorkPool(Config.CPU_WORKERS,
+                                    Config.CPU_WORKER_MAX_RSS_MB * 1024 * 1024,
+                                    Config.CPU_POOL_START_METHOD,
+                                    preload=list(HEAVY_MODULES) + ['pdf_processor'])
+                _pool_pid = pid
+    return _pool
@@ -1,16 +1,97 @@
-import cv2
-import numpy as np
-import fitz
-from PIL import Image
-import io
 import logging
+from config import Config
+from lazy_modules import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+fitz = lazy_import('fitz')
 
 logger = logging.getLogger(__name__)
 
+DESKEW_METHODS = ('projection', 'contour')
+
+# Сколько черных пикселей (не больше, с прореживанием) берет грубый проход проекций
+PROJECTION_COARSE_POINTS = 8000
+
 
 class DeskewProcessor:
-    def __init__(self):
+    def __init__(self, method=None, max_angle=None, min_confidence=None, detect_width=None):
         self.angle_threshold = 0.5  # Минимальный угол для коррекции
+        self.method = method or Config.DESKEW_METHOD
+        if self.method not in DESKEW_METHODS:
+            logger.warning(f"Unknown deskew method '{self.method}', using 'projection'")
+            self.method = 'projection'
+        self.max_angle = max_angle if max_angle is not None else Config.DESKEW_MAX_ANGLE
+        self.min_confidence = min_confidence if min_confidence is not None else Config.DESKEW_MIN_CONFIDENCE
+        self.detect_width = detect_width or Config.DESKEW_DETECT_WIDTH
+
+    def fingerprint(self):
+        """Параметры дескьюинга, влияющие на результат OCR"""
+        if self.method == 'contour':
+            return 'contour'
+        return f"projection:{self.max_angle}:{self.min_confidence}:{self.detect_width}"
+
+    def estimate_skew(self, image):
+        """Угол наклона и уверенность (0..1) выбранным методом"""
+        if self.method == 'contour':
+            # Контурный метод уверенность не оценивает
+            return self.detect_skew_angle(image), 1.0
+        return self.detect_skew_projection(image)
+
+    def detect_skew_projection(self, image):
+        """Определение наклона по профилю горизонтальных проекций.
+
+        На уменьшенной бинаризованной копии перебираются углы-кандидаты
+        (сначала шаг 1 градус, затем 0.1 в пределах полуградуса от лучшего), для каждого
+        считается резкость профиля суммы строк: у выровненных строк текста
+        профиль чередует пики и провалы. Поворот в полном разрешении
+        выполняется один раз, уже для найденного угла. Уверенность -
+        насколько лучший угол выделяется на фоне остальных кандидатов
+        грубого прохода.
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        # Уменьшение примерно до detect_width в целое число раз: для INTER_AREA
+        # это быстрый путь усреднения блоков, дробный масштаб в разы дороже поиска
+        height, width = gray.shape[:2]
+        factor = int(round(width / self.detect_width))
+        if factor > 1:
+            gray = cv2.resize(gray[:height - height % factor, :width - width % factor],
+                              (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+
+        _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        points = cv2.findNonZero(binary)
+        if points is None:
+            return 0.0, 0.0
+
+        # Поворот на малый угол приближается сдвигом: строка черного пикселя
+        # смещается на x * tan(угла); профиль считается bincount-ом по
+        # координатам черных пикселей, без поворота изображения
+        points = points.reshape(-1, 2)
+        xs = points[:, 0].astype(np.float32) - binary.shape[1] / 2
+        ys = points[:, 1].astype(np.float32)
+        offset = binary.shape[1] * np.tan(np.radians(self.max_angle + 1.0)) / 2 + 1
+
+        def score(angle, step=1):
+            rows = (ys[::step] + xs[::step] * np.float32(np.tan(np.radians(angle))) + offset).astype(np.int32)
+            profile = np.bincount(rows).astype(np.float64)
+            return float(np.sum(np.diff(profile) ** 2))
+
+        # Для грубого прохода хватает части черных пикселей
+        step = max(1, len(xs) // PROJECTION_COARSE_POINTS)
+        coarse_angles = np.arange(-self.max_angle, self.max_angle + 0.5, 1.0)
+        coarse_scores = np.array([score(angle, step) for angle in coarse_angles])
+        best = int(np.argmax(coarse_scores))
+        best_score = coarse_scores[best]
+        if best_score <= 0:
+            return 0.0, 0.0
+        confidence = float((best_score - np.median(coarse_scores)) / best_score)
+
+        fine_angles = np.arange(coarse_angles[best] - 0.5, coarse_angles[best] + 0.55, 0.1)
+        fine_scores = [score(angle) for angle in fine_angles]
+        rotation = float(fine_angles[int(np.argmax(fine_scores))])
+
+        return rotation, confidence
 
     def detect_skew_angle(self, image):
         """Определение угла наклона изображения"""
@@ -81,43 +162,116 @@ class DeskewProcessor:
 
         return rotated
 
-    def deskew_pdf_page(self, pdf_page):
-        """Дескьюинг страницы PDF"""
-        try:
-            # Конвертация страницы в изображение
-            pix = pdf_page.get_pixmap(matrix=fitz.Matrix(1.0, 1.0))  # Увеличиваем разрешение (уменьшил после деплоя)
-            img_data = pix.tobytes("png")
+    def render_page(self, pdf_page, dpi=72):
+        """Рендеринг страницы PDF в полутоновый numpy-массив.
+
+        Пиксмап сразу рендерится в градациях серого, его байты
+        оборачиваются массивом без кодирования в PNG и обратно.
+        """
+        # Конвертация страницы в изображение
+        zoom = dpi / 72
+        pix = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
 
-            # Преобразование в OpenCV формат
-            nparr = np.frombuffer(img_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # samples - копия буфера пиксмапа, массив не зависит от времени жизни pix
+        image = np.frombuffer(pix.samples, dtype=np.uint8)
+        return image.reshape(pix.height, pix.stride)[:, :pix.width]
 
+    @staticmethod
+    def estimate_glyph_height(image):
+        """Медианная высота символов (в пикселях) по связным компонентам, None если текста нет"""
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        if count <= 1:
+            return None
+
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        # Отбрасываем точки шума, линии таблиц и крупные рисунки
+        glyphs = (heights >= 2) & (heights <= image.shape[0] * 0.05) & (widths <= heights * 4)
+        if glyphs.sum() < 20:
+            return None
+        return float(np.median(heights[glyphs]))
+
+    def choose_render_dpi(self, pdf_page):
+        """Разрешение рендеринга страницы для OCR.
+
+        Пробный рендеринг в OCR_PROBE_DPI дает высоту символов; разрешение
+        масштабируется так, чтобы она стала OCR_TARGET_GLYPH_HEIGHT, и
+        ограничивается OCR_MIN_DPI..OCR_MAX_DPI и OCR_MAX_IMAGE_SIDE.
+        Возвращает (dpi, пробное изображение).
+        """
+        probe_dpi = Config.OCR_PROBE_DPI
+        probe = self.render_page(pdf_page, dpi=probe_dpi)
+        glyph_height = self.estimate_glyph_height(probe)
+
+        if glyph_height:
+            dpi = probe_dpi * Config.OCR_TARGET_GLYPH_HEIGHT / glyph_height
+        else:
+            dpi = Config.OCR_MIN_DPI
+        dpi = min(max(dpi, Config.OCR_MIN_DPI), Config.OCR_MAX_DPI)
+
+        page_side = max(pdf_page.rect.width, pdf_page.rect.height) / 72
+        if page_side > 0:
+            dpi = min(dpi, Config.OCR_MAX_IMAGE_SIDE / page_side)
+        # Округляем, чтобы одинаковые страницы рендерились одинаково
+        return int(dpi // 10 * 10) or probe_dpi, probe
+
+    def render_page_for_ocr(self, pdf_page):
+        """Рендеринг страницы в подобранном разрешении; возвращает (изображение, dpi)"""
+        dpi, probe = self.choose_render_dpi(pdf_page)
+        if dpi == Config.OCR_PROBE_DPI:
+            return probe, dpi
+        return self.render_page(pdf_page, dpi=dpi), dpi
+
+    @staticmethod
+    def rotate_orthogonal(image, rotate):
+        """Поворот на 90/180/270 градусов по часовой стрелке (результат OSD)"""
+        codes = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180,
+                 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+        if rotate not in codes:
+            return image
+        return cv2.rotate(image, codes[rotate])
+
+    def apply_geometry(self, image, rotate, skew_angle):
+        """Поворот (OSD) и дескьюинг с известными углами - для нового рендера той же страницы"""
+        image = self.rotate_orthogonal(image, rotate)
+        return self.rotate_image(image, -skew_angle) if skew_angle else image
+
+    @staticmethod
+    def upscale(image, scale):
+        """Увеличение изображения интерполяцией (когда перерендерить страницу нельзя)"""
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+    def deskew_image(self, image):
+        """Дескьюинг уже отрендеренного изображения страницы (numpy-массив)"""
+        try:
             # ДОБАВЛЯЕМ: Проверка размера изображения
             height, width = image.shape[:2]
-            if width > 3000 or height > 3000:
+            max_side = Config.OCR_MAX_IMAGE_SIDE
+            if width > max_side or height > max_side:
                 # Уменьшаем слишком большие изображения
-                scale = min(3000 / width, 3000 / height)
+                scale = min(max_side / width, max_side / height)
                 new_width = int(width * scale)
                 new_height = int(height * scale)
                 image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
                 logger.info(f"Resized image from {width}x{height} to {new_width}x{new_height}")
 
             # Определение угла наклона
-            skew_angle = self.detect_skew_angle(image)
-            logger.info(f"Detected skew angle: {skew_angle:.2f} degrees")
+            skew_angle, confidence = self.estimate_skew(image)
+            logger.info(f"Detected skew angle: {skew_angle:.2f} degrees (confidence {confidence:.2f})")
+            if confidence < self.min_confidence:
+                # Неуверенная оценка (пустая страница, таблица, фото) - не поворачиваем
+                return image, 0
 
             # Поворот изображения
-            deskewed_image = self.rotate_image(image, -skew_angle)
-
-            # Конвертация обратно в PIL Image
-            _, buffer = cv2.imencode('.png', deskewed_image)
-            pil_image = Image.open(io.BytesIO(buffer))
-
-            return pil_image, skew_angle
+            return self.rotate_image(image, -skew_angle), skew_angle
 
         except Exception as e:
             logger.error(f"Deskew error: {e}")
             # Возвращаем оригинальное изображение в случае ошибки
-            pix = pdf_page.get_pixmap()
-            img_data = pix.tobytes("png")
-            return Image.open(io.BytesIO(img_data)), 0
\ No newline at end of file
+            return image, 0
+
+    def deskew_pdf_page(self, pdf_page):
+        """Дескьюинг страницы PDF; возвращает (numpy-массив, угол)"""
+        image, _ = self.render_page_for_ocr(pdf_page)
+        return self.deskew_image(image)
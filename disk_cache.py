@@ -0,0 +1,147 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """Дисковый кэш JSON-значений с LRU-вытеснением по размеру.
+
+    Каждая запись - отдельный файл, запись атомарная (временный файл +
+    os.replace), поэтому кэш можно безопасно делить между воркерами
+    gunicorn. Время доступа хранится в mtime файла: при попадании файл
+    "трогается", при вытеснении удаляются самые старые. Вытеснение
+    выполняет один процесс за раз под файловой блокировкой.
+    """
+
+    def __init__(self, directory, max_bytes, name='cache'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._bytes_since_evict = 0
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def get(self, key):
+        """Значение по ключу или None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except Exception as e:
+            logger.error(f"{self.name} cache read error for {key}: {e}")
+            self._count('errors')
+            self._count('misses')
+            return None
+
+        try:
+            # Отмечаем использование для LRU
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return value
+
+    def set(self, key, value):
+        """Атомарная запись значения по ключу"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(value, f, ensure_ascii=False)
+                size = os.path.getsize(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.error(f"{self.name} cache write error for {key}: {e}")
+            self._count('errors')
+            return
+
+        self._count('writes')
+        with self._lock:
+            self._bytes_since_evict += size
+            need_evict = self._bytes_since_evict >= self.max_bytes // 10
+            if need_evict:
+                self._bytes_since_evict = 0
+        if need_evict:
+            self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Удаление самых давно использованных записей сверх лимита размера"""
+        lock_path = os.path.join(self.directory, '.evict.lock')
+        try:
+            with open(lock_path, 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Вытеснение уже выполняет другой воркер
+                    return
+
+                entries = []
+                total = 0
+                for root, _, files in os.walk(self.directory):
+                    for filename in files:
+                        if not filename.endswith('.json'):
+                            continue
+                        path = os.path.join(root, filename)
+                        try:
+                            stat = os.stat(path)
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, path))
+                        total += stat.st_size
+
+                if total <= self.max_bytes:
+                    return
+
+                # Освобождаем место с запасом, чтобы не вытеснять на каждой записи
+                target = int(self.max_bytes * 0.9)
+                removed = 0
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    total -= size
+                    removed += 1
+
+                self._count('evictions', removed)
+                logger.info(f"{self.name} cache evicted {removed} entries, {total} bytes left")
+        except Exception as e:
+            logger.error(f"{self.name} cache eviction error: {e}")
+
+    def stats(self):
+        """Счетчики попаданий и промахов текущего процесса"""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,71 @@
+import hashlib
+import logging
+from config import Config
+from disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Увеличивать при любом изменении логики извлечения, влияющем на результат
+EXTRACTOR_VERSION = '3'
+
+
+class ExtractionCache:
+    """Кэш результатов извлечения текста, адресуемый содержимым.
+
+    Документ целиком ищется по SHA-256 байтов файла, отдельные страницы -
+    по хэшу их содержимого (потоки контента, изображения, XObject, шрифты),
+    поэтому страница, уже встречавшаяся в другом файле, не распознается
+    повторно. В ключ входит версия экстрактора и конфигурация OCR.
+    """
+
+    def __init__(self, config_fingerprint):
+        self.version = hashlib.sha256(
+            f"{EXTRACTOR_VERSION}:{config_fingerprint}".encode('utf-8')).hexdigest()[:16]
+        self.cache = DiskCache(Config.EXTRACTION_CACHE_DIR,
+                               Config.EXTRACTION_CACHE_MAX_BYTES,
+                               name='extraction')
+
+    @staticmethod
+    def file_hash(pdf_path):
+        """SHA-256 содержимого файла"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def page_hash(self, page):
+        """Хэш содержимого страницы, не зависящий от файла, в котором она лежит"""
+        doc = page.parent
+        digest = hashlib.sha256()
+        digest.update(f"{tuple(page.rect)}:{page.rotation}".encode('utf-8'))
+        digest.update(page.read_contents())
+
+        for xref in sorted({img[0] for img in page.get_images(full=True)} |
+                           {xobj[0] for xobj in page.get_xobjects()}):
+            digest.update(doc.xref_stream_raw(xref) or b'')
+        for font in page.get_fonts():
+            # xref шрифта зависит от файла, поэтому берем только его описание
+            digest.update(repr(font[1:]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _key(self, kind, content_hash):
+        return hashlib.sha256(f"{kind}:{content_hash}:{self.version}".encode('utf-8')).hexdigest()
+
+    def get_document(self, file_hash):
+        """Страницы документа [(номер, метод, текст, pHash скана или None), ...] или None"""
+        value = self.cache.get(self._key('doc', file_hash))
+        return value['pages'] if value else None
+
+    def set_document(self, file_hash, pages):
+        self.cache.set(self._key('doc', file_hash), {'pages': [list(page) for page in pages]})
+
+    def get_page(self, page_hash):
+        """Кэшированная запись страницы {'method': ..., 'text': ...} или None"""
+        return self.cache.get(self._key('page', page_hash))
+
+    def set_page(self, page_hash, method, text):
+        self.cache.set(self._key('page', page_hash), {'method': method, 'text': text})
+
+    def stats(self):
+        return self.cache.stats()
@@ -4,7 +4,9 @@ import os
 bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
 workers = int(os.environ.get('GUNICORN_WORKERS', 2))
 worker_class = "gthread"  # Лучше для I/O операций
-threads = 3
+# Потоки веб-воркера только читают загрузки и ждут результат пула
+# процессов CPU-работы (cpu_pool), поэтому их может быть больше ядер
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 
 timeout = 600
 graceful_timeout = 60
@@ -18,5 +20,29 @@ access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"
 
 # Безопасность и производительность
 preload_app = True
-max_requests = 1000
-max_requests_jitter = 100
+# Процессы OCR пересоздаются по памяти (CPU_WORKER_MAX_RSS_MB), поэтому
+# перезапуск веб-воркеров по числу запросов по умолчанию выключен
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+
+def on_starting(server):
+    # Снимки метрик прошлого запуска не должны попадать в суммы
+    from metrics import get_metrics
+    registry = get_metrics()
+    if registry is not None:
+        registry.reset()
+
+
+def post_worker_init(worker):
+    # Фоновые воркеры очереди задач нельзя запускать до fork (preload_app)
+    job_queue = worker.wsgi.extensions.get('job_queue')
+    if job_queue is not None:
+        job_queue.start_workers()
+
+    # Тяжелые библиотеки и движок OCR загружаются в фоне, воркер сразу
+    # принимает соединения; готовность отдает /ready
+    warmup = worker.wsgi.extensions.get('warmup')
+    if warmup is not None:
+        warmup.start()
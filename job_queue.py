@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class JobQueue:
+    """Очередь задач обработки на SQLite с фоновыми воркерами.
+
+    Задачи хранятся в файле базы, поэтому переживают перезапуск воркеров
+    gunicorn: задача в статусе running, у которой давно не обновлялся
+    heartbeat, снова выдается воркеру (до max_attempts попыток).
+    Обработчик вызывается как handler(payload, progress) и возвращает
+    JSON-совместимый результат; через progress(stage=..., partial_report=...)
+    он публикует ход обработки. Исключение с атрибутами message/status_code
+    сохраняется как ошибка задачи.
+    """
+
+    def __init__(self, db_path, handler, workers=2, max_attempts=3,
+                 stale_after=120, poll_interval=0.5, retention=24 * 3600):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    partial_report TEXT,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    status_code INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    heartbeat_at REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+            # Базы, созданные до появления потоковой генерации
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ('stage', 'partial_report'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, payload):
+        """Постановка задачи в очередь, возвращает ее идентификатор"""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, json.dumps(payload, ensure_ascii=False), now, now))
+        self._wakeup.set()
+        logger.info(f"Job {job_id} queued")
+        return job_id
+
+    def get(self, job_id):
+        """Состояние задачи или None, если такой нет"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+        if row['status'] == STATUS_QUEUED:
+            with closing(self._connect()) as conn:
+                job['queue_position'] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                    (STATUS_QUEUED, row['created_at'])).fetchone()[0] + 1
+        if row['partial_report'] is not None and row['status'] == STATUS_RUNNING:
+            job['partial_report'] = row['partial_report']
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+            job['status_code'] = row['status_code']
+        return job
+
+    def get_payload(self, job_id):
+        """Параметры задачи (файлы, хэши) или None, если такой нет"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row['payload']) if row is not None else None
+
+    def claim(self, worker_name):
+        """Атомарный захват следующей задачи (или зависшей после рестарта)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND heartbeat_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (STATUS_QUEUED, STATUS_RUNNING, now - self.stale_after)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            if row['attempts'] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, status_code = ?, updated_at = ? WHERE id = ?",
+                    (STATUS_FAILED, 'Обработка прервана: превышено число попыток', 500, now, row['id']))
+                conn.execute("COMMIT")
+                logger.error(f"Job {row['id']} exceeded {self.max_attempts} attempts")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, partial_report = NULL, attempts = attempts + 1, "
+                "worker = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, worker_name, now, now, row['id']))
+            conn.execute("COMMIT")
+            return row['id'], json.loads(row['payload']), row['attempts'] + 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self, job_id):
+        self._update(job_id, heartbeat_at=time.time())
+
+    def update_progress(self, job_id, **fields):
+        """Публикация этапа (stage) и частичного отчета (partial_report)"""
+        fields = {name: value for name, value in fields.items() if name in ('stage', 'partial_report')}
+        if fields:
+            fields['heartbeat_at'] = time.time()
+            self._update(job_id, **fields)
+
+    def complete(self, job_id, result):
+        self._update(job_id, status=STATUS_DONE, result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id, error, status_code=500):
+        self._update(job_id, status=STATUS_FAILED, error=error, status_code=status_code)
+
+    def purge_expired(self):
+        """Удаление завершенных задач старше срока хранения"""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                         (STATUS_DONE, STATUS_FAILED, time.time() - self.retention))
+
+    def start_workers(self):
+        """Запуск фоновых воркеров в текущем процессе (идемпотентно, с учетом fork)"""
+        pid = os.getpid()
+        if self._started_pid == pid or self.workers <= 0:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            self._started_pid = pid
+            for i in range(self.workers):
+                name = f"{socket.gethostname()}:{pid}:{i}"
+                thread = threading.Thread(target=self._worker_loop, args=(name,),
+                                          name=f"job-worker-{i}", daemon=True)
+                thread.start()
+            logger.info(f"Started {self.workers} job workers in process {pid}")
+
+    def _worker_loop(self, worker_name):
+        last_purge = 0
+        while True:
+            try:
+                claimed = self.claim(worker_name)
+            except Exception as e:
+                logger.error(f"Job claim error: {e}")
+                claimed = None
+
+            if claimed is None:
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    try:
+                        self.purge_expired()
+                    except Exception as e:
+                        logger.error(f"Job purge error: {e}")
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload, attempt = claimed
+            logger.info(f"Job {job_id} started by {worker_name} (attempt {attempt})")
+            self._run_job(job_id, payload)
+
+    def _run_job(self, job_id, payload):
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.stale_after / 4):
+                try:
+                    self.heartbeat(job_id)
+                except Exception as e:
+                    logger.error(f"Job {job_id} heartbeat error: {e}")
+
+        beater = threading.Thread(target=beat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        beater.start()
+        try:
+            result = self.handler(payload, lambda **fields: self.update_progress(job_id, **fields))
+            self.complete(job_id, result)
+            logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            message = getattr(e, 'message', None) or f'Ошибка обработки: {str(e)}'
+            status_code = getattr(e, 'status_code', 500)
+            logger.error(f"Job {job_id} failed: {message}")
+            self.fail(job_id, message, status_code)
+        finally:
+            stop.set()
@@ -0,0 +1,71 @@
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+# Тяжелые библиотеки обработки PDF и OCR: импортируются при первом
+# обращении к атрибуту, а не при импорте приложения
+HEAVY_MODULES = ('numpy', 'cv2', 'fitz', 'pdfplumber', 'pytesseract', 'PIL.Image')
+
+
+# Выполнение отложенных модулей сериализуется: прогрев воркера и поток
+# запроса могут впервые обратиться к одному модулю одновременно
+_load_lock = threading.RLock()
+_loading = set()
+
+
+class _LazyModule(types.ModuleType):
+    """Модуль, код которого выполняется при первом обращении к атрибуту.
+
+    В отличие от importlib.util.LazyLoader (в Python 3.11), класс модуля
+    меняется на обычный только после выполнения кода, поэтому другой
+    поток не увидит недозагруженный модуль, а дождется загрузки.
+    """
+
+    def __getattribute__(self, attr):
+        with _load_lock:
+            if type(self) is _LazyModule and id(self) not in _loading:
+                # Повторные обращения из кода самого модуля идут напрямую
+                _loading.add(id(self))
+                try:
+                    spec = object.__getattribute__(self, '__spec__')
+                    spec.loader.exec_module(self)
+                    self.__class__ = types.ModuleType
+                finally:
+                    _loading.discard(id(self))
+        return types.ModuleType.__getattribute__(self, attr)
+
+
+def lazy_import(name):
+    """Модуль, который выполняется при первом обращении к его атрибуту.
+
+    Отсутствующий модуль дает ImportError сразу, как обычный import;
+    ошибки инициализации самого модуля проявятся при первом использовании.
+    Уже загруженный модуль возвращается как есть.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    module = importlib.util.module_from_spec(spec)
+    module.__class__ = _LazyModule
+    sys.modules[name] = module
+    return module
+
+
+def load_modules(names=HEAVY_MODULES):
+    """Принудительная загрузка модулей (прогрев воркера); возвращает время в секундах"""
+    start = time.perf_counter()
+    for name in names:
+        # Обращение к атрибуту выполняет отложенный модуль
+        importlib.import_module(name).__file__
+    elapsed = time.perf_counter() - start
+    logger.info(f"Loaded {', '.join(names)} in {elapsed:.2f}s")
+    return elapsed
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from config import Config
+from disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """Дисковый кэш ответов LLM по отпечатку запроса.
+
+    Ключ - SHA-256 от модели, параметров генерации, системного и
+    пользовательского промптов. Кэш лежит на диске и общий для всех
+    воркеров gunicorn; записи старше ttl считаются промахом и удаляются,
+    размер ограничен LRU-вытеснением DiskCache.
+    """
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.ttl = ttl
+        self.cache = DiskCache(directory, max_bytes, name='llm')
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'bypassed': 0, 'writes': 0}
+
+    @staticmethod
+    def fingerprint(model_uri, completion_options, messages):
+        """Отпечаток запроса; флаг stream на результат не влияет"""
+        options = {k: v for k, v in completion_options.items() if k != 'stream'}
+        payload = json.dumps([model_uri, options, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def bypass(self):
+        self._count('bypassed')
+
+    def get(self, key):
+        """Кэшированный текст ответа или None"""
+        value = self.cache.get(key)
+        if value is None:
+            self._count('misses')
+            return None
+        if time.time() - value['created_at'] > self.ttl:
+            self.cache.delete(key)
+            self._count('expired')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return value['text']
+
+    def set(self, key, text):
+        self.cache.set(key, {'created_at': time.time(), 'text': text})
+        self._count('writes')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['evictions'] = self.cache.stats()['evictions']
+        return stats
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """Кэш ответов LLM процесса или None, если он выключен"""
+    global _report_cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = ReportCache(Config.LLM_CACHE_DIR, Config.LLM_CACHE_MAX_BYTES,
+                                        Config.LLM_CACHE_TTL)
+            logger.info(f"LLM response cache enabled at {Config.LLM_CACHE_DIR}")
+        return _report_cache
@@ -0,0 +1,183 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+class LLMHttpClient:
+    """HTTP-транспорт для LLM-провайдеров.
+
+    Общая requests.Session с пулом keep-alive соединений, ограниченные
+    повторы с экспоненциальной задержкой и случайным разбросом (учитывается
+    Retry-After), ограничение числа одновременных запросов в процессе и
+    метрики задержек и повторов.
+    """
+
+    def __init__(self, name, max_retries=3, backoff_base=1.0, backoff_max=20.0,
+                 max_concurrency=4, pool_size=10):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1024)
+        self._counters = {
+            'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0,
+            'in_flight': 0, 'throttled': 0
+        }
+        self._status_codes = {}
+
+    def _count(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def _retry_delay(self, attempt, response=None):
+        """Задержка перед повтором: Retry-After или full jitter"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        delay = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    except (TypeError, ValueError, OverflowError):
+                        # Некорректный заголовок: обычная задержка со случайным разбросом
+                        logger.warning(f"{self.name} sent malformed Retry-After: {retry_after!r}")
+                        delay = None
+                if delay is not None:
+                    return min(max(delay, 0), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @contextmanager
+    def post(self, url, **kwargs):
+        """POST с повторами; используется как контекстный менеджер.
+
+        Слот лимита одновременных запросов удерживается до выхода из
+        контекста, поэтому потоковый ответ можно дочитать внутри него.
+        После исчерпания попыток возвращается последний ответ или
+        пробрасывается последнее исключение.
+        """
+        self._count('requests')
+        attempt = 0
+        while True:
+            if not self._semaphore.acquire(blocking=False):
+                self._count('throttled')
+                self._semaphore.acquire()
+            self._count('in_flight')
+            self._count('attempts')
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.post(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._release()
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"{self.name} request failed ({e.__class__.__name__}), "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            except Exception:
+                self._release()
+                self._count('failures')
+                raise
+            else:
+                self._record_status(response.status_code)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    # Слот освобождается до разбора заголовков ответа
+                    response.close()
+                    self._release()
+                    delay = self._retry_delay(attempt, response)
+                    logger.warning(f"{self.name} returned {response.status_code}, "
+                                   f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                else:
+                    break
+
+            self._count('retries')
+            attempt += 1
+            time.sleep(delay)
+
+        if response.status_code >= 400:
+            self._count('failures')
+        try:
+            yield response
+        finally:
+            # Для потоковых ответов задержка включает чтение тела
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+            response.close()
+            self._release()
+
+    def _release(self):
+        self._count('in_flight', -1)
+        self._semaphore.release()
+
+    def _record_status(self, status_code):
+        with self._lock:
+            self._status_codes[status_code] = self._status_codes.get(status_code, 0) + 1
+
+    def stats(self):
+        """Метрики клиента текущего процесса"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['status_codes'] = {str(code): count for code, count in self._status_codes.items()}
+            latencies = sorted(self._latencies)
+
+        if latencies:
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        stats['max_concurrency'] = self.max_concurrency
+        return stats
+
+
+def get_llm_client(name):
+    """Общий клиент провайдера для текущего процесса (пересоздается после fork)"""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(name)
+        if client is None:
+            client = LLMHttpClient(
+                name,
+                max_retries=Config.LLM_MAX_RETRIES,
+                backoff_base=Config.LLM_BACKOFF_BASE,
+                backoff_max=Config.LLM_BACKOFF_MAX,
+                max_concurrency=Config.LLM_MAX_CONCURRENCY,
+                pool_size=Config.LLM_POOL_SIZE)
+            _clients[name] = client
+        return client
+
+
+def get_llm_client_stats():
+    """Метрики всех клиентов текущего процесса"""
+    with _clients_lock:
+        clients = dict(_clients) if _clients_pid == os.getpid() else {}
+    return {name: client.stats() for name, client in clients.items()}
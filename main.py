@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 
@@ -5,23 +6,15 @@ import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-print("Starting Flask application...")
-print(f"Current directory: {current_dir}")
-print(f"Files in directory: {os.listdir(current_dir)}")
+logger = logging.getLogger(__name__)
 
 # Создание приложения для gunicorn (глобальная переменная)
 try:
     from app_factory import create_app
 
-    print("✓ Successfully imported create_app")
     app = create_app()
-    print("✓ Flask app created successfully")
-    print(f"✓ Available routes: {[rule.rule for rule in app.url_map.iter_rules()]}")
 except Exception as e:
-    print(f"✗ Error creating app: {e}")
-    import traceback
-
-    traceback.print_exc()
+    logger.exception(f"Error creating app: {e}")
 
     # Fallback приложение
     from flask import Flask, jsonify
@@ -42,8 +35,13 @@ except Exception as e:
     def health():
         return jsonify({"status": "fallback_healthy"})
 
+
+    @app.route('/ready')
+    def ready():
+        return jsonify({"status": "fallback"}), 503
+
 # Для прямого запуска
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 8000))
-    print(f"Starting development server on port: {port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    logger.info(f"Starting development server on port: {port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,283 @@
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы длительностей этапов, секунды
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+METRIC_PREFIX = 'pdfsurge'
+
+_trace = contextvars.ContextVar('pdfsurge_trace', default=None)
+
+
+def _new_stage():
+    return {'buckets': [0] * len(STAGE_BUCKETS), 'count': 0, 'sum': 0.0, 'pages': 0, 'bytes': 0, 'errors': 0}
+
+
+class MetricsRegistry:
+    """Гистограммы длительностей этапов обработки с агрегацией по воркерам.
+
+    Каждый процесс копит свои счетчики в памяти, а фоновый поток раз в
+    flush_interval сбрасывает измененный снимок в файл metrics_<pid>.json
+    общего каталога (запись атомарная). /metrics любого воркера суммирует все файлы, поэтому
+    ответ не зависит от того, какой воркер gunicorn его обслужил. Файлы
+    завершившихся воркеров не удаляются, чтобы счетчики не убывали;
+    каталог очищается при старте мастера (reset).
+    """
+
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._pid = os.getpid()
+        self._dirty = False
+        self._flusher_pid = None
+
+    def _check_fork(self):
+        # После fork наследованные счетчики принадлежат родителю
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stages = {}
+            self._dirty = False
+
+    def _start_flusher(self):
+        # Вызывается под self._lock; потоки не переживают fork, поэтому по pid
+        if self._flusher_pid == self._pid:
+            return
+        self._flusher_pid = self._pid
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def observe(self, stage, seconds, pages=0, size=0, error=False):
+        with self._lock:
+            self._check_fork()
+            data = self._stages.get(stage)
+            if data is None:
+                data = self._stages[stage] = _new_stage()
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    data['buckets'][i] += 1
+                    break
+            data['count'] += 1
+            data['sum'] += seconds
+            data['pages'] += pages
+            data['bytes'] += size
+            data['errors'] += int(error)
+            self._dirty = True
+            self._start_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {stage: dict(data, buckets=list(data['buckets'])) for stage, data in self._stages.items()}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def flush(self):
+        """Атомарная запись снимка процесса в каталог метрик"""
+        with self._lock:
+            if not self._dirty or self._pid != os.getpid():
+                return
+            self._dirty = False
+        snapshot = self.snapshot()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self._path(os.getpid()))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.error(f"Metrics flush error: {e}")
+
+    def collect(self):
+        """Сумма снимков всех процессов: (этапы, число процессов)"""
+        self.flush()
+        snapshots = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    snapshots[name] = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot read metrics file {name}: {e}")
+        # Свой процесс берем из памяти, а не из файла
+        snapshots[os.path.basename(self._path(os.getpid()))] = self.snapshot()
+
+        total = {}
+        for snapshot in snapshots.values():
+            for stage, data in snapshot.items():
+                merged = total.setdefault(stage, _new_stage())
+                if len(data.get('buckets', ())) != len(STAGE_BUCKETS):
+                    continue
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], data['buckets'])]
+                for key in ('count', 'sum', 'pages', 'bytes', 'errors'):
+                    merged[key] += data.get(key, 0)
+        return total, len(snapshots)
+
+    def render_prometheus(self):
+        """Текстовый формат экспозиции Prometheus"""
+        stages, processes = self.collect()
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Duration of processing stages.", f"# TYPE {name} histogram"]
+        for stage in sorted(stages):
+            data = stages[stage]
+            cumulative = 0
+            for bound, count in zip(STAGE_BUCKETS, data['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {data["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {data["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {data["count"]}')
+
+        for key, help_text in (('pages', 'Pages handled by processing stages.'),
+                               ('bytes', 'Bytes handled by processing stages.'),
+                               ('errors', 'Processing stages that raised an error.')):
+            counter = f"{METRIC_PREFIX}_stage_{key}_total"
+            lines.append(f"# HELP {counter} {help_text}")
+            lines.append(f"# TYPE {counter} counter")
+            for stage in sorted(stages):
+                lines.append(f'{counter}{{stage="{stage}"}} {stages[stage][key]}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_metric_processes Processes that reported metrics.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_metric_processes gauge")
+        lines.append(f"{METRIC_PREFIX}_metric_processes {processes}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Очистка каталога метрик (при старте мастера gunicorn)"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith('metrics_'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+class RequestTrace:
+    """Разбивка времени одного запроса по этапам (для ответа с debug=1).
+
+    Этапы агрегируются по имени, поэтому сотни страниц дают несколько
+    строк, а не список из тысяч спанов.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, stage, seconds, pages=0, size=0):
+        with self._lock:
+            data = self._stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'pages': 0, 'bytes': 0})
+            data['count'] += 1
+            data['seconds'] += seconds
+            data['pages'] += pages
+            data['bytes'] += size
+
+    def summary(self):
+        with self._lock:
+            stages = {stage: dict(data, seconds=round(data['seconds'], 4))
+                      for stage, data in self._stages.items()}
+        return {'total_seconds': round(time.perf_counter() - self.started, 4), 'stages': stages}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Реестр метрик процесса или None, если метрики выключены"""
+    global _registry
+    if not Config.METRICS_ENABLED:
+        return None
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry(Config.METRICS_DIR, Config.METRICS_FLUSH_INTERVAL)
+    return _registry
+
+
+def observe(stage, seconds, pages=0, size=0, error=False):
+    """Запись длительности этапа в метрики процесса и трассу текущего запроса"""
+    registry = get_metrics()
+    if registry is not None:
+        registry.observe(stage, seconds, pages, size, error)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, seconds, pages, size)
+
+
+class Span:
+    """Открытый этап; размеры можно уточнить по ходу (span.update)"""
+
+    def __init__(self, stage, pages=0, size=0):
+        self.stage = stage
+        self.pages = pages
+        self.size = size
+
+    def update(self, pages=None, size=None):
+        if pages is not None:
+            self.pages = pages
+        if size is not None:
+            self.size = size
+
+
+@contextmanager
+def span(stage, pages=0, size=0):
+    """Замер этапа: with span('merge', pages=n) as s: ...; s.update(size=...)"""
+    current = Span(stage, pages, size)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, current.pages, current.size, error)
+
+
+@contextmanager
+def request_trace():
+    """Трасса запроса: все этапы в этом контексте попадают в RequestTrace"""
+    trace = RequestTrace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def run_in_context(executor, func, items):
+    """executor.map с передачей контекста (трассы запроса) в потоки пула"""
+    # Контекст копируется в вызывающем потоке, по копии на задачу:
+    # один Context нельзя выполнять в нескольких потоках одновременно
+    tasks = [(contextvars.copy_context(), item) for item in items]
+    return executor.map(lambda task: task[0].run(func, task[1]), tasks)
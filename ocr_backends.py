@@ -0,0 +1,285 @@
+import glob
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from config import Config
+from lazy_modules import lazy_import
+from ocr_quality import parse_tsv, to_result
+
+np = lazy_import('numpy')
+pytesseract = lazy_import('pytesseract')
+Image = lazy_import('PIL.Image')
+
+try:
+    tesserocr = lazy_import('tesserocr')
+except ImportError:  # tesserocr собирается против libtesseract и может отсутствовать
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Каталог моделей в выводе "tesseract --list-langs" (Tesseract 4/5)
+TESSDATA_LIST_LANGS = re.compile(r'List of available languages in "(.+?)"')
+# Каталоги моделей пакетов дистрибутивов: версия Tesseract - часть пути
+TESSDATA_CANDIDATES = ('/usr/share/tesseract-ocr/*/tessdata', '/usr/share/tessdata', '/usr/local/share/tessdata')
+
+
+def find_tessdata_path():
+    """Каталог моделей Tesseract для tesserocr.
+
+    TESSDATA_PATH из настроек, иначе каталог, о котором сообщает
+    установленный tesseract, иначе первый стандартный каталог с
+    *.traineddata. None - путь, вкомпилированный в libtesseract.
+    """
+    if Config.TESSDATA_PATH:
+        return Config.TESSDATA_PATH
+    try:
+        output = subprocess.run(['tesseract', '--list-langs'], capture_output=True, text=True, timeout=10)
+        match = TESSDATA_LIST_LANGS.search(output.stdout + output.stderr)
+        if match and os.path.isdir(match.group(1)):
+            return match.group(1)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Cannot query tesseract for its tessdata path: {e}")
+    for pattern in TESSDATA_CANDIDATES:
+        for path in sorted(glob.glob(pattern), reverse=True):
+            if glob.glob(os.path.join(path, '*.traineddata')):
+                return path
+    return None
+
+
+class OCRBackend(ABC):
+    """Интерфейс движка OCR для PDFProcessor"""
+
+    name = 'base'
+
+    @abstractmethod
+    def image_to_string(self, image, lang=None, psm=6):
+        """Распознать изображение (numpy-массив или PIL Image) в текст"""
+
+    @abstractmethod
+    def image_to_data(self, image, lang=None, psm=6):
+        """Распознать изображение в OCRResult: текст и слова с уверенностью и рамками"""
+
+    def images_to_data(self, images, lang=None, psm=6):
+        """Распознать пакет изображений; OCRResult в том же порядке.
+
+        По умолчанию - цикл по image_to_data; движки, которые умеют
+        обработать пакет за один запуск, переопределяют метод.
+        """
+        return [self.image_to_data(image, lang=lang, psm=psm) for image in images]
+
+    def detect_orientation(self, image):
+        """Ориентация страницы (OSD): (поворот по часовой стрелке 0/90/180/270, уверенность).
+
+        Если OSD недоступен (нет osd.traineddata) или текста мало, возвращает (0, 0.0).
+        """
+        return 0, 0.0
+
+
+def to_pil_image(image):
+    """numpy-массив OpenCV -> PIL Image для передачи в pytesseract"""
+    if not isinstance(image, np.ndarray):
+        return image
+    if image.ndim == 3 and image.shape[2] == 3:
+        # OpenCV хранит каналы в порядке BGR
+        image = image[:, :, ::-1]
+    image = Image.fromarray(np.ascontiguousarray(image))
+    # pytesseract передает изображение через временный файл; BMP пишется
+    # без сжатия, в отличие от PNG по умолчанию
+    image.format = 'BMP'
+    return image
+
+
+class PytesseractBackend(OCRBackend):
+    """OCR через pytesseract: отдельный процесс tesseract на каждую страницу"""
+
+    name = 'pytesseract'
+
+    def __init__(self, tesseract_cmd='/usr/bin/tesseract'):
+        # В Docker контейнере Tesseract всегда находится по стандартному пути
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        logger.info(f"Tesseract configured for Docker container at {tesseract_cmd}")
+        self.osd_available = True
+
+    def image_to_string(self, image, lang=None, psm=6):
+        config = f'--oem 3 --psm {psm}'
+        image = to_pil_image(image)
+        if lang:
+            return pytesseract.image_to_string(image, lang=lang, config=config)
+        # Fallback без языка
+        return pytesseract.image_to_string(image, config=config)
+
+    def image_to_data(self, image, lang=None, psm=6):
+        tsv = pytesseract.image_to_data(to_pil_image(image), lang=lang or None, config=f'--oem 3 --psm {psm}')
+        pages = parse_tsv(tsv)
+        if pages is None:
+            raise RuntimeError("unexpected tesseract TSV output")
+        return to_result(pages[0])
+
+    def images_to_data(self, images, lang=None, psm=6):
+        """Пакет страниц одним запуском tesseract через файл-список изображений.
+
+        Модель языка загружается один раз на пакет, а не на каждую
+        страницу. Страницы в TSV-выводе различаются колонкой page_num;
+        если их число не сошлось, пакет распознается постранично.
+        """
+        if len(images) < 2:
+            return super().images_to_data(images, lang=lang, psm=psm)
+
+        with tempfile.TemporaryDirectory(prefix='ocr_batch_') as tmp_dir:
+            paths = []
+            for i, image in enumerate(images):
+                path = os.path.join(tmp_dir, f'page_{i:04d}.bmp')
+                to_pil_image(image).save(path, format='BMP')
+                paths.append(path)
+            list_path = os.path.join(tmp_dir, 'pages.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(paths) + '\n')
+
+            output_base = os.path.join(tmp_dir, 'output')
+            pytesseract.pytesseract.run_tesseract(list_path, output_base, 'tsv', lang or None,
+                                                  config=f'-c tessedit_create_tsv=1 --oem 3 --psm {psm}')
+            with open(f'{output_base}.tsv', 'r', encoding='utf-8') as f:
+                output = f.read()
+
+        pages = parse_tsv(output, len(images))
+        if pages is None:
+            logger.warning(f"Tesseract batch output does not match {len(images)} images, "
+                           f"falling back to page-by-page OCR")
+            return super().images_to_data(images, lang=lang, psm=psm)
+        return [to_result(words) for words in pages]
+
+    def detect_orientation(self, image):
+        if not self.osd_available:
+            return 0, 0.0
+        try:
+            osd = pytesseract.image_to_osd(to_pil_image(image), config='--psm 0',
+                                           output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError as e:
+            if 'osd' in str(e).lower():
+                # Нет osd.traineddata: больше не пытаемся
+                logger.warning(f"Tesseract OSD is unavailable, orientation detection disabled: {e}")
+                self.osd_available = False
+            return 0, 0.0
+        except Exception as e:
+            logger.warning(f"OSD error: {e}")
+            return 0, 0.0
+        return int(osd.get('rotate', 0)) % 360, float(osd.get('orientation_conf', 0.0))
+
+
+class TesserocrBackend(OCRBackend):
+    """OCR через libtesseract (tesserocr) с долгоживущими движками.
+
+    Модель языка загружается один раз на поток и параметры (lang, psm),
+    изображение передается в движок из памяти без временных файлов.
+    PyTessBaseAPI не потокобезопасен, поэтому у каждого потока пула OCR
+    свой экземпляр. Пакет страниц (images_to_data) распознается в
+    цикле тем же движком: модель уже загружена, запуск процесса не нужен.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, tessdata_path=None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.tessdata_path = tessdata_path
+        if tessdata_path:
+            _, languages = tesserocr.get_languages(tessdata_path)
+        else:
+            _, languages = tesserocr.get_languages()
+        if not languages:
+            raise RuntimeError("no traineddata found for tesserocr")
+        self.osd_available = 'osd' in languages
+        self._local = threading.local()
+        logger.info(f"Using in-process Tesseract {tesserocr.tesseract_version().splitlines()[0]}")
+
+    def _get_api(self, lang, psm):
+        apis = getattr(self._local, 'apis', None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        key = (lang or 'eng', psm)
+        api = apis.get(key)
+        if api is None:
+            kwargs = {'lang': key[0], 'psm': tesserocr.PSM(psm), 'oem': tesserocr.OEM.DEFAULT}
+            if self.tessdata_path:
+                kwargs['path'] = self.tessdata_path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            apis[key] = api
+            logger.info(f"Initialized Tesseract engine for {key[0]} (psm {psm}) "
+                        f"in thread {threading.current_thread().name}")
+        return api
+
+    @staticmethod
+    def _set_image(api, image):
+        if isinstance(image, np.ndarray):
+            if image.ndim == 3 and image.shape[2] == 3:
+                # OpenCV хранит каналы в порядке BGR
+                image = image[:, :, ::-1]
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            height, width = image.shape[:2]
+            channels = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+        else:
+            api.SetImage(image)
+
+    def image_to_string(self, image, lang=None, psm=6):
+        api = self._get_api(lang, psm)
+        try:
+            self._set_image(api, image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+    def image_to_data(self, image, lang=None, psm=6):
+        api = self._get_api(lang, psm)
+        try:
+            self._set_image(api, image)
+            api.Recognize()
+            pages = parse_tsv(api.GetTSVText(0))
+        finally:
+            api.Clear()
+        if pages is None:
+            raise RuntimeError("unexpected tesseract TSV output")
+        return to_result(pages[0])
+
+    def detect_orientation(self, image):
+        if not self.osd_available:
+            return 0, 0.0
+        api = self._get_api('osd', tesserocr.PSM.OSD_ONLY)
+        try:
+            self._set_image(api, image)
+            osd = api.DetectOrientationScript()
+        except Exception as e:
+            logger.warning(f"OSD error: {e}")
+            return 0, 0.0
+        finally:
+            api.Clear()
+        if not osd:
+            return 0, 0.0
+        # orient_deg - ориентация текста; для исправления поворачиваем в обратную сторону
+        return (360 - int(osd['orient_deg'])) % 360, float(osd['orient_conf'])
+
+
+def create_ocr_backend(name=None):
+    """Создание движка OCR по имени: 'tesserocr', 'pytesseract' или 'auto'.
+
+    Если tesserocr недоступен, используется pytesseract.
+    """
+    name = (name or Config.OCR_BACKEND).lower()
+
+    if name in ('tesserocr', 'auto'):
+        if tesserocr is not None:
+            try:
+                return TesserocrBackend(find_tessdata_path())
+            except Exception as e:
+                logger.warning(f"Cannot initialize tesserocr backend: {e}")
+        elif name == 'tesserocr':
+            logger.warning("tesserocr is not installed, falling back to pytesseract")
+    elif name != 'pytesseract':
+        logger.warning(f"Unknown OCR backend '{name}', falling back to pytesseract")
+
+    return PytesseractBackend()
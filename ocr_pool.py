@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class OCRPagePool:
+    """Общий ограниченный пул потоков для постраничного OCR.
+
+    Пул один на процесс gunicorn, поэтому одновременно выполняется не
+    больше max_workers страниц, сколько бы загрузок ни обрабатывалось.
+    Каждый tesseract запускается отдельным процессом, поэтому потоки
+    не упираются в GIL.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='ocr')
+        logger.info(f"OCR page pool started with {max_workers} workers")
+
+    def submit(self, func, arg):
+        return self.executor.submit(func, arg)
+
+    def map_ordered(self, func, items, window=None):
+        """Выполнение func над элементами с сохранением порядка.
+
+        items - итерируемое из пар (ключ, аргумент); аргументы берутся
+        лениво, поэтому в памяти одновременно не больше window страниц.
+        Аргумент-Future (см. completed) в пул не отправляется, а выдается
+        в своей очереди как готовый результат.
+        Возвращает генератор троек (ключ, результат, ошибка): ошибка
+        одной страницы не прерывает обработку остальных.
+        """
+        window = max(1, window or self.max_workers)
+        pending = deque()
+
+        for key, arg in items:
+            if len(pending) >= window:
+                yield self._collect(*pending.popleft())
+            future = arg if isinstance(arg, Future) else self.submit(func, arg)
+            pending.append((key, future))
+
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    @staticmethod
+    def completed(result):
+        """Готовый результат для map_ordered, не требующий работы в пуле"""
+        future = Future()
+        future.set_result(result)
+        return future
+
+    @staticmethod
+    def _collect(key, future):
+        try:
+            return key, future.result(), None
+        except Exception as e:
+            return key, None, e
+
+
+def get_ocr_pool():
+    """Пул OCR текущего процесса (создается заново после fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = OCRPagePool(Config.OCR_WORKERS)
+                _pool_pid = pid
+    return _pool
@@ -0,0 +1,133 @@
+import re
+from collections import namedtuple
+
+# Слово OCR: текст, уверенность 0-100, рамка (left, top, width, height) в
+# пикселях изображения и ключ строки (блок, абзац, строка)
+OCRWord = namedtuple('OCRWord', ['text', 'conf', 'box', 'line'])
+
+# Результат распознавания изображения: текст и слова с уверенностью
+OCRResult = namedtuple('OCRResult', ['text', 'words'])
+
+# Обозначения отведений ЭКГ (I, aVL, V5) и римские цифры (S I Q III, стадия II):
+# короткие токены, которые при низкой уверенности похожи на шум, но несут сведения
+PROTECTED_TOKEN = re.compile(r'[IVX]{1,5}|a[Vv][RLFrlf]|V[1-9]')
+TOKEN = re.compile(r'[^\W_]+')
+
+# Уровни страницы и слова в TSV-выводе tesseract
+TSV_PAGE_LEVEL = 1
+TSV_WORD_LEVEL = 5
+
+
+def parse_tsv(tsv, pages=1):
+    """Слова из TSV tesseract (image_to_data, GetTSVText) по страницам.
+
+    Возвращает список из pages списков OCRWord; страница задается
+    колонкой page_num (с единицы), при распознавании файла-списка это
+    номер изображения. None, если число страниц в выводе другое.
+    """
+    result = [[] for _ in range(pages)]
+    page_rows = 0
+    for row in tsv.splitlines():
+        fields = row.split('\t')
+        if len(fields) < 12 or not fields[0].isdigit():
+            continue
+        level = int(fields[0])
+        page = int(fields[1]) - 1
+        if not 0 <= page < pages:
+            return None
+        if level == TSV_PAGE_LEVEL:
+            page_rows += 1
+            continue
+        text = fields[11].strip()
+        conf = float(fields[10])
+        # Строки уровней блока, абзаца и строки идут с уверенностью -1
+        if level != TSV_WORD_LEVEL or not text or conf < 0:
+            continue
+        box = (int(fields[6]), int(fields[7]), int(fields[8]), int(fields[9]))
+        result[page].append(OCRWord(text, conf, box, (int(fields[2]), int(fields[3]), int(fields[4]))))
+    return result if page_rows == pages else None
+
+
+def words_to_text(words):
+    """Текст из слов: строки через перевод строки, абзацы - через пустую строку"""
+    parts = []
+    previous = None
+    for word in words:
+        if previous is None:
+            pass
+        elif word.line == previous:
+            parts.append(' ')
+        elif word.line[:2] == previous[:2]:
+            parts.append('\n')
+        else:
+            parts.append('\n\n')
+        parts.append(word.text)
+        previous = word.line
+    return ''.join(parts) + '\n' if parts else ''
+
+
+def to_result(words):
+    return OCRResult(words_to_text(words), words)
+
+
+def mean_confidence(words):
+    """Уверенность распознавания (0-100): средняя по словам с весом по длине; None без слов"""
+    chars = sum(len(word.text) for word in words)
+    if not chars:
+        return None
+    return sum(word.conf * len(word.text) for word in words) / chars
+
+
+def group_lines(words):
+    """Слова по строкам в порядке чтения: [(ключ строки, [слова])]"""
+    lines = []
+    for word in words:
+        if lines and lines[-1][0] == word.line:
+            lines[-1][1].append(word)
+        else:
+            lines.append((word.line, [word]))
+    return lines
+
+
+def line_box(words):
+    """Общая рамка слов строки (left, top, right, bottom)"""
+    return (min(word.box[0] for word in words), min(word.box[1] for word in words),
+            max(word.box[0] + word.box[2] for word in words), max(word.box[1] + word.box[3] for word in words))
+
+
+def low_confidence_lines(words, threshold):
+    """Строки со средней уверенностью ниже threshold: [(ключ строки, [слова])]"""
+    return [(key, line) for key, line in group_lines(words) if mean_confidence(line) < threshold]
+
+
+def replace_lines(words, replacements):
+    """Слова страницы, где слова строк из replacements ({ключ: [слова]}) заменены"""
+    result = []
+    for key, line in group_lines(words):
+        replacement = replacements.get(key)
+        if replacement is None:
+            result.extend(line)
+        else:
+            result.extend(word._replace(line=key) for word in replacement)
+    return result
+
+
+def is_protected_line(words):
+    """В строке есть обозначение отведения ЭКГ или римская цифра"""
+    return any(PROTECTED_TOKEN.fullmatch(token) for word in words for token in TOKEN.findall(word.text))
+
+
+def drop_noise_lines(words, threshold):
+    """Слова страницы без строк-шума OCR: (слова, число удаленных строк).
+
+    Шум - строка со средней уверенностью ниже threshold (обрывки штампов,
+    подписей, рамок), если в ней нет обозначений отведений и римских цифр.
+    """
+    kept = []
+    dropped = 0
+    for _, line in group_lines(words):
+        if mean_confidence(line) < threshold and not is_protected_line(line):
+            dropped += 1
+        else:
+            kept.extend(line)
+    return kept, dropped
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+class PageCheckpointStore:
+    """Постраничные контрольные точки извлечения текста на SQLite.
+
+    Результат каждой страницы записывается по мере готовности с ключом
+    (SHA-256 файла, версия извлечения, номер страницы). Если воркер
+    gunicorn убит по таймауту или пересоздан посреди OCR длинного скана,
+    повторная попытка задачи или повторная загрузка того же файла
+    продолжает с недоделанных страниц, а уже готовые страницы доступны
+    для чтения, пока задача еще выполняется. Страницы с ошибкой OCR не
+    сохраняются, чтобы следующая попытка распознала их заново.
+    Записи старше retention удаляются.
+    """
+
+    def __init__(self, db_path, config_fingerprint, retention=24 * 3600, flush_interval=1.0):
+        self.db_path = db_path
+        self.version = hashlib.sha256(config_fingerprint.encode('utf-8')).hexdigest()[:16]
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0.0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_checkpoints (
+                    file_hash TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    method TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    image_hash TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (file_hash, version, page_num)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS page_checkpoints_updated ON page_checkpoints (updated_at)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(page_checkpoints)")}
+            if 'image_hash' not in columns:
+                # Без pHash сканов старые записи дедуплицировались бы иначе, чем свежее извлечение
+                conn.execute("DELETE FROM page_checkpoints")
+                conn.execute("ALTER TABLE page_checkpoints ADD COLUMN image_hash TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self, file_hash):
+        """Готовые страницы файла: {номер страницы: (метод, текст, pHash скана или None)}"""
+        self._maybe_purge()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT page_num, method, text, image_hash FROM page_checkpoints "
+                "WHERE file_hash = ? AND version = ?",
+                (file_hash, self.version)).fetchall()
+        return {page_num: (method, text, int(image_hash, 16) if image_hash else None)
+                for page_num, method, text, image_hash in rows}
+
+    def count(self, file_hash):
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM page_checkpoints WHERE file_hash = ? AND version = ?",
+                (file_hash, self.version)).fetchone()[0]
+
+    def save(self, file_hash, records):
+        """Запись страниц [(номер, метод, текст, pHash скана или None), ...] одной транзакцией"""
+        if not records:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_checkpoints "
+                "(file_hash, version, page_num, method, text, image_hash, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                # pHash (IMAGE_HASH_BITS бит) не помещается в INTEGER SQLite
+                [(file_hash, self.version, page_num, method, text,
+                  format(image_hash, 'x') if image_hash is not None else None, now)
+                 for page_num, method, text, image_hash in records])
+            conn.execute("COMMIT")
+
+    def writer(self, file_hash):
+        return CheckpointWriter(self, file_hash)
+
+    def _maybe_purge(self):
+        # Устаревшие записи удаляются не чаще раза в час
+        now = time.time()
+        if now - self._last_purge < 3600 or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            with closing(self._connect()) as conn:
+                deleted = conn.execute("DELETE FROM page_checkpoints WHERE updated_at < ?",
+                                       (now - self.retention,)).rowcount
+            if deleted:
+                logger.info(f"Purged {deleted} expired page checkpoints")
+        except Exception as e:
+            logger.error(f"Page checkpoint purge error: {e}")
+        finally:
+            self._purge_lock.release()
+
+
+class CheckpointWriter:
+    """Буфер контрольных точек одного файла.
+
+    Быстрые страницы текстового слоя копятся и пишутся пачкой раз в
+    flush_interval, поэтому на сотнях страниц нет транзакции на каждую;
+    при прерывании теряется не больше последнего интервала.
+    """
+
+    def __init__(self, store, file_hash):
+        self.store = store
+        self.file_hash = file_hash
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def add(self, record, image_hash=None):
+        self._pending.append((record.page_num, record.method, record.text, image_hash))
+        if time.monotonic() - self._last_flush >= self.store.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        records, self._pending = self._pending, []
+        try:
+            self.store.save(self.file_hash, records)
+        except Exception as e:
+            logger.error(f"Page checkpoint write error for {self.file_hash[:12]}: {e}")
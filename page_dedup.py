@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import re
+import threading
+from lazy_modules import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+fitz = lazy_import('fitz')  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r'\w+')
+# Числа и даты: 12,5 / 12.5 / 01.02.2024 / 1/2/24 / 10:30
+NUMBER = re.compile(r'\d+(?:[.,:/-]\d+)*')
+DIGITS = re.compile(r'\d+')
+
+# Простое число больше 2^32 для универсального хэширования MinHash
+MINHASH_PRIME = (1 << 32) + 15
+
+
+# Размер pHash: DCT уменьшенной до IMAGE_HASH_SIZE копии и ее угол
+# IMAGE_HASH_LOW x IMAGE_HASH_LOW. Классические 8x8 для страниц текста не
+# годятся: в низком разрешении любые страницы - серые полосы строк
+IMAGE_HASH_SIZE = 128
+IMAGE_HASH_LOW = 24
+IMAGE_HASH_BITS = IMAGE_HASH_LOW * IMAGE_HASH_LOW
+
+
+def image_hash(image):
+    """Перцептивный хэш (pHash, IMAGE_HASH_BITS бит) изображения в градациях серого.
+
+    Бит - низкочастотный коэффициент DCT выше медианы. Хэш устойчив к
+    шуму, пережатию и небольшому наклону повторного скана, в отличие от
+    хэша байтов.
+    """
+    small = cv2.resize(image, (IMAGE_HASH_SIZE, IMAGE_HASH_SIZE), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small.astype(np.float32))[:IMAGE_HASH_LOW, :IMAGE_HASH_LOW].flatten()
+    # Постоянная составляющая зависит только от яркости
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def page_image_hash(page, dpi=36):
+    """pHash растра страницы PyMuPDF в низком разрешении"""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return image_hash(image)
+
+
+def text_shingles(text, size=5):
+    """Множество хэшей шинглов - последовательностей из size слов"""
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        return {_hash32(' '.join(words))} if words else set()
+    return {_hash32(' '.join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def text_numbers(text):
+    """Числа и даты текста по порядку, приведенные к одному виду (12,5 = 12.5, 01.02 = 1.2)"""
+    return tuple(tuple(int(part) for part in DIGITS.findall(number)) for number in NUMBER.findall(text))
+
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class PageDeduplicator:
+    """Поиск повторяющихся страниц в пределах одной загрузки.
+
+    Страница - повтор, если оценка MinHash коэффициента Жаккара шинглов
+    ее текста с ранее встреченной страницей не ниже text_similarity и все
+    числа и даты текста совпадают: бланки одного анализа с разными
+    значениями - разные сведения, даже если шаблон совпал почти целиком.
+    Сканы дополнительно сравниваются по pHash растра: распознанная
+    страница может быть повтором только почти тождественного скана
+    (доля совпадающих бит не ниже image_similarity). Совпадения растра
+    недостаточно, и OCR не пропускается: в низком разрешении бланки
+    одного вида с разными значениями почти неотличимы. Хэши сканов
+    сравниваются перебором (XOR и подсчет бит целых чисел дешев и для
+    тысячи страниц), кандидаты по тексту - по полосам LSH. Первая
+    встреченная страница считается оригиналом, повторы попадают в dropped.
+    """
+
+    def __init__(self, image_similarity=0.98, text_similarity=0.9, min_text_chars=200, num_perm=64, bands=16):
+        self.image_similarity = image_similarity
+        self.text_similarity = text_similarity
+        self.min_text_chars = min_text_chars
+        self.num_perm = num_perm
+        self.rows = num_perm // bands
+        self.dropped = []
+        self._lock = threading.Lock()
+        self._images = []
+        self._text_index = {}
+        self._signatures = {}
+        self._numbers = {}
+        rng = np.random.default_rng(0x5eed)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+    def _drop(self, source, page_num, original, match, similarity):
+        entry = {'file': source, 'page': page_num + 1,
+                 'duplicate_of': {'file': original[0], 'page': original[1] + 1},
+                 'match': match, 'similarity': round(similarity, 3)}
+        self.dropped.append(entry)
+        logger.info(f"Page {page_num + 1} of {source} duplicates page {original[1] + 1} "
+                    f"of {original[0]} ({match}, similarity {similarity:.2f})")
+
+    def check_image(self, source, page_num, value):
+        """Ранее встреченные почти тождественные сканы [(источник, страница)] (скан запоминается)"""
+        max_distance = int((1 - self.image_similarity) * IMAGE_HASH_BITS)
+        with self._lock:
+            similar = [key for key, original in self._images
+                       if bin(original ^ value).count('1') <= max_distance]
+            self._images.append(((source, page_num), value))
+        return similar
+
+    def minhash(self, shingles):
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+    def check_text(self, source, page_num, text, scans=None):
+        """Оригинал (источник, страница) для повторного текста или None (страница запоминается).
+
+        scans - для распознанной страницы результат check_image: оригиналом
+        может быть только один из этих почти тождественных сканов.
+        """
+        if len(text.strip()) < self.min_text_chars:
+            return None
+        shingles = text_shingles(text)
+        if not shingles:
+            return None
+        signature = self.minhash(shingles)
+        numbers = text_numbers(text)
+        bands = [(i, signature[i * self.rows:(i + 1) * self.rows].tobytes())
+                 for i in range(self.num_perm // self.rows)]
+        with self._lock:
+            candidates = {key for band in bands for key in self._text_index.get(band, ())}
+            if scans is not None:
+                candidates &= set(scans)
+            for key in sorted(candidates):
+                similarity = float(np.mean(self._signatures[key] == signature))
+                if similarity >= self.text_similarity and self._numbers[key] == numbers:
+                    self._drop(source, page_num, key, 'text' if scans is None else 'image+text', similarity)
+                    return key
+            for band in bands:
+                self._text_index.setdefault(band, []).append((source, page_num))
+            self._signatures[(source, page_num)] = signature
+            self._numbers[(source, page_num)] = numbers
+        return None
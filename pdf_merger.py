@@ -1,11 +1,41 @@
-import fitz  # PyMuPDF
 import os
 import logging
+import uuid
 from datetime import datetime
+from lazy_modules import lazy_import
+
+fitz = lazy_import('fitz')  # PyMuPDF
 
 logger = logging.getLogger(__name__)
 
 
+class PDFBundle:
+    """Виртуальный многодокументный источник.
+
+    Позволяет обходить загруженные файлы как один комплект без
+    физического объединения: документы открываются по одному,
+    промежуточный merged-файл не пишется, границы документов
+    сохраняются.
+    """
+
+    def __init__(self, pdf_paths):
+        self.pdf_paths = list(pdf_paths)
+
+    def __len__(self):
+        return len(self.pdf_paths)
+
+    def names(self):
+        return [os.path.basename(p) for p in self.pdf_paths]
+
+    def documents(self):
+        """Генератор (номер документа, путь) по существующим файлам"""
+        for index, pdf_path in enumerate(self.pdf_paths, 1):
+            if os.path.exists(pdf_path):
+                yield index, pdf_path
+            else:
+                logger.error(f"File not found: {pdf_path}")
+
+
 class PDFMerger:
     def __init__(self):
         pass
@@ -35,10 +65,11 @@ class PDFMerger:
 
             # Генерируем имя для объединенного файла
             if not output_path:
+                # Суффикс uuid исключает коллизии запросов в одну секунду
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_path = os.path.join(
                     os.path.dirname(pdf_paths[0]),
-                    f"merged_{timestamp}.pdf"
+                    f"merged_{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
                 )
 
             # Сохраняем объединенный документ
@@ -1,28 +1,188 @@
-import fitz  # PyMuPDF
-import pdfplumber
-import pytesseract
-from PIL import Image
-import io
 import logging
+import math
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from config import Config
+from cpu_pool import CPUWorkPool, get_cpu_pool
 from deskew_processor import DeskewProcessor
+from extraction_cache import ExtractionCache
+from ocr_backends import create_ocr_backend
+from lazy_modules import HEAVY_MODULES, lazy_import, load_modules
+from metrics import observe, span
+from ocr_pool import OCRPagePool, get_ocr_pool
+from ocr_quality import (drop_noise_lines, line_box, low_confidence_lines, mean_confidence, replace_lines,
+                         to_result)
+from page_checkpoints import PageCheckpointStore
+from page_dedup import PageDeduplicator, page_image_hash
+from pdf_merger import PDFBundle
+from structured_extraction import extract_layout, layout_to_text
 import subprocess
 
+fitz = lazy_import('fitz')  # PyMuPDF
+pdfplumber = lazy_import('pdfplumber')
+
 logger = logging.getLogger(__name__)
 
+# Результат извлечения одной страницы: номер (с нуля), метод, текст,
+# длительности этапов в секундах ({'extract': ..., 'render': ..., 'osd': ...,
+# 'deskew': ..., 'tesseract': ..., 'retry': ...}) и уверенность OCR (0-100,
+# None для страниц без распознавания)
+PageRecord = namedtuple('PageRecord', ['page_num', 'method', 'text', 'timings', 'confidence'],
+                        defaults=[None])
+
+# Этапы страницы OCR в порядке выполнения (ключи PageRecord.timings)
+OCR_PAGE_STAGES = ('render', 'osd', 'deskew', 'tesseract', 'retry')
+
+# Режим Tesseract для повторного распознавания отдельной строки
+OCR_LINE_PSM = 7
+
+
+def format_page(record):
+    """Фрагмент объединенного текста для страницы ('' для пустой)"""
+    if not record.text or not record.text.strip():
+        return ""
+    return f"\n--- Страница {record.page_num + 1} ---\n{record.text}\n"
+
+
+def join_pages(records):
+    """Сборка текста документа из потока записей страниц за один проход"""
+    return "".join(format_page(record) for record in records).strip()
+
+
+def batch_ocr_tasks(items, batch_size=None):
+    """Группировка подряд идущих задач OCR документа в пакеты.
+
+    items - пары (номер страницы, задача) для map_ordered; готовые
+    результаты (Future) проходят как есть и завершают текущий пакет,
+    поэтому порядок страниц сохраняется. Пакет выдается как
+    (кортеж номеров, список задач); при batch_size <= 1 группировки нет.
+    """
+    batch_size = batch_size or Config.OCR_BATCH_SIZE
+    batch = []
+
+    def flush():
+        if len(batch) == 1:
+            return batch[0]
+        return tuple(page_num for page_num, _ in batch), [task for _, task in batch]
+
+    for page_num, task in items:
+        if batch_size <= 1 or isinstance(task, Future):
+            if batch:
+                yield flush()
+                batch = []
+            yield page_num, task
+            continue
+        batch.append((page_num, task))
+        if len(batch) >= batch_size:
+            yield flush()
+            batch = []
+    if batch:
+        yield flush()
+
+
+def iter_ocr_records(results, layer_texts):
+    """Записи страниц из результатов map_ordered по задачам batch_ocr_tasks.
+
+    Пакет дает список записей. Если задача упала (например, процесс
+    пула), ее страницы получают метод 'ocr_error' с текстовым слоем из
+    layer_texts.
+    """
+    for key, result, error in results:
+        page_nums = key if isinstance(key, tuple) else (key,)
+        if error is not None:
+            logger.error(f"OCR error on page(s) {', '.join(str(n + 1) for n in page_nums)}: {error}")
+            result = [PageRecord(page_num, 'ocr_error', layer_texts.get(page_num, ""), {})
+                      for page_num in page_nums]
+        for record in (result if isinstance(result, list) else [result]):
+            layer_texts.pop(record.page_num, None)
+            yield record
+
+
+def observe_page(record):
+    """Метрики страницы по ее timings: извлечение - по методу, OCR - по этапам"""
+    timings = record.timings
+    if 'extract' in timings:
+        # Для страниц OCR это классификация по текстовому слою
+        stage = 'classify' if record.method in ('ocr', 'ocr_error') else record.method
+        observe(f"page.{stage}", timings['extract'], pages=1)
+    for stage in OCR_PAGE_STAGES:
+        if stage in timings:
+            observe(f"page.{stage}", timings[stage], pages=1)
+
 
 class PDFProcessor:
     def __init__(self):
-        # В Docker контейнере Tesseract всегда находится по стандартному пути
-        pytesseract.pytesseract.tesseract_cmd = '/usr/bin/tesseract'
-        logger.info("Tesseract configured for Docker container at /usr/bin/tesseract")
-
-        # Диагностика и получение доступных языков
-        self.available_languages = self.get_available_languages()
-        logger.info(f"Available OCR languages: {self.available_languages}")
+        # Движок OCR, проверка языков Tesseract и кэш извлечения (его ключ
+        # зависит от движка и языков) создаются при первом обращении или
+        # при прогреве воркера (warm_up), а не при старте приложения
+        self._engine = None
+        self._extraction_cache = None
+        self._checkpoints = None
+        self._init_lock = threading.RLock()
 
         self.deskew_processor = DeskewProcessor()
 
+    def _get_engine(self):
+        """(движок OCR, доступные языки) - создаются один раз на процесс"""
+        if self._engine is None:
+            with self._init_lock:
+                if self._engine is None:
+                    ocr_backend = create_ocr_backend()
+                    logger.info(f"OCR backend: {ocr_backend.name}")
+
+                    # Диагностика и получение доступных языков
+                    available_languages = self.get_available_languages()
+                    logger.info(f"Available OCR languages: {available_languages}")
+                    self._engine = (ocr_backend, available_languages)
+        return self._engine
+
+    @property
+    def ocr_backend(self):
+        return self._get_engine()[0]
+
+    @property
+    def available_languages(self):
+        return self._get_engine()[1]
+
+    @property
+    def extraction_cache(self):
+        if not Config.EXTRACTION_CACHE_ENABLED:
+            return None
+        if self._extraction_cache is None:
+            with self._init_lock:
+                if self._extraction_cache is None:
+                    self._extraction_cache = ExtractionCache(self.get_extraction_fingerprint())
+                    logger.info(f"Extraction cache enabled at {Config.EXTRACTION_CACHE_DIR}")
+        return self._extraction_cache
+
+    @property
+    def checkpoints(self):
+        if not Config.CHECKPOINTS_ENABLED:
+            return None
+        if self._checkpoints is None:
+            with self._init_lock:
+                if self._checkpoints is None:
+                    self._checkpoints = PageCheckpointStore(Config.CHECKPOINT_DB_PATH,
+                                                            self.get_extraction_fingerprint(),
+                                                            Config.CHECKPOINT_RETENTION,
+                                                            Config.CHECKPOINT_FLUSH_INTERVAL)
+        return self._checkpoints
+
+    @property
+    def ready(self):
+        return self._engine is not None
+
+    def warm_up(self):
+        """Загрузка тяжелых библиотек, движка OCR и кэша до первого запроса"""
+        load_modules(HEAVY_MODULES)
+        self._get_engine()
+        self.extraction_cache
+        self.checkpoints
+
     def get_available_languages(self):
         """Получить список доступных языков Tesseract"""
         try:
@@ -46,154 +206,760 @@ class PDFProcessor:
             logger.error(f"Error getting languages: {e}")
             return ['eng']
 
-    def extract_text_pymupdf(self, pdf_path):
-        """Извлечение текста с помощью PyMuPDF"""
+    @staticmethod
+    def structured_text(page, page_num):
+        """Текст страницы из ее раскладки (STRUCTURED_EXTRACTION): таблицы компактно"""
+        return layout_to_text(extract_layout(page, page_num, Config.STRUCTURED_TABLES))
+
+    def iter_pages_pymupdf(self, pdf_path):
+        """Постраничное извлечение текста с помощью PyMuPDF (генератор PageRecord)"""
         try:
             doc = fitz.open(pdf_path)
-            text = ""
+        except Exception as e:
+            logger.error(f"PyMuPDF error: {e}")
+            return
+        try:
             for page_num in range(doc.page_count):
-                page = doc[page_num]
-                page_text = page.get_text()
-                if page_text.strip():
-                    text += f"\n--- Страница {page_num + 1} ---\n{page_text}\n"
+                start = time.perf_counter()
+                try:
+                    if Config.STRUCTURED_EXTRACTION:
+                        page_text = self.structured_text(doc[page_num], page_num)
+                    else:
+                        page_text = doc[page_num].get_text()
+                except Exception as e:
+                    logger.error(f"PyMuPDF error on page {page_num + 1}: {e}")
+                    continue
+                yield PageRecord(page_num, 'pymupdf', page_text,
+                                 {'extract': time.perf_counter() - start})
+        finally:
             doc.close()
-            return text.strip()
+
+    def extract_text_pymupdf(self, pdf_path):
+        """Извлечение текста с помощью PyMuPDF"""
+        return join_pages(self.iter_pages_pymupdf(pdf_path))
+
+    def iter_pages_pdfplumber(self, pdf_path):
+        """Постраничное извлечение текста с помощью pdfplumber (генератор PageRecord)"""
+        try:
+            pdf = pdfplumber.open(pdf_path)
         except Exception as e:
-            logger.error(f"PyMuPDF error: {e}")
-            return ""
+            logger.error(f"pdfplumber error: {e}")
+            return
+        try:
+            for page_num, page in enumerate(pdf.pages):
+                start = time.perf_counter()
+                try:
+                    page_text = page.extract_text() or ""
+                except Exception as e:
+                    logger.error(f"pdfplumber error on page {page_num + 1}: {e}")
+                    continue
+                finally:
+                    # Кэш объектов страницы pdfplumber растет с каждой страницей
+                    page.flush_cache()
+                yield PageRecord(page_num, 'pdfplumber', page_text,
+                                 {'extract': time.perf_counter() - start})
+        finally:
+            pdf.close()
 
     def extract_text_pdfplumber(self, pdf_path):
         """Извлечение текста с помощью pdfplumber"""
+        return join_pages(self.iter_pages_pdfplumber(pdf_path))
+
+    def get_ocr_lang_param(self):
+        """Строка языков для Tesseract (например, rus+eng)"""
+        return '+'.join(self.available_languages) if self.available_languages else None
+
+    def prepare_ocr_image(self, page_num, image, timings, rotate=0):
+        """Поворот на rotate градусов (результат OSD) и дескьюинг перед распознаванием.
+
+        Возвращает (изображение, (поворот OSD, угол наклона)): углы нужны,
+        чтобы так же выровнять страницу, отрендеренную для повторного OCR.
+        """
+        image = self.deskew_processor.rotate_orthogonal(image, rotate)
+
+        # Применяем дескьюинг
+        start = time.perf_counter()
+        deskewed_image, skew_angle = self.deskew_processor.deskew_image(image)
+        timings['deskew'] = timings.get('deskew', 0.0) + time.perf_counter() - start
+        logger.info(f"Page {page_num + 1}: corrected skew by {skew_angle:.2f} degrees")
+        return deskewed_image, (rotate, skew_angle)
+
+    def fix_orientation(self, page_num, image, prepared, geometry, result, lang_param, timings):
+        """Исправление ориентации (OSD) неуверенно распознанной страницы.
+
+        OSD - отдельный проход tesseract, поэтому он выполняется только для
+        страниц, распознанных без слов или с уверенностью ниже
+        OCR_RETRY_CONFIDENCE: у страницы, повернутой на 90/180/270 градусов,
+        первый проход всегда неуверенный. Повернутая страница выравнивается
+        заново из исходного изображения image и распознается еще раз,
+        остается более уверенный результат.
+        Возвращает (изображение, (поворот, угол наклона), OCRResult).
+        """
+        confidence = mean_confidence(result.words)
+        if not Config.OCR_OSD_ENABLED or (confidence is not None and confidence >= Config.OCR_RETRY_CONFIDENCE):
+            return prepared, geometry, result
+
+        start = time.perf_counter()
+        rotate, osd_confidence = self.ocr_backend.detect_orientation(prepared)
+        timings['osd'] = time.perf_counter() - start
+        if not rotate or osd_confidence < Config.OCR_OSD_MIN_CONFIDENCE:
+            return prepared, geometry, result
+
+        try:
+            rotated, rotated_geometry = self.prepare_ocr_image(page_num, image, timings, rotate)
+            start = time.perf_counter()
+            rotated_result = self.ocr_backend.image_to_data(rotated, lang=lang_param, psm=Config.OCR_PSM)
+            timings['tesseract'] = timings.get('tesseract', 0.0) + time.perf_counter() - start
+        except Exception as ocr_error:
+            logger.error(f"OCR error on rotated page {page_num + 1}: {ocr_error}")
+            return prepared, geometry, result
+
+        rotated_confidence = mean_confidence(rotated_result.words)
+        if rotated_confidence is None or (confidence is not None and rotated_confidence <= confidence):
+            return prepared, geometry, result
+        logger.info(f"Page {page_num + 1}: rotated by {rotate} degrees (OSD confidence {osd_confidence:.1f}), "
+                    f"OCR confidence {rotated_confidence:.1f}")
+        return rotated, rotated_geometry, rotated_result
+
+    def ocr_image(self, page_num, image, lang_param, timings=None, dpi=None, render=None):
+        """OCR отрендеренной страницы с дескьюингом и исправлением ориентации.
+
+        Возвращает OCRResult (текст и слова с уверенностью); неуверенно
+        распознанная страница проверяется на поворот (fix_orientation) и
+        распознается повторно (см. refine_ocr). Если передан словарь
+        timings, в него пишутся длительности этапов 'osd', 'deskew',
+        'tesseract' и 'retry'.
+        """
+        timings = timings if timings is not None else {}
+        deskewed_image, geometry = self.prepare_ocr_image(page_num, image, timings)
+
+        # OCR с доступными языками
+        start = time.perf_counter()
+        result = self.ocr_backend.image_to_data(deskewed_image, lang=lang_param, psm=Config.OCR_PSM)
+        timings['tesseract'] = time.perf_counter() - start
+        deskewed_image, geometry, result = self.fix_orientation(page_num, image, deskewed_image, geometry,
+                                                                result, lang_param, timings)
+        return self.refine_ocr(page_num, deskewed_image, geometry, dpi, result, lang_param, timings, render)
+
+    def retry_source(self, page_num, image, geometry, dpi, render=None):
+        """Изображение для повторного OCR в большем разрешении: (масштаб, region).
+
+        region(box) возвращает фрагмент (left, top, right, bottom) в
+        координатах image, region(None) - всю страницу. Разрешение
+        умножается на OCR_RETRY_DPI_SCALE, но не выше OCR_RETRY_MAX_DPI
+        (масштаб 1.0 - увеличивать некуда). С render(page_num, dpi)
+        страница рендерится заново и выравнивается с теми же углами,
+        без него изображение увеличивается интерполяцией.
+        """
+        scale = Config.OCR_RETRY_DPI_SCALE
+        if dpi:
+            scale = min(scale, Config.OCR_RETRY_MAX_DPI / dpi)
+        if scale <= 1.0:
+            return 1.0, lambda box: image if box is None else image[box[1]:box[3], box[0]:box[2]]
+
+        if render is not None:
+            hires = self.deskew_processor.apply_geometry(render(page_num, int(dpi * scale)), *geometry)
+            # Фактический масштаб: дескьюинг мог уменьшить исходное изображение
+            scale = hires.shape[1] / image.shape[1]
+
+            def region(box):
+                if box is None:
+                    return hires
+                return hires[int(box[1] * scale):int(box[3] * scale), int(box[0] * scale):int(box[2] * scale)]
+            return scale, region
+
+        def upscaled(box):
+            part = image if box is None else image[box[1]:box[3], box[0]:box[2]]
+            return self.deskew_processor.upscale(part, scale)
+        return scale, upscaled
+
+    def retry_lines(self, lines, region, scale, lang_param):
+        """Повторный OCR неуверенных строк по отдельности; {ключ строки: слова} для замены"""
+        boxes = []
+        for _, words in lines:
+            left, top, right, bottom = line_box(words)
+            pad = max(2, (bottom - top) // 4)
+            boxes.append((max(0, left - pad), max(0, top - pad), right + pad, bottom + pad))
+        results = self.ocr_backend.images_to_data([region(box) for box in boxes], lang=lang_param, psm=OCR_LINE_PSM)
+
+        replacements = {}
+        for (key, words), box, retried in zip(lines, boxes, results):
+            if retried.words and mean_confidence(retried.words) > mean_confidence(words):
+                # Рамки слов - обратно в координаты страницы
+                replacements[key] = [word._replace(box=(box[0] + int(word.box[0] / scale),
+                                                        box[1] + int(word.box[1] / scale),
+                                                        int(word.box[2] / scale), int(word.box[3] / scale)))
+                                     for word in retried.words]
+        return replacements
+
+    def refine_ocr(self, page_num, image, geometry, dpi, result, lang_param, timings, render=None):
+        """Повторное распознавание неуверенно распознанной страницы или ее строк.
+
+        Страница с уверенностью ниже OCR_RETRY_CONFIDENCE распознается
+        заново в большем разрешении (retry_source): если неуверенных слов
+        не больше доли OCR_RETRY_REGION_SHARE, только строки с ними (строка
+        остается более уверенная из двух), иначе вся страница. Если
+        разрешение уже предельное, страница распознается с OCR_RETRY_PSM.
+        Возвращает более уверенный OCRResult.
+        """
+        confidence = mean_confidence(result.words)
+        if confidence is not None:
+            logger.info(f"Page {page_num + 1}: extracted {len(result.text)} characters "
+                        f"(OCR confidence {confidence:.1f})")
+        if (not Config.OCR_RETRY_ENABLED or confidence is None
+                or confidence >= Config.OCR_RETRY_CONFIDENCE):
+            return result
+
+        start = time.perf_counter()
+        retried = None
+        try:
+            low = low_confidence_lines(result.words, Config.OCR_RETRY_CONFIDENCE)
+            low_words = sum(len(words) for _, words in low)
+            scale, region = self.retry_source(page_num, image, geometry, dpi, render)
+            if low_words <= Config.OCR_RETRY_REGION_SHARE * len(result.words):
+                replacements = self.retry_lines(low, region, scale, lang_param)
+                retried = to_result(replace_lines(result.words, replacements))
+                mode = f"{len(replacements)}/{len(low)} lines"
+            else:
+                psm = Config.OCR_PSM if scale > 1.0 else Config.OCR_RETRY_PSM
+                retried = self.ocr_backend.image_to_data(region(None), lang=lang_param, psm=psm)
+                mode = f"page, psm {psm}"
+        except Exception as retry_error:
+            logger.error(f"OCR retry error on page {page_num + 1}: {retry_error}")
+        timings['retry'] = time.perf_counter() - start
+
+        retried_confidence = mean_confidence(retried.words) if retried is not None else None
+        if retried_confidence is None or retried_confidence <= confidence:
+            return result
+        logger.info(f"Page {page_num + 1}: OCR retry ({mode}, x{scale:.2f}) raised confidence "
+                    f"from {confidence:.1f} to {retried_confidence:.1f}")
+        return retried
+
+    def render_for_ocr(self, doc, page_num, page_text="", timings=None):
+        """Рендеринг страницы для OCR в текущем потоке.
+
+        Возвращает задачу для run_ocr_task или, если рендеринг не удался,
+        готовую запись с текстовым слоем (метод 'ocr_error').
+        """
+        timings = dict(timings or {})
+        start = time.perf_counter()
+        try:
+            image, dpi = self.deskew_processor.render_page_for_ocr(doc[page_num])
+        except Exception as render_error:
+            logger.error(f"Render error on page {page_num + 1}: {render_error}")
+            return OCRPagePool.completed(PageRecord(page_num, 'ocr_error', page_text, timings))
+        timings['render'] = time.perf_counter() - start
+        logger.info(f"Page {page_num + 1}: rendered for OCR at {dpi} dpi")
+        return page_num, image, page_text, timings, dpi
+
+    def ocr_executor(self, lang_param):
+        """Пул и функция для OCR страниц.
+
+        С CPU-пулом страница рендерится и распознается в отдельном процессе
+        (задача - путь и номер страницы, изображение между процессами не
+        передается); без него рендеринг идет в текущем потоке, а OCR - в
+        пуле потоков. Функция принимает и пакет задач (см. batch_ocr_tasks).
+        Страницу для повторного OCR заново рендерит только процесс пула:
+        PyMuPDF нельзя вызывать из потоков, поэтому в пуле потоков
+        изображение увеличивается интерполяцией.
+        """
+        cpu_pool = get_cpu_pool()
+        if cpu_pool is not None:
+            return cpu_pool, ocr_page_task
+        return get_ocr_pool(), lambda task: self.run_ocr_task(task, lang_param)
+
+    @staticmethod
+    def ocr_batch_size(pool, pages):
+        """Размер пакета OCR для документа из pages необработанных страниц.
+
+        Пакет - одна задача пула, поэтому страницы делятся между всеми его
+        исполнителями (не больше ceil(pages / исполнители) в пакете и не
+        больше OCR_BATCH_SIZE): иначе короткий документ целиком уходит
+        одним пакетом в один процесс, а остальные ядра простаивают.
+        """
+        workers = max(1, min(pool.max_workers, Config.OCR_PAGE_PARALLELISM))
+        return max(1, min(Config.OCR_BATCH_SIZE, math.ceil(pages / workers)))
+
+    def ocr_task(self, pool, doc, pdf_path, page_num, lang_param, page_text="", timings=None):
+        """Задача OCR страницы для пула из ocr_executor"""
+        if isinstance(pool, CPUWorkPool):
+            return pdf_path, page_num, lang_param, page_text, dict(timings or {})
+        return self.render_for_ocr(doc, page_num, page_text, timings)
+
+    @staticmethod
+    def ocr_record(page_num, result, page_text, timings):
+        """Запись страницы OCR по OCRResult.
+
+        Строки-шум с уверенностью ниже OCR_NOISE_LINE_CONFIDENCE
+        выбрасываются (см. drop_noise_lines). Текст слоя остается, если
+        OCR не дал больше или распознал страницу с уверенностью ниже
+        OCR_MIN_CONFIDENCE.
+        """
+        confidence = mean_confidence(result.words)
+        words, noise_lines = drop_noise_lines(result.words, Config.OCR_NOISE_LINE_CONFIDENCE)
+        if noise_lines:
+            logger.debug(f"Page {page_num + 1}: dropped {noise_lines} OCR noise lines")
+            result = to_result(words)
+        if confidence is not None and confidence < Config.OCR_MIN_CONFIDENCE and page_text.strip():
+            logger.info(f"Page {page_num + 1}: OCR confidence {confidence:.1f} is too low, keeping the text layer")
+        elif len(result.text.strip()) > len(page_text.strip()):
+            page_text = result.text
+        return PageRecord(page_num, 'ocr', page_text, timings, confidence)
+
+    def run_ocr_task(self, task, lang_param, render=None):
+        """OCR отрендеренной страницы в пуле (пакет страниц - см. run_ocr_batch).
+
+        render(page_num, dpi) - рендеринг страницы для повторного OCR.
+        """
+        if isinstance(task, list):
+            return self.run_ocr_batch(task, lang_param, render)
+        page_num, image, page_text, timings, dpi = task
         try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text += f"\n--- Страница {page_num + 1} ---\n{page_text}\n"
-            return text.strip()
+            result = self.ocr_image(page_num, image, lang_param, timings, dpi, render)
+        except Exception as ocr_error:
+            logger.error(f"OCR error on page {page_num + 1}: {ocr_error}")
+            return PageRecord(page_num, 'ocr_error', page_text, timings)
+        return self.ocr_record(page_num, result, page_text, timings)
+
+    def run_ocr_batch(self, tasks, lang_param, render=None):
+        """OCR пакета отрендеренных страниц одним вызовом движка (images_to_data).
+
+        Дескьюинг выполняется постранично, распознавание - пакетом; время
+        tesseract делится между страницами поровну. Неуверенные страницы
+        проверяются на поворот и распознаются повторно по одной
+        (fix_orientation, refine_ocr).
+        Если пакет целиком не распознался, страницы распознаются по одной.
+        Возвращает список PageRecord в порядке страниц.
+        """
+        records = []
+        prepared = []
+        for task in tasks:
+            if isinstance(task, Future):
+                # Страница не отрендерилась: готовая запись с текстовым слоем
+                records.append(task.result())
+                continue
+            page_num, image, page_text, timings, dpi = task
+            try:
+                prepared.append((page_num, image, *self.prepare_ocr_image(page_num, image, timings), dpi,
+                                 page_text, timings))
+            except Exception as ocr_error:
+                logger.error(f"OCR error on page {page_num + 1}: {ocr_error}")
+                records.append(PageRecord(page_num, 'ocr_error', page_text, timings))
+
+        if prepared:
+            start = time.perf_counter()
+            try:
+                results = self.ocr_backend.images_to_data([item[2] for item in prepared],
+                                                          lang=lang_param, psm=Config.OCR_PSM)
+            except Exception as batch_error:
+                logger.error(f"Batch OCR error on {len(prepared)} pages, retrying page by page: {batch_error}")
+                results = None
+            share = (time.perf_counter() - start) / len(prepared)
+
+            for i, (page_num, original, image, geometry, dpi, page_text, timings) in enumerate(prepared):
+                if results is None:
+                    start = time.perf_counter()
+                    try:
+                        result = self.ocr_backend.image_to_data(image, lang=lang_param, psm=Config.OCR_PSM)
+                    except Exception as ocr_error:
+                        logger.error(f"OCR error on page {page_num + 1}: {ocr_error}")
+                        records.append(PageRecord(page_num, 'ocr_error', page_text, timings))
+                        continue
+                    timings['tesseract'] = share + time.perf_counter() - start
+                else:
+                    result = results[i]
+                    timings['tesseract'] = share
+                image, geometry, result = self.fix_orientation(page_num, original, image, geometry, result,
+                                                               lang_param, timings)
+                result = self.refine_ocr(page_num, image, geometry, dpi, result, lang_param, timings, render)
+                records.append(self.ocr_record(page_num, result, page_text, timings))
+            logger.info(f"Batch OCR of {len(prepared)} pages took {share * len(prepared):.2f}s")
+
+        records.sort(key=lambda record: record.page_num)
+        return records
+
+    def iter_pages_ocr(self, pdf_path):
+        """Постраничное извлечение текста OCR с дескьюингом (генератор PageRecord).
+
+        Страницы распознаются в CPU-пуле процессов или в пуле потоков OCR
+        (см. ocr_executor); одновременно в работе не больше
+        OCR_PAGE_PARALLELISM страниц.
+        """
+        try:
+            doc = fitz.open(pdf_path)
         except Exception as e:
-            logger.error(f"pdfplumber error: {e}")
-            return ""
+            logger.error(f"OCR with deskew error: {e}")
+            return
+        lang_param = self.get_ocr_lang_param()
+        pool, run = self.ocr_executor(lang_param)
+
+        def tasks():
+            for page_num in range(doc.page_count):
+                yield page_num, self.ocr_task(pool, doc, pdf_path, page_num, lang_param)
+
+        try:
+            batch_size = self.ocr_batch_size(pool, doc.page_count)
+            results = pool.map_ordered(run, batch_ocr_tasks(tasks(), batch_size), window=Config.OCR_PAGE_PARALLELISM)
+            yield from iter_ocr_records(results, {})
+        finally:
+            doc.close()
 
     def extract_text_ocr_with_deskew(self, pdf_path):
         """Извлечение текста с помощью OCR с предварительным дескьюингом"""
+        return join_pages(self.iter_pages_ocr(pdf_path))
+
+    def classify_page(self, page, page_text):
+        """Выбор самого дешевого метода извлечения для страницы.
+
+        Учитывает плотность текстового слоя, долю площади под изображениями
+        и наличие шрифтов. Возвращает 'pymupdf', 'pdfplumber' или 'ocr'.
+        """
+        text_chars = len(page_text.strip())
+
+        page_area = abs(page.rect) or 1.0
+        image_area = 0.0
+        for info in page.get_image_info():
+            image_area += abs(fitz.Rect(info['bbox']) & page.rect)
+        image_coverage = min(image_area / page_area, 1.0)
+
+        # Скан с "подписью" или штампом в текстовом слое требует больше текста
+        if image_coverage >= Config.PAGE_SCAN_IMAGE_COVERAGE:
+            min_chars = Config.PAGE_SCANNED_MIN_TEXT_CHARS
+        else:
+            min_chars = Config.PAGE_MIN_TEXT_CHARS
+
+        if text_chars >= min_chars:
+            return 'pymupdf'
+
+        # Шрифты есть, но текстовый слой пуст или не декодируется (битый ToUnicode)
+        if page.get_fonts():
+            unreadable = page_text.count('\ufffd')
+            if text_chars == 0 or unreadable * 3 > text_chars:
+                return 'pdfplumber'
+
+        if image_coverage >= Config.PAGE_MIN_IMAGE_COVERAGE:
+            return 'ocr'
+
+        # Почти пустая страница без изображений: берем то, что есть
+        return 'pymupdf'
+
+    def get_extraction_fingerprint(self):
+        """Параметры, от которых зависит результат извлечения (входят в ключ кэша)"""
+        return (f"{self.ocr_backend.name}:{self.get_ocr_lang_param()}:psm{Config.OCR_PSM}:"
+                f"{Config.OCR_PROBE_DPI}:{Config.OCR_TARGET_GLYPH_HEIGHT}:{Config.OCR_MIN_DPI}:"
+                f"{Config.OCR_MAX_DPI}:{Config.OCR_MAX_IMAGE_SIDE}:osd{int(Config.OCR_OSD_ENABLED)}:"
+                f"{Config.PAGE_MIN_TEXT_CHARS}:{Config.PAGE_SCANNED_MIN_TEXT_CHARS}:"
+                f"{Config.PAGE_MIN_IMAGE_COVERAGE}:{Config.PAGE_SCAN_IMAGE_COVERAGE}:"
+                f"structured{int(Config.STRUCTURED_EXTRACTION)}{int(Config.STRUCTURED_TABLES)}:"
+                f"words:{Config.OCR_MIN_CONFIDENCE}:retry{int(Config.OCR_RETRY_ENABLED)}:"
+                f"{Config.OCR_RETRY_CONFIDENCE}:{Config.OCR_RETRY_REGION_SHARE}:{Config.OCR_RETRY_DPI_SCALE}:"
+                f"{Config.OCR_RETRY_MAX_DPI}:{Config.OCR_RETRY_PSM}:noise{Config.OCR_NOISE_LINE_CONFIDENCE}:"
+                f"{self.deskew_processor.fingerprint()}")
+
+    @staticmethod
+    def create_deduplicator():
+        """Поиск повторяющихся страниц для одной загрузки или None, если он выключен"""
+        if not Config.DEDUP_ENABLED:
+            return None
+        return PageDeduplicator(Config.DEDUP_IMAGE_SIMILARITY, Config.DEDUP_TEXT_SIMILARITY,
+                                Config.DEDUP_MIN_TEXT_CHARS)
+
+    @staticmethod
+    def drop_duplicate(dedup, source, record, scans=None):
+        """Запись-заглушка без текста, если текст страницы уже встречался в загрузке.
+
+        scans - почти тождественные ранее встреченные сканы для распознанной
+        страницы (PageDeduplicator.check_image).
+        """
+        if dedup is None or not record.text:
+            return record
+        if dedup.check_text(source, record.page_num, record.text, scans) is None:
+            return record
+        return record._replace(method='duplicate', text='')
+
+    @staticmethod
+    def scan_hash(page, page_num):
+        """pHash растра скана в низком разрешении или None при ошибке"""
         try:
-            # Определяем языки для OCR
-            lang_param = '+'.join(self.available_languages) if self.available_languages else None
+            return page_image_hash(page)
+        except Exception as e:
+            logger.error(f"Page fingerprint error on page {page_num + 1}: {e}")
+            return None
+
+    def iter_pages(self, pdf_path, file_hash=None, dedup=None):
+        """Постраничное гибридное извлечение текста (генератор PageRecord).
 
+        Документ открывается один раз, каждая страница направляется
+        к самому дешевому подходящему методу. Сканированные страницы
+        распознаются в пуле (см. ocr_executor), пока классифицируются
+        следующие, а записи выдаются в исходном порядке страниц: в работе
+        только окно из OCR_PAGE_PARALLELISM страниц. Документы и дорогие
+        страницы (pdfplumber, OCR) берутся из кэша извлечения, если он включен.
+        Готовые страницы сохраняются в контрольные точки (checkpoints), и
+        после прерывания обработка файла продолжается с недоделанных страниц.
+
+        dedup - PageDeduplicator загрузки: страницы с тем же текстом (и теми
+        же числами), а сканы - еще и с почти тождественным растром, после
+        извлечения выдаются с методом 'duplicate' и пустым текстом. OCR
+        повторов не пропускается; в кэш и контрольные точки попадает
+        настоящий текст страниц вместе с pHash сканов, чтобы страницы
+        из кэша сравнивались так же, как при свежем извлечении.
+        """
+        logger.info(f"Processing PDF: {pdf_path}")
+        source = os.path.basename(pdf_path)
+
+        cache = self.extraction_cache
+        if cache is not None:
+            try:
+                file_hash = file_hash or cache.file_hash(pdf_path)
+                cached_pages = cache.get_document(file_hash)
+            except Exception as e:
+                logger.error(f"Extraction cache error for {pdf_path}: {e}")
+                cache = None
+                cached_pages = None
+            if cached_pages is not None:
+                logger.info(f"Extraction cache hit for {os.path.basename(pdf_path)}")
+                observe('extract.cached', 0.0, pages=len(cached_pages), size=self.file_size(pdf_path))
+                for page_num, _, page_text, image_hash in cached_pages:
+                    scans = (dedup.check_image(source, page_num, image_hash)
+                             if dedup is not None and image_hash is not None else None)
+                    yield self.drop_duplicate(dedup, source, PageRecord(page_num, 'cache', page_text, {}), scans)
+                return
+
+        # Страницы, готовые после прерванной попытки, берутся из контрольных точек
+        checkpoints = self.checkpoints
+        done_pages = {}
+        checkpoint_writer = None
+        if checkpoints is not None:
+            try:
+                file_hash = file_hash or ExtractionCache.file_hash(pdf_path)
+                done_pages = checkpoints.load(file_hash)
+                checkpoint_writer = checkpoints.writer(file_hash)
+            except Exception as e:
+                logger.error(f"Page checkpoint error for {pdf_path}: {e}")
+
+        started = time.perf_counter()
+        try:
             doc = fitz.open(pdf_path)
-            text = ""
+        except Exception as e:
+            logger.error(f"Cannot open PDF {pdf_path}: {e}")
+            return
 
+        if done_pages:
+            unfinished = [page_num for page_num in range(doc.page_count) if page_num not in done_pages]
+            logger.info(f"Resuming {os.path.basename(pdf_path)} from checkpoints: "
+                        f"{doc.page_count - len(unfinished)}/{doc.page_count} pages done"
+                        + (f", first unfinished page {unfinished[0] + 1}" if unfinished else ""))
+
+        state = {'plumber_pdf': None}
+        # pHash сканов нужен для поиска повторов, кэша документа и контрольных точек
+        keep_scans = dedup is not None or cache is not None or checkpoint_writer is not None
+        scan_hashes = {}
+        scan_matches = {}
+        page_hashes = {}
+        layer_texts = {}
+        lang_param = self.get_ocr_lang_param()
+        pool, run = self.ocr_executor(lang_param)
+
+        def note_scan(page_num, image_hash):
+            # Растр в низком разрешении: кандидаты в оригиналы для сравнения текста после OCR.
+            # Скан без pHash ни с чем не совпадает, по одному тексту он не отбрасывается
+            if image_hash is not None:
+                scan_hashes[page_num] = image_hash
+            if dedup is not None:
+                scan_matches[page_num] = (dedup.check_image(source, page_num, image_hash)
+                                          if image_hash is not None else [])
+
+        def tasks():
             for page_num in range(doc.page_count):
-                page = doc[page_num]
-                # Применяем дескьюинг
-                deskewed_image, skew_angle = self.deskew_processor.deskew_pdf_page(page)
-                logger.info(f"Page {page_num + 1}: corrected skew by {skew_angle:.2f} degrees")
+                if page_num in done_pages:
+                    _, page_text, image_hash = done_pages.pop(page_num)
+                    if image_hash is not None:
+                        note_scan(page_num, image_hash)
+                    yield page_num, OCRPagePool.completed(PageRecord(page_num, 'checkpoint', page_text, {}))
+                    continue
 
-                # OCR с доступными языками
+                start = time.perf_counter()
+                page = doc[page_num]
                 try:
-                    if lang_param:
-                        page_text = pytesseract.image_to_string(
-                            deskewed_image,
-                            lang=lang_param,
-                            config='--oem 3 --psm 6'
-                        )
+                    page_text = page.get_text()
+                except Exception as e:
+                    logger.error(f"PyMuPDF error on page {page_num + 1}: {e}")
+                    page_text = ""
+
+                method = self.classify_page(page, page_text)
+
+                # Дорогие страницы сначала ищем в кэше по хэшу содержимого
+                if method != 'pymupdf' and cache is not None:
+                    try:
+                        page_hashes[page_num] = cache.page_hash(page)
+                        cached_page = cache.get_page(page_hashes[page_num])
+                    except Exception as e:
+                        logger.error(f"Extraction cache error on page {page_num + 1}: {e}")
+                        cached_page = None
+                    if cached_page is not None:
+                        if cached_page['method'] == 'ocr' and keep_scans:
+                            note_scan(page_num, self.scan_hash(page, page_num))
+                        yield page_num, OCRPagePool.completed(PageRecord(
+                            page_num, 'cache', cached_page['text'],
+                            {'extract': time.perf_counter() - start}))
+                        continue
+
+                if method == 'pdfplumber':
+                    try:
+                        if state['plumber_pdf'] is None:
+                            state['plumber_pdf'] = pdfplumber.open(pdf_path)
+                        plumber_page = state['plumber_pdf'].pages[page_num]
+                        plumber_text = plumber_page.extract_text() or ""
+                        plumber_page.flush_cache()
+                    except Exception as e:
+                        logger.error(f"pdfplumber error on page {page_num + 1}: {e}")
+                        plumber_text = ""
+
+                    if len(plumber_text.strip()) >= Config.PAGE_MIN_TEXT_CHARS:
+                        page_text = plumber_text
                     else:
-                        # Fallback без языка
-                        page_text = pytesseract.image_to_string(
-                            deskewed_image,
-                            config='--oem 3 --psm 6'
-                        )
-
-                    if page_text.strip():
-                        text += f"\n--- Страница {page_num + 1} ---\n{page_text}\n"
-                        logger.info(f"Page {page_num + 1}: extracted {len(page_text)} characters")
-
-                except Exception as ocr_error:
-                    logger.error(f"OCR error on page {page_num + 1}: {ocr_error}")
-                    continue
+                        method = 'ocr'
+                elif method == 'pymupdf' and Config.STRUCTURED_EXTRACTION and page_text.strip():
+                    try:
+                        page_text = self.structured_text(page, page_num)
+                    except Exception as e:
+                        logger.error(f"Structured extraction error on page {page_num + 1}: {e}")
 
+                if method == 'ocr' and keep_scans:
+                    note_scan(page_num, self.scan_hash(page, page_num))
+
+                timings = {'extract': time.perf_counter() - start}
+                if method == 'ocr':
+                    # Сканированные страницы распознаются в пуле, пока классифицируются следующие
+                    layer_texts[page_num] = page_text
+                    yield page_num, self.ocr_task(pool, doc, pdf_path, page_num, lang_param, page_text, timings)
+                else:
+                    yield page_num, OCRPagePool.completed(PageRecord(page_num, method, page_text, timings))
+
+        methods = {'pymupdf': 0, 'pdfplumber': 0, 'ocr': 0, 'ocr_error': 0, 'cache': 0, 'checkpoint': 0,
+                   'duplicate': 0}
+        # Записи нужны для кэша документа; строки общие с выданными записями
+        document_pages = [] if cache is not None else None
+        confidences = []
+        try:
+            batch_size = self.ocr_batch_size(pool, doc.page_count - len(done_pages))
+            results = pool.map_ordered(run, batch_ocr_tasks(tasks(), batch_size), window=Config.OCR_PAGE_PARALLELISM)
+            for record in iter_ocr_records(results, layer_texts):
+                if record.page_num in page_hashes and record.method in ('pdfplumber', 'ocr'):
+                    cache.set_page(page_hashes[record.page_num], record.method, record.text)
+                # Страницу с ошибкой OCR следующая попытка распознает заново
+                if checkpoint_writer is not None and record.method not in ('checkpoint', 'ocr_error'):
+                    checkpoint_writer.add(record, scan_hashes.get(record.page_num))
+                if document_pages is not None:
+                    document_pages.append((record.page_num, record.method, record.text,
+                                           scan_hashes.get(record.page_num)))
+                if record.confidence is not None:
+                    confidences.append(record.confidence)
+                record = self.drop_duplicate(dedup, source, record, scan_matches.get(record.page_num))
+                methods[record.method] += 1
+                observe_page(record)
+                yield record
+        finally:
+            if checkpoint_writer is not None:
+                checkpoint_writer.flush()
+            if state['plumber_pdf'] is not None:
+                state['plumber_pdf'].close()
             doc.close()
-            return text.strip()
 
-        except Exception as e:
-            logger.error(f"OCR with deskew error: {e}")
-            return ""
+        logger.info(f"Page methods for {os.path.basename(pdf_path)}: "
+                    f"PyMuPDF {methods['pymupdf']}, pdfplumber {methods['pdfplumber']}, "
+                    f"OCR {methods['ocr']}, OCR errors {methods['ocr_error']}, cache {methods['cache']}, "
+                    f"checkpoints {methods['checkpoint']}, duplicates {methods['duplicate']}")
+        if confidences:
+            low = sum(confidence < Config.OCR_RETRY_CONFIDENCE for confidence in confidences)
+            logger.info(f"OCR confidence for {os.path.basename(pdf_path)}: mean "
+                        f"{sum(confidences) / len(confidences):.1f}, {low}/{len(confidences)} pages "
+                        f"below {Config.OCR_RETRY_CONFIDENCE:g}")
+        observe('extract', time.perf_counter() - started, pages=sum(methods.values()),
+                size=self.file_size(pdf_path))
 
-    def extract_text_from_pdf(self, pdf_path):
-        """Последовательное извлечение текста разными методами"""
-        logger.info(f"Processing PDF: {pdf_path}")
+        # Документ с ошибками OCR не кэшируем, чтобы повторная загрузка могла их исправить
+        if (document_pages is not None and not methods['ocr_error']
+                and any(text.strip() for _, _, text, _ in document_pages)):
+            cache.set_document(file_hash, document_pages)
 
-        # Метод 1: PyMuPDF
-        text = self.extract_text_pymupdf(pdf_path)
-        if len(text) > 100:
-            logger.info("Text extracted successfully with PyMuPDF")
-            return text
-
-        # Метод 2: pdfplumber
-        text = self.extract_text_pdfplumber(pdf_path)
-        if len(text) > 100:
-            logger.info("Text extracted successfully with pdfplumber")
-            return text
-
-        # Метод 3: OCR с дескьюингом
-        logger.info("Trying OCR extraction with deskewing...")
-        text = self.extract_text_ocr_with_deskew(pdf_path)
-        if len(text) > 50:
-            logger.info("Text extracted successfully with OCR and deskewing")
-            return text
-
-        logger.warning("Failed to extract meaningful text from PDF")
-        return ""
+    @staticmethod
+    def file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
 
-    def process_multiple_pdfs(self, pdf_paths):
-        """Обработка нескольких PDF файлов и объединение в один текст"""
-        combined_text = ""
-        successful_extractions = 0
+    def extract_text_from_pdf(self, pdf_path, file_hash=None, dedup=None):
+        """Гибридное извлечение текста документа (см. iter_pages)"""
+        text = join_pages(self.iter_pages(pdf_path, file_hash, dedup))
+        if not text:
+            logger.warning("Failed to extract meaningful text from PDF")
+        return text
 
-        logger.info(f"Processing {len(pdf_paths)} PDF files")
+    def write_bundle_text(self, bundle, out, file_hashes=None, dedup=None):
+        """Потоковая запись текста комплекта в файл out.
 
-        for i, pdf_path in enumerate(pdf_paths, 1):
-            if os.path.exists(pdf_path):
-                logger.info(f"Processing file {i}/{len(pdf_paths)}: {os.path.basename(pdf_path)}")
+        Каждый документ получает заголовок, страницы пишутся по мере
+        извлечения. Возвращает число документов, из которых извлечен текст.
+        """
+        successful_extractions = 0
+        for i, pdf_path in bundle.documents():
+            name = os.path.basename(pdf_path)
+            logger.info(f"Processing file {i}/{len(bundle)}: {name}")
 
-                text = self.extract_text_from_pdf(pdf_path)
-                if text and text.strip():
+            characters = 0
+            file_hash = file_hashes[i - 1] if file_hashes else None
+            for record in self.iter_pages(pdf_path, file_hash, dedup):
+                fragment = format_page(record)
+                if not fragment:
+                    continue
+                if not characters:
                     # Добавляем заголовок документа
-                    combined_text += f"\n\n{'=' * 60}\n"
-                    combined_text += f"ДОКУМЕНТ {i}: {os.path.basename(pdf_path)}\n"
-                    combined_text += f"{'=' * 60}\n\n"
-                    combined_text += text
-                    successful_extractions += 1
-                    logger.info(f"Successfully extracted {len(text)} characters from {os.path.basename(pdf_path)}")
-                else:
-                    logger.warning(f"No text extracted from {os.path.basename(pdf_path)}")
+                    out.write(f"\n\n{'=' * 60}\nДОКУМЕНТ {i}: {name}\n{'=' * 60}\n\n")
+                    fragment = fragment.lstrip('\n')
+                out.write(fragment)
+                characters += len(fragment)
+
+            if characters:
+                successful_extractions += 1
+                logger.info(f"Successfully extracted {characters} characters from {name}")
             else:
-                logger.error(f"File not found: {pdf_path}")
+                logger.warning(f"No text extracted from {name}")
+        return successful_extractions
 
-        logger.info(f"Successfully processed {successful_extractions}/{len(pdf_paths)} files")
+    def process_multiple_pdfs(self, pdf_paths, file_hashes=None, dedup=None):
+        """Обработка нескольких PDF файлов и объединение в один текст.
 
-        if combined_text.strip():
-            # Добавляем общий заголовок
-            final_text = f"ОБЪЕДИНЕННЫЙ ТЕКСТ ИЗ {successful_extractions} ДОКУМЕНТОВ\n"
-            final_text += f"Обработано: {', '.join([os.path.basename(p) for p in pdf_paths])}\n"
-            final_text += f"{'=' * 80}\n"
-            final_text += combined_text
+        Файлы обходятся как виртуальный комплект (PDFBundle) без записи
+        объединенного PDF; текст страниц сразу сбрасывается во временный
+        файл, и в памяти собирается только итоговая строка.
+        """
+        bundle = pdf_paths if isinstance(pdf_paths, PDFBundle) else PDFBundle(pdf_paths)
+        logger.info(f"Processing {len(bundle)} PDF files")
 
-            # Сохраняем объединенный текст в файл для отладки
-            try:
-                debug_file = os.path.join('uploads', 'combined_text_debug.txt')
-                with open(debug_file, 'w', encoding='utf-8') as f:
-                    f.write(final_text)
-                logger.info(f"Combined text saved to {debug_file} ({len(final_text)} characters)")
-            except Exception as e:
-                logger.error(f"Cannot save debug file: {e}")
+        with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as spool:
+            successful_extractions = self.write_bundle_text(bundle, spool, file_hashes, dedup)
+            logger.info(f"Successfully processed {successful_extractions}/{len(bundle)} files")
 
-            return final_text
-        else:
-            logger.error("No text was extracted from any PDF files")
-            return ""
+            if not successful_extractions:
+                logger.error("No text was extracted from any PDF files")
+                return ""
+
+            # Сборка итогового текста комплекта (размер - в символах)
+            with span('merge') as merge:
+                # Общий заголовок известен только после обработки всех файлов
+                header = (f"ОБЪЕДИНЕННЫЙ ТЕКСТ ИЗ {successful_extractions} ДОКУМЕНТОВ\n"
+                          f"Обработано: {', '.join(bundle.names())}\n"
+                          f"{'=' * 80}\n")
+                # Отладочную копию пишет конвейер (отдельный файл на сессию)
+                spool.seek(0)
+                final_text = header + spool.read()
+                merge.update(size=len(final_text))
+
+        logger.info(f"Combined text: {len(final_text)} characters")
+        return final_text
 
     def get_text_summary(self, text):
         """Получить краткую сводку о извлеченном тексте"""
@@ -204,4 +970,60 @@ class PDFProcessor:
         words = text.split()
         chars = len(text)
 
-        return f"Извлечено: {len(lines)} строк, {len(words)} слов, {chars} символов"
\ No newline at end of file
+        return f"Извлечено: {len(lines)} строк, {len(words)} слов, {chars} символов"
+
+
+_worker_processor = None
+
+# Документы, открытые процессом CPU-пула: (путь, mtime) -> fitz.Document. Задачи
+# страниц одного файла приходят в процесс подряд, и разбор xref не повторяется
+_worker_documents = OrderedDict()
+WORKER_DOCUMENT_CACHE_SIZE = 4
+
+
+def worker_document(pdf_path):
+    """Открытый документ из кэша процесса пула (LRU на WORKER_DOCUMENT_CACHE_SIZE файлов).
+
+    В ключе mtime: перезаписанный файл открывается заново. Процесс пула
+    выполняет задачи по одной, поэтому блокировка не нужна.
+    """
+    key = (pdf_path, os.stat(pdf_path).st_mtime_ns)
+    doc = _worker_documents.pop(key, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+    _worker_documents[key] = doc
+    while len(_worker_documents) > WORKER_DOCUMENT_CACHE_SIZE:
+        _, stale = _worker_documents.popitem(last=False)
+        stale.close()
+    return doc
+
+
+def ocr_page_task(task):
+    """OCR страницы в процессе CPU-пула: рендеринг, ориентация, дескьюинг, tesseract.
+
+    Задача-список - пакет страниц одного документа (см. batch_ocr_tasks):
+    документ открывается один раз, страницы распознаются одним вызовом
+    движка. Документ берется из кэша открытых документов процесса
+    (worker_document) и нужен до конца распознавания: неуверенные страницы
+    рендерятся заново в большем разрешении. PDFProcessor (движок OCR,
+    дескьюинг) создается один раз на процесс.
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+        _worker_processor = PDFProcessor()
+
+    tasks = task if isinstance(task, list) else [task]
+    pdf_path, lang_param = tasks[0][0], tasks[0][2]
+    doc = worker_document(pdf_path)
+
+    def render(page_num, dpi):
+        return _worker_processor.deskew_processor.render_page(doc[page_num], dpi=dpi)
+
+    rendered = [_worker_processor.render_for_ocr(doc, page_num, page_text, timings)
+                for _, page_num, _, page_text, timings in tasks]
+    if isinstance(task, list):
+        return _worker_processor.run_ocr_batch(rendered, lang_param, render)
+    if isinstance(rendered[0], Future):
+        return rendered[0].result()
+    return _worker_processor.run_ocr_task(rendered[0], lang_param, render)
@@ -0,0 +1,263 @@
+import logging
+import re
+from collections import Counter, namedtuple
+from config import Config
+from token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Разметка объединенного текста: исходная (pdf_processor) и сжатая
+BUNDLE_HEADER = re.compile(r"\AОБЪЕДИНЕННЫЙ ТЕКСТ ИЗ \d+ ДОКУМЕНТОВ\nОбработано: .*\n={80}\n")
+DOCUMENT_HEADER = re.compile(r"^(?:={60}\n)?ДОКУМЕНТ \d+: .*$(?:\n={60}$)?", re.M)
+PAGE_HEADER = re.compile(r"^(?:--- Страница (\d+) ---|\[стр\. (\d+)\])$", re.M)
+
+# Номер страницы в колонтитуле: "Страница 2 из 5", "- 2 -", "Лист 2"
+PAGE_NUMBER_LINE = re.compile(r'^(?:(?:стр(?:аница)?|лист|page)\.?\s*)?[-–—]?\s*\d+\s*[-–—]?\s*'
+                              r'(?:(?:из|of|/)\s*\d+)?$', re.I)
+DIGITS = re.compile(r'\d+')
+LETTERS = re.compile(r'[^\W\d_]')
+SPACES = re.compile(r'[^\S\n]+')
+# Заполнители полей бланков: ______, ........, ------
+FILLERS = re.compile(r'[_.…\-–—]{3,}')
+
+# Колонтитул ищется среди первых и последних строк страницы и должен
+# повторяться хотя бы на HEADER_MIN_PAGES страницах и HEADER_MIN_SHARE из них
+HEADER_ZONE_LINES = 3
+HEADER_MIN_PAGES = 3
+HEADER_MIN_SHARE = 0.4
+
+# Повторы строк короче этого не удаляются: это заголовки разделов
+REPEATED_LINE_MIN_CHARS = 20
+
+# Результат сжатия: текст и статистика (токены до/после, что удалено)
+CompactionResult = namedtuple('CompactionResult', ['text', 'stats'])
+
+
+def clean_line(line):
+    """Строка без заполнителей полей и лишних пробелов"""
+    return SPACES.sub(' ', FILLERS.sub(' ', line)).strip()
+
+
+def parse_documents(text):
+    """Разбор объединенного текста: [(заголовок документа или '', [(номер страницы, [строки])])]"""
+    text = BUNDLE_HEADER.sub('', text)
+    headers = list(DOCUMENT_HEADER.finditer(text))
+    segments = [('', text[:headers[0].start()] if headers else text)]
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        title = header.group(0).strip('=\n')
+        segments.append((title, text[header.end():end]))
+
+    documents = []
+    for title, segment in segments:
+        markers = list(PAGE_HEADER.finditer(segment))
+        pages = [(None, segment[:markers[0].start()] if markers else segment)]
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(segment)
+            pages.append((int(marker.group(1) or marker.group(2)), segment[marker.end():end]))
+        pages = [(page_num, [clean_line(line) for line in page.split('\n')]) for page_num, page in pages]
+        pages = [(page_num, [line for line in lines if line]) for page_num, lines in pages]
+        pages = [(page_num, lines) for page_num, lines in pages if lines]
+        if title or pages:
+            documents.append((title, pages))
+    return documents
+
+
+def in_running_zone(index, count):
+    """Строка с номером index из count - среди первых или последних строк страницы"""
+    return index < HEADER_ZONE_LINES or index >= count - HEADER_ZONE_LINES
+
+
+def find_running_lines(pages):
+    """Строки-колонтитулы документа (в нижнем регистре): повторяются в начале или конце страниц.
+
+    Строки сравниваются точно, с числами: одинаковые фразы с разными
+    датами или размерами очагов - разные сведения.
+    """
+    if len(pages) < HEADER_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for _, lines in pages:
+        counts.update({line.lower() for i, line in enumerate(lines) if in_running_zone(i, len(lines))})
+    threshold = max(HEADER_MIN_PAGES, HEADER_MIN_SHARE * len(pages))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def page_number_pattern(line):
+    """Шаблон строки-номера страницы с числами, замененными на # ("стр. # из #"), или None"""
+    if not PAGE_NUMBER_LINE.match(line):
+        return None
+    return DIGITS.sub('#', line.lower())
+
+
+def find_page_number_patterns(pages):
+    """Шаблоны номеров страниц со словами ("стр. N", "N из M"), повторяющиеся в колонтитулах документа.
+
+    Голое число или "120/80" в колонтитуле может быть значением анализа
+    или давлением, поэтому шаблоны без букв здесь не учитываются.
+    """
+    if len(pages) < HEADER_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for _, lines in pages:
+        counts.update({pattern for pattern in (page_number_pattern(line) for i, line in enumerate(lines)
+                                               if in_running_zone(i, len(lines)))
+                       if pattern and LETTERS.search(pattern)})
+    threshold = max(HEADER_MIN_PAGES, HEADER_MIN_SHARE * len(pages))
+    return {pattern for pattern, count in counts.items() if count >= threshold}
+
+
+def is_page_number(line, page_num, patterns):
+    """Строка колонтитула - номер страницы page_num.
+
+    Число должно совпадать с номером страницы в документе или строка -
+    повторяющийся по страницам шаблон со словами (find_page_number_patterns):
+    одно место на странице не делает число номером ("Креатинин" / "88").
+    """
+    pattern = page_number_pattern(line)
+    if pattern is None:
+        return False
+    if page_num is not None and int(DIGITS.search(line).group()) == page_num:
+        return True
+    return pattern in patterns
+
+
+class PromptCompactor:
+    """Сжатие объединенного текста документов перед отправкой в LLM.
+
+    Всегда (без потери сведений): убираются общий заголовок комплекта и
+    баннеры документов из '=', маркеры '--- Страница N ---' заменяются
+    короткими '[стр. N]', схлопываются пробелы и пустые строки,
+    колонтитулы, повторяющиеся на страницах документа, остаются только
+    при первом появлении (в них ФИО пациента для проверки
+    идентичности). Строки-шум OCR отбрасываются еще при распознавании,
+    по уверенности слов (PDFProcessor.ocr_record): по одним символам
+    строки их не отличить от кратких клинических записей ("S I Q III").
+
+    Если текст все еще больше бюджета, по очереди применяются шаги
+    trim_steps (по убыванию приоритета удаления) до первого, после
+    которого текст помещается:
+      page_markers   - маркеры страниц;
+      repeated_lines - повторы длинных строк по всему комплекту.
+    Клинический текст не обрезается: то, что не поместилось после всех
+    шагов, конспектируется map-reduce (ReportSummarizer).
+    """
+
+    TRIM_STEPS = ('page_markers', 'repeated_lines')
+
+    def __init__(self, trim_steps=None):
+        trim_steps = Config.PROMPT_TRIM_STEPS if trim_steps is None else trim_steps
+        unknown = [step for step in trim_steps if step not in self.TRIM_STEPS]
+        if unknown:
+            logger.warning(f"Unknown prompt trim steps ignored: {', '.join(unknown)}")
+        self.trim_steps = [step for step in trim_steps if step in self.TRIM_STEPS]
+
+    @staticmethod
+    def clean(documents, removed):
+        """Колонтитулы и номера страниц; removed - счетчики удаленных строк"""
+        cleaned = []
+        for title, pages in documents:
+            running = find_running_lines(pages)
+            page_patterns = find_page_number_patterns(pages)
+            seen = set()
+            result = []
+            for page_num, lines in pages:
+                kept = []
+                for i, line in enumerate(lines):
+                    key = line.lower()
+                    in_zone = in_running_zone(i, len(lines))
+                    # Номера страниц есть в маркерах [стр. N]
+                    if in_zone and is_page_number(line, page_num, page_patterns):
+                        removed['page_numbers'] += 1
+                        continue
+                    if in_zone and key in running:
+                        if key in seen:
+                            removed['running_lines'] += 1
+                            continue
+                        seen.add(key)
+                    kept.append(line)
+                if kept:
+                    result.append((page_num, kept))
+            cleaned.append((title, result))
+        return cleaned
+
+    @staticmethod
+    def drop_repeated_lines(documents, removed):
+        """Повторы длинных строк по всему комплекту (точные, с числами) остаются один раз"""
+        seen = set()
+        result = []
+        for title, pages in documents:
+            kept_pages = []
+            for page_num, lines in pages:
+                kept = []
+                for line in lines:
+                    if len(line) >= REPEATED_LINE_MIN_CHARS:
+                        if line in seen:
+                            removed['repeated_lines'] += 1
+                            continue
+                        seen.add(line)
+                    kept.append(line)
+                if kept:
+                    kept_pages.append((page_num, kept))
+            result.append((title, kept_pages))
+        return result
+
+    @staticmethod
+    def render(documents, page_markers=True):
+        parts = []
+        for title, pages in documents:
+            lines = [title] if title else []
+            for page_num, page_lines in pages:
+                if page_markers and page_num is not None:
+                    lines.append(f"[стр. {page_num}]")
+                lines.extend(page_lines)
+            if lines:
+                parts.append('\n'.join(lines))
+        return '\n\n'.join(parts)
+
+    def compact(self, text, budget=None):
+        """Сжатый текст и статистика; budget - лимит токенов текста (None - без лимита)"""
+        original_tokens = estimate_tokens(text)
+        removed = Counter()
+        documents = self.clean(parse_documents(text), removed)
+        page_markers = True
+        compacted = self.render(documents)
+        tokens = estimate_tokens(compacted)
+
+        applied = []
+        for step in self.trim_steps:
+            if budget is None or tokens <= budget:
+                break
+            if step == 'page_markers':
+                page_markers = False
+            elif step == 'repeated_lines':
+                documents = self.drop_repeated_lines(documents, removed)
+            applied.append(step)
+            compacted = self.render(documents, page_markers)
+            tokens = estimate_tokens(compacted)
+
+        return compaction_result(text, compacted, budget, original_tokens, tokens, removed, applied)
+
+
+def compaction_result(text, compacted, budget, original_tokens, tokens, removed=None, trim_steps=()):
+    stats = {
+        'original_characters': len(text),
+        'characters': len(compacted),
+        'original_tokens': original_tokens,
+        'tokens': tokens,
+        'saved_tokens': original_tokens - tokens,
+        'saved_percent': round(100 * (1 - tokens / original_tokens), 1) if original_tokens else 0.0,
+        'removed_lines': dict(removed or {}),
+        'trim_steps': list(trim_steps),
+        'budget': budget,
+        'within_budget': budget is None or tokens <= budget,
+    }
+    return CompactionResult(compacted, stats)
+
+
+def compact_text(text, budget=None):
+    """Сжатие текста документов для промпта (см. PromptCompactor)"""
+    if not Config.PROMPT_COMPACTION:
+        tokens = estimate_tokens(text)
+        return compaction_result(text, text, budget, tokens, tokens)
+    return PromptCompactor().compact(text, budget)
@@ -1,3 +1,7 @@
+from prompt_compaction import compact_text
+from token_budget import estimate_tokens
+
+
 def get_system_prompt():
     return """
 Ты опытный врач-онколог и клинический консультант с 20-летним стажем, специализирующийся на анализе медицинских документов и создании структурированных отчетов.
@@ -78,4 +82,65 @@ def get_user_prompt(extracted_text):
 
 
 Создай отчет:
-"""
\ No newline at end of file
+"""
+
+def build_user_prompt(extracted_text, budget=None):
+    """Промпт отчета со сжатым текстом документов (prompt_compaction).
+
+    budget - лимит токенов всего промпта; шаблон вычитается из него, а
+    остаток достается тексту. Возвращает (промпт, CompactionResult).
+    """
+    text_budget = budget - estimate_tokens(get_user_prompt('')) if budget is not None else None
+    compaction = compact_text(extracted_text, text_budget)
+    return get_user_prompt(compaction.text), compaction
+
+
+def get_chunk_system_prompt():
+    return """
+Ты опытный врач-онколог. Тебе передают фрагмент большого комплекта медицинских документов одного пациента.
+Твоя задача - сжать фрагмент в конспект для последующего составления итогового отчета.
+
+ПРАВИЛА КОНСПЕКТА:
+• Сохраняй ВСЕ даты, препараты, схемы и циклы лечения, дозы
+• Сохраняй ВСЕ гистологические, цитологические, ИГХ и молекулярные заключения дословно
+• Сохраняй размеры опухолей и метастазов, данные КТ/МРТ/ПЭТ-КТ с датами
+• Сохраняй ФИО и дату рождения пациента (нужны для проверки идентичности)
+• Указывай, из какого документа и страницы взяты данные
+• Пропускай шаблонный текст, реквизиты учреждений, повторы
+• Только факты из фрагмента, без выводов и рекомендаций
+"""
+
+
+def get_chunk_user_prompt(chunk_text, chunk_index, chunk_count):
+    return f"""
+Фрагмент {chunk_index} из {chunk_count}.
+
+ФРАГМЕНТ ДОКУМЕНТОВ:
+{chunk_text}
+
+Составь конспект фрагмента:
+"""
+
+
+def get_reduce_user_prompt(summaries_text):
+    return f"""
+Проанализируй конспекты медицинских документов и создай структурированный отчет.
+Конспекты составлены по частям большого комплекта документов и идут в исходном порядке.
+
+КОНСПЕКТЫ ДОКУМЕНТОВ:
+{summaries_text}
+
+КРИТИЧЕСКИ ВАЖНЫЕ ТРЕБОВАНИЯ:
+1. Учти ВСЕ конспекты от начала до конца
+2. Проверь принадлежность к одному пациенту по ФИО и дате рождения во всех конспектах
+3. НЕ ПРОПУСКАЙ информацию о:
+   - Любых лекарственных препаратах
+   - Признаках прогрессирования заболевания
+   - Последних гистологических данных
+4. Создай отчет строго по указанной структуре
+5. Используй только информацию из конспектов
+6. Соблюдай хронологический порядок во всех разделах
+7. ОБЯЗАТЕЛЬНО укажи текущий статус заболевания
+
+Создай отчет:
+"""
@@ -0,0 +1,177 @@
+import logging
+import os
+import time
+from metrics import span
+from prompts import build_user_prompt, get_system_prompt, get_reduce_user_prompt
+from report_summarizer import ReportSummarizer
+from yandex_gpt_service import YandexGPTError
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    """Ошибка обработки, которую нужно вернуть клиенту с HTTP-кодом"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ReportPipeline:
+    """Полный цикл обработки загрузки: извлечение текста и генерация отчета.
+
+    Используется и синхронным /upload, и фоновыми воркерами очереди задач.
+    """
+
+    def __init__(self, pdf_processor, ai_service, upload_folder):
+        self.pdf_processor = pdf_processor
+        self.ai_service = ai_service
+        self.upload_folder = upload_folder
+        self.summarizer = ReportSummarizer(ai_service)
+
+    def extract_text(self, uploaded_files, file_hashes=None, dedup=None):
+        """Извлечение объединенного текста из одного или нескольких файлов.
+
+        file_hashes - SHA-256 файлов, посчитанные при приеме загрузки;
+        с ними кэш извлечения не перечитывает файлы для хэширования.
+        dedup - PageDeduplicator: повторяющиеся страницы в текст не попадают.
+        """
+        # ЛОГИКА ОБЪЕДИНЕНИЯ: несколько файлов обрабатываются как виртуальный комплект
+        if len(uploaded_files) > 1:
+            logger.info(f"Multiple files detected - extracting across {len(uploaded_files)} files without merging")
+
+            # Извлекаем текст по документам, без промежуточного объединенного PDF
+            return self.pdf_processor.process_multiple_pdfs(uploaded_files, file_hashes, dedup)
+
+        logger.info("Single file detected - processing directly")
+
+        # Для одного файла обрабатываем напрямую
+        return self.pdf_processor.extract_text_from_pdf(uploaded_files[0],
+                                                        file_hashes[0] if file_hashes else None, dedup)
+
+    def save_debug_text(self, session_id, combined_text):
+        """Сохранение объединенного текста для отладки"""
+        try:
+            debug_file = os.path.join(self.upload_folder, f'combined_text_debug_{session_id}.txt')
+            with open(debug_file, 'w', encoding='utf-8') as f:
+                f.write(combined_text)
+            logger.info(f"Combined text saved to {debug_file}")
+        except Exception as e:
+            logger.error(f"Cannot save debug file: {e}")
+
+    def build_prompt(self, combined_text):
+        """Пользовательский промпт со сжатым текстом и статистика сжатия"""
+        with span('compact', size=len(combined_text.encode('utf-8'))):
+            user_prompt, compaction = build_user_prompt(combined_text, self.summarizer.prompt_budget())
+        stats = compaction.stats
+        logger.info(f"Prompt compaction: {stats['original_tokens']} -> {stats['tokens']} tokens "
+                    f"(saved {stats['saved_tokens']}, {stats['saved_percent']}%), "
+                    f"removed lines {stats['removed_lines']}, trim steps {stats['trim_steps']}")
+        return user_prompt, compaction
+
+    def generate_report(self, user_prompt, documents_text, progress=None, use_cache=True):
+        """Генерация отчета по промпту build_prompt.
+
+        documents_text - сжатый текст документов из промпта: если промпт
+        больше бюджета, он конспектируется map-reduce. Если передан
+        progress, отчет генерируется потоково и частичный текст
+        периодически передается в progress(partial_report=...).
+        use_cache=False обходит кэш ответов LLM.
+        """
+        try:
+            system_prompt = get_system_prompt()
+
+            # Комплект не помещается в бюджет даже после сжатия: сначала конспектируем по частям
+            if self.summarizer.needs_map_reduce(user_prompt):
+                logger.info(f"Text of {len(documents_text)} characters exceeds the prompt budget, using map-reduce")
+                if progress is not None:
+                    progress(stage='summarizing')
+                user_prompt = get_reduce_user_prompt(self.summarizer.summarize(documents_text, use_cache))
+                if progress is not None:
+                    progress(stage='generating')
+
+            logger.info(f"Sending {len(user_prompt)} characters to Yandex GPT for analysis")
+            if progress is None:
+                report = self.ai_service.generate_report(system_prompt, user_prompt, use_cache=use_cache)
+            else:
+                report = self.stream_report(system_prompt, user_prompt, progress, use_cache)
+            logger.info(f"Received report with {len(report)} characters from Yandex GPT")
+
+        except YandexGPTError as gpt_error:
+            raise PipelineError(gpt_error.message, 400)
+        except Exception as gpt_error:
+            logger.error(f"Yandex GPT error: {gpt_error}")
+            raise PipelineError(f'Ошибка генерации отчета: {str(gpt_error)}', 500)
+
+        # Проверяем на ошибки в отчете
+        if report.startswith("ОШИБКА:"):
+            logger.error(f"Yandex GPT returned error: {report}")
+            raise PipelineError(report, 400)
+
+        return report
+
+    def stream_report(self, system_prompt, user_prompt, progress, use_cache=True, flush_interval=0.2):
+        """Потоковая генерация с публикацией частичного текста не чаще flush_interval"""
+        parts = []
+        last_flush = 0.0
+        for delta in self.ai_service.stream_report(system_prompt, user_prompt, use_cache=use_cache):
+            parts.append(delta)
+            now = time.monotonic()
+            if now - last_flush >= flush_interval:
+                last_flush = now
+                progress(partial_report=''.join(parts))
+
+        report = ''.join(parts)
+        progress(partial_report=report)
+        return report
+
+    def run(self, uploaded_files, session_id, progress=None, use_cache=True, file_hashes=None):
+        """Обработка сохраненных файлов; файлы удаляются в любом случае.
+
+        progress - необязательный callback(stage=..., partial_report=...)
+        для публикации хода обработки (используется очередью задач).
+        """
+        try:
+            if progress is not None:
+                progress(stage='extracting')
+            dedup = self.pdf_processor.create_deduplicator()
+            combined_text = self.extract_text(uploaded_files, file_hashes, dedup)
+
+            # Проверяем успешность извлечения текста
+            if not combined_text or len(combined_text.strip()) < 50:
+                raise PipelineError('Не удалось извлечь достаточно текста из PDF файлов', 400)
+
+            logger.info(f"Successfully extracted {len(combined_text)} characters from {len(uploaded_files)} file(s)")
+            self.save_debug_text(session_id, combined_text)
+
+            if progress is not None:
+                progress(stage='generating')
+            user_prompt, compaction = self.build_prompt(combined_text)
+            with span('llm', size=len(user_prompt.encode('utf-8'))):
+                report = self.generate_report(user_prompt, compaction.text, progress, use_cache)
+
+            logger.info("Successfully completed file processing and report generation")
+            return {
+                'report': report,
+                'files_processed': len(uploaded_files),
+                'total_characters': len(combined_text),
+                'processing_method': 'multi_document' if len(uploaded_files) > 1 else 'single',
+                # Страницы, не попавшие в текст как повторы других страниц загрузки
+                'duplicate_pages': dedup.dropped if dedup is not None else [],
+                # Экономия токенов промпта за счет сжатия текста
+                'prompt_compaction': compaction.stats
+            }
+        finally:
+            self.cleanup(uploaded_files)
+
+    @staticmethod
+    def cleanup(filepaths):
+        """Удаление загруженных файлов"""
+        for filepath in filepaths:
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    logger.info(f"Cleaned up: {os.path.basename(filepath)}")
+            except Exception as e:
+                logger.error(f"Cannot remove {filepath}: {e}")
@@ -0,0 +1,159 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from metrics import run_in_context
+from prompt_compaction import DOCUMENT_HEADER, PAGE_HEADER
+from prompts import (get_chunk_system_prompt, get_chunk_user_prompt,
+                     get_reduce_user_prompt, get_system_prompt)
+from token_budget import estimate_tokens
+from yandex_gpt_service import YandexGPTError
+
+logger = logging.getLogger(__name__)
+
+# Не больше стольких уровней свертки конспектов
+MAX_REDUCE_LEVELS = 3
+
+
+class ReportSummarizer:
+    """Map-reduce суммаризация комплектов, не помещающихся в контекст модели.
+
+    Текст режется по границам документов (ДОКУМЕНТ N) и страниц
+    (--- Страница N --- или [стр. N] сжатого текста), страницы упаковываются в фрагменты в пределах
+    бюджета токенов, фрагменты конспектируются параллельно, а конспекты
+    передаются в итоговый промпт отчета.
+    """
+
+    def __init__(self, ai_service):
+        self.ai_service = ai_service
+
+    @staticmethod
+    def input_budget():
+        """Сколько токенов остается на пользовательский промпт"""
+        return (Config.LLM_CONTEXT_TOKENS - Config.LLM_MAX_TOKENS
+                - estimate_tokens(get_system_prompt()))
+
+    @classmethod
+    def prompt_budget(cls):
+        """Бюджет пользовательского промпта: контекст модели или PROMPT_TOKEN_BUDGET, если он меньше"""
+        budget = cls.input_budget()
+        if Config.PROMPT_TOKEN_BUDGET:
+            budget = min(budget, Config.PROMPT_TOKEN_BUDGET)
+        return budget
+
+    def needs_map_reduce(self, user_prompt):
+        return estimate_tokens(user_prompt) > self.prompt_budget()
+
+    @staticmethod
+    def split_units(text):
+        """Разбиение на единицы (заголовок документа, текст страницы) в исходном порядке"""
+        units = []
+        headers = list(DOCUMENT_HEADER.finditer(text))
+        if headers:
+            segments = [('', text[:headers[0].start()])]
+            for i, header in enumerate(headers):
+                end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+                segments.append((header.group(0), text[header.end():end]))
+        else:
+            segments = [('', text)]
+
+        for document_header, segment in segments:
+            starts = [m.start() for m in PAGE_HEADER.finditer(segment)]
+            bounds = [0] + starts + [len(segment)]
+            for start, end in zip(bounds, bounds[1:]):
+                page = segment[start:end].strip()
+                if page:
+                    units.append((document_header, page))
+        return units
+
+    @staticmethod
+    def split_oversized(unit_text, budget):
+        """Нарезка слишком длинной страницы по строкам"""
+        parts = []
+        current = []
+        current_tokens = 0
+        for line in unit_text.split('\n'):
+            line_tokens = estimate_tokens(line)
+            if current and current_tokens + line_tokens > budget:
+                parts.append('\n'.join(current))
+                current = []
+                current_tokens = 0
+            # Строка длиннее бюджета режется по символам пропорционально оценке
+            while line_tokens > budget:
+                cut = max(1, len(line) * budget // line_tokens)
+                parts.append(line[:cut])
+                line = line[cut:]
+                line_tokens = estimate_tokens(line)
+            current.append(line)
+            current_tokens += line_tokens
+        if current:
+            parts.append('\n'.join(current))
+        return parts
+
+    def pack_chunks(self, units, budget):
+        """Жадная упаковка единиц в фрагменты не больше budget токенов"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        current_header = None
+
+        def flush():
+            if current:
+                chunks.append('\n\n'.join(current))
+
+        for document_header, unit_text in units:
+            for part in self.split_oversized(unit_text, budget):
+                part_tokens = estimate_tokens(part)
+                # Заголовок документа повторяется в каждом фрагменте, где есть его страницы
+                header_tokens = estimate_tokens(document_header) if document_header != current_header else 0
+                if current and current_tokens + header_tokens + part_tokens > budget:
+                    flush()
+                    current, current_tokens, current_header = [], 0, None
+                    header_tokens = estimate_tokens(document_header)
+                if document_header and document_header != current_header:
+                    current.append(document_header)
+                    current_tokens += header_tokens
+                    current_header = document_header
+                current.append(part)
+                current_tokens += part_tokens
+        flush()
+        return chunks
+
+    def summarize_chunk(self, args):
+        index, count, chunk, use_cache = args
+        summary = self.ai_service.generate_report(
+            get_chunk_system_prompt(),
+            get_chunk_user_prompt(chunk, index, count),
+            max_tokens=Config.LLM_CHUNK_SUMMARY_TOKENS,
+            use_cache=use_cache)
+        if summary.startswith("ОШИБКА:"):
+            raise YandexGPTError(summary)
+        logger.info(f"Chunk {index}/{count}: {estimate_tokens(chunk)} -> {estimate_tokens(summary)} tokens")
+        return summary
+
+    def summarize(self, text, use_cache=True):
+        """Сжатие текста в конспекты, помещающиеся в итоговый промпт"""
+        chunk_budget = min(Config.LLM_CHUNK_TOKENS,
+                           Config.LLM_CONTEXT_TOKENS - Config.LLM_CHUNK_SUMMARY_TOKENS
+                           - estimate_tokens(get_chunk_system_prompt())
+                           - estimate_tokens(get_chunk_user_prompt('', 0, 0)))
+        units = self.split_units(text)
+
+        for level in range(1, MAX_REDUCE_LEVELS + 1):
+            chunks = self.pack_chunks(units, chunk_budget)
+            logger.info(f"Map-reduce level {level}: {len(units)} units in {len(chunks)} chunks")
+
+            tasks = [(i, len(chunks), chunk, use_cache) for i, chunk in enumerate(chunks, 1)]
+            with ThreadPoolExecutor(max_workers=Config.LLM_MAP_CONCURRENCY,
+                                    thread_name_prefix='llm-map') as executor:
+                summaries = list(run_in_context(executor, self.summarize_chunk, tasks))
+
+            summaries_text = '\n\n'.join(
+                f"КОНСПЕКТ {i}:\n{summary.strip()}" for i, summary in enumerate(summaries, 1))
+            if estimate_tokens(get_reduce_user_prompt(summaries_text)) <= self.prompt_budget():
+                return summaries_text
+
+            # Конспекты все еще не помещаются: сворачиваем их еще раз
+            units = [('', f"КОНСПЕКТ {i}:\n{summary.strip()}") for i, summary in enumerate(summaries, 1)]
+
+        logger.warning("Summaries still exceed the model context after map-reduce")
+        return summaries_text
@@ -1,12 +1,19 @@
+import json
 import logging
 import os
-import uuid
-from flask import render_template, request, jsonify, current_app
-from werkzeug.utils import secure_filename
+import time
+from flask import render_template, request, jsonify, url_for, Response, stream_with_context
+from config import Config
+from job_queue import JobQueue
+from llm_cache import get_report_cache
+from llm_http_client import get_llm_client_stats
+from cpu_pool import get_cpu_pool
+from metrics import get_metrics, request_trace
 from yandex_gpt_service import YandexGPTService
-from pdf_merger import PDFMerger
 from pdf_processor import PDFProcessor
-from prompts import get_system_prompt, get_user_prompt
+from report_pipeline import ReportPipeline, PipelineError
+from upload_ingest import UploadIngestor
+from warmup import Warmup
 
 logger = logging.getLogger(__name__)
 
@@ -14,141 +21,245 @@ logger = logging.getLogger(__name__)
 def init_routes(app):
     pdf_processor = PDFProcessor()
     ai_service = YandexGPTService()
-    pdf_merger = PDFMerger()
+    pipeline = ReportPipeline(pdf_processor, ai_service, app.config['UPLOAD_FOLDER'])
+
+    def run_job(payload, progress):
+        with request_trace() as trace:
+            result = pipeline.run(payload['files'], payload['session_id'], progress,
+                                  use_cache=payload.get('use_cache', True),
+                                  file_hashes=payload.get('file_hashes'))
+        if payload.get('debug'):
+            result['timings'] = trace.summary()
+        return result
+
+    # Очередь фоновых задач: воркеры стартуют в каждом процессе gunicorn после fork
+    job_queue = JobQueue(
+        Config.JOB_DB_PATH,
+        handler=run_job,
+        workers=Config.JOB_WORKERS,
+        max_attempts=Config.JOB_MAX_ATTEMPTS,
+        stale_after=Config.JOB_STALE_AFTER)
+    app.extensions['job_queue'] = job_queue
+
+    # Прогрев OCR-стека: в gunicorn запускается из post_worker_init
+    warmup = Warmup(pdf_processor.warm_up)
+    app.extensions['warmup'] = warmup
+
+    def save_uploaded_files():
+        """Потоковый прием файлов из запроса; возвращает IngestedUpload"""
+        return UploadIngestor(app.config['UPLOAD_FOLDER']).ingest(request.environ)
+
+    def use_llm_cache(form):
+        """Флаг обхода кэша ответов LLM: no_cache=1 в форме или query string"""
+        value = form.get('no_cache') or request.args.get('no_cache', '')
+        return value.lower() not in ('1', 'true', 'yes')
+
+    def debug_requested(form):
+        """Флаг разбивки времени по этапам в ответе: debug=1 в форме или query string"""
+        value = form.get('debug') or request.args.get('debug', '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    @app.before_request
+    def ensure_job_workers():
+        # Для dev-сервера; в gunicorn воркеры запускает post_worker_init
+        job_queue.start_workers()
+        warmup.start()
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        """Liveness: процесс отвечает на запросы"""
+        return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        """Readiness: OCR-стек загружен, воркер можно нагружать"""
+        status = warmup.status()
+        return jsonify(status), 200 if warmup.ready else 503
 
     @app.route('/')
     def index():
         return render_template('index.html')
 
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        """Метрики кэшей и LLM-клиентов текущего процесса"""
+        cache = pdf_processor.extraction_cache
+        report_cache = get_report_cache()
+        cpu_pool = get_cpu_pool()
+        return jsonify({
+            'pid': os.getpid(),
+            'llm': get_llm_client_stats(),
+            'extraction_cache': cache.stats() if cache is not None else None,
+            'llm_cache': report_cache.stats() if report_cache is not None else None,
+            'cpu_pool': cpu_pool.stats() if cpu_pool is not None else None
+        })
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Гистограммы этапов обработки всех воркеров в формате Prometheus"""
+        registry = get_metrics()
+        if registry is None:
+            return Response("# metrics are disabled\n", status=404, mimetype='text/plain')
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/upload', methods=['POST'])
     def upload_files():
         try:
-            if 'files' not in request.files:
-                return jsonify({'error': 'Не выбраны файлы'}), 400
-
-            files = request.files.getlist('files')
-            if not files or all(f.filename == '' for f in files):
-                return jsonify({'error': 'Не выбраны файлы'}), 400
+            with request_trace() as trace:
+                upload = save_uploaded_files()
+                result = pipeline.run(upload.paths, upload.session_id, use_cache=use_llm_cache(upload.form),
+                                      file_hashes=upload.file_hashes)
+            if debug_requested(upload.form):
+                result['timings'] = trace.summary()
+            return jsonify(result)
 
-            # Проверяем, что все файлы - PDF
-            for file in files:
-                if not file.filename.lower().endswith('.pdf'):
-                    return jsonify({'error': f'Файл {file.filename} не является PDF'}), 400
+        except PipelineError as e:
+            return jsonify({'error': e.message}), e.status_code
+        except Exception as e:
+            logger.error(f"Upload error: {e}")
+            return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
 
-            # ИСПРАВЛЕННОЕ СОХРАНЕНИЕ: убираем дублирование
-            uploaded_files = []
-            session_id = str(uuid.uuid4())
+    @app.route('/jobs', methods=['POST'])
+    def create_job():
+        """Асинхронная обработка: файлы сохраняются, задача ставится в очередь"""
+        try:
+            upload = save_uploaded_files()
+            job_id = job_queue.submit({
+                'files': upload.paths,
+                'file_hashes': upload.file_hashes,
+                'session_id': upload.session_id,
+                'use_cache': use_llm_cache(upload.form),
+                'debug': debug_requested(upload.form)
+            })
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': url_for('get_job', job_id=job_id),
+                'events_url': url_for('job_events', job_id=job_id),
+                'pages_url': url_for('get_job_pages', job_id=job_id)
+            }), 202
 
-            for i, file in enumerate(files):
-                if file and file.filename:
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{session_id}_{i}_{filename}"  # Добавляем индекс для уникальности
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(filepath)
-                    uploaded_files.append(filepath)
-                    logger.info(f"Saved file {i + 1}: {unique_filename}")
+        except PipelineError as e:
+            return jsonify({'error': e.message}), e.status_code
+        except Exception as e:
+            logger.error(f"Job submit error: {e}")
+            return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
 
-            logger.info(f"Successfully saved {len(uploaded_files)} unique files")
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        return jsonify(job)
 
-            # ЛОГИКА ОБЪЕДИНЕНИЯ: используем PDF merger для нескольких файлов
-            if len(uploaded_files) > 1:
-                logger.info(f"Multiple files detected - using PDF merger for {len(uploaded_files)} files")
+    @app.route('/jobs/<job_id>/pages', methods=['GET'])
+    def get_job_pages(job_id):
+        """Частичный результат: страницы, уже извлеченные по контрольным точкам.
 
-                # Объединяем PDF файлы физически
-                merged_pdf_path = pdf_merger.merge_pdfs(uploaded_files)
-                if not merged_pdf_path:
-                    raise Exception("Failed to merge PDF files")
+        Файл, найденный в кэше извлечения, постранично не обрабатывается и
+        контрольных точек не оставляет: его страницы берутся из кэша
+        (source 'cache').
+        """
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        checkpoints = pdf_processor.checkpoints
+        cache = pdf_processor.extraction_cache
+        if checkpoints is None and cache is None:
+            return jsonify({'error': 'Контрольные точки отключены'}), 404
 
-                logger.info(f"Successfully merged PDFs into: {os.path.basename(merged_pdf_path)}")
+        payload = job_queue.get_payload(job_id)
+        with_text = request.args.get('text', '1').lower() not in ('0', 'false', 'no')
+        files = []
+        for path, file_hash in zip(payload['files'], payload.get('file_hashes') or []):
+            done_pages = checkpoints.load(file_hash) if checkpoints is not None else {}
+            source = 'checkpoints'
+            if not done_pages and cache is not None:
+                cached_pages = cache.get_document(file_hash)
+                if cached_pages:
+                    done_pages = {page_num: (method, text, image_hash)
+                                  for page_num, method, text, image_hash in cached_pages}
+                    source = 'cache'
+            pages = [{'page': page_num + 1, 'method': method, **({'text': text} if with_text else {})}
+                     for page_num, (method, text, _) in sorted(done_pages.items())]
+            files.append({'name': os.path.basename(path), 'file_hash': file_hash, 'source': source,
+                          'pages_done': len(pages), 'pages': pages})
+        return jsonify({'job_id': job_id, 'status': job['status'], 'stage': job['stage'], 'files': files})
 
-                # Извлекаем текст из объединенного PDF
-                combined_text = pdf_processor.extract_text_from_pdf(merged_pdf_path)
+    @app.route('/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        """Server-Sent Events: этапы обработки и отчет по мере генерации.
 
-                # Файлы для очистки
-                files_to_cleanup = uploaded_files + [merged_pdf_path]
+        Поток ограничен JOB_EVENTS_MAX_DURATION: после него EventSource
+        переподключается сам, а id событий ("попытка:длина уже отданной
+        части отчета") приходит обратно в Last-Event-ID, и отчет
+        продолжается с этого места. Повторная попытка задачи генерирует
+        отчет заново: если клиент уже получил часть отчета другой попытки,
+        ему отправляется событие reset, и отчет отдается с начала.
+        """
+        if job_queue.get(job_id) is None:
+            return jsonify({'error': 'Задача не найдена'}), 404
 
-            else:
-                logger.info("Single file detected - processing directly")
+        try:
+            resume_attempt, resume_from = request.headers.get('Last-Event-ID', '').split(':')
+            resume_attempt, resume_from = int(resume_attempt), max(0, int(resume_from))
+        except ValueError:
+            resume_attempt, resume_from = 0, 0
 
-                # Для одного файла обрабатываем напрямую
-                combined_text = pdf_processor.extract_text_from_pdf(uploaded_files[0])
+        def sse(event, data, attempt, sent):
+            return (f"id: {attempt}:{sent}\nevent: {event}\n"
+                    f"data: {json.dumps(data, ensure_ascii=False)}\n\n")
 
-                # Файлы для очистки
-                files_to_cleanup = uploaded_files
+        def generate():
+            attempt, sent = resume_attempt, resume_from
+            last_stage = None
+            started = last_write = time.monotonic()
+            yield f"retry: {int(Config.JOB_EVENTS_RETRY * 1000)}\n\n"
+            try:
+                while True:
+                    job = job_queue.get(job_id)
+                    if job is None:
+                        yield sse('error', {'error': 'Задача не найдена'}, attempt, sent)
+                        return
 
-            # Проверяем успешность извлечения текста
-            if not combined_text or len(combined_text.strip()) < 50:
-                # Очищаем файлы при ошибке
-                for filepath in files_to_cleanup:
-                    try:
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
-                    except Exception as cleanup_error:
-                        logger.error(f"Cannot cleanup {filepath}: {cleanup_error}")
+                    stage = job.get('stage') or job['status']
+                    if stage != last_stage:
+                        last_stage = stage
+                        last_write = time.monotonic()
+                        yield sse('status', {'status': job['status'], 'stage': stage}, attempt, sent)
 
-                return jsonify({'error': 'Не удалось извлечь достаточно текста из PDF файлов'}), 400
+                    # Отдаем только новую часть отчета
+                    partial = job.get('partial_report') or ''
+                    if job['status'] == 'running' and (job['attempts'] != attempt or len(partial) < sent):
+                        # Отданный текст относится к другой попытке задачи
+                        if sent:
+                            last_write = time.monotonic()
+                            yield sse('reset', {}, job['attempts'], 0)
+                        attempt, sent = job['attempts'], 0
+                    if len(partial) > sent:
+                        chunk = partial[sent:]
+                        sent = len(partial)
+                        last_write = time.monotonic()
+                        yield sse('chunk', {'text': chunk}, attempt, sent)
 
-            logger.info(f"Successfully extracted {len(combined_text)} characters from {len(uploaded_files)} file(s)")
+                    if job['status'] == 'done':
+                        yield sse('done', job['result'], attempt, sent)
+                        return
+                    if job['status'] == 'failed':
+                        yield sse('error', {'error': job['error']}, attempt, sent)
+                        return
 
-            # Сохраняем объединенный текст для отладки
-            try:
-                debug_file = os.path.join(current_app.config['UPLOAD_FOLDER'], f'combined_text_debug_{session_id}.txt')
-                with open(debug_file, 'w', encoding='utf-8') as f:
-                    f.write(combined_text)
-                logger.info(f"Combined text saved to {debug_file}")
-            except Exception as e:
-                logger.error(f"Cannot save debug file: {e}")
-
-            # Генерируем отчет из объединенного текста
-            try:
-                system_prompt = get_system_prompt()
-                user_prompt = get_user_prompt(combined_text)
-
-                logger.info(f"Sending {len(combined_text)} characters to Yandex GPT for analysis")
-                report = ai_service.generate_report(system_prompt, user_prompt)
-                logger.info(f"Received report with {len(report)} characters from Yandex GPT")
-
-            except Exception as gpt_error:
-                logger.error(f"Yandex GPT error: {gpt_error}")
-                # Очищаем файлы при ошибке GPT
-                for filepath in files_to_cleanup:
-                    try:
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
-                    except:
-                        pass
-                return jsonify({'error': f'Ошибка генерации отчета: {str(gpt_error)}'}), 500
-
-            # Удаляем загруженные файлы после успешной обработки
-            for filepath in files_to_cleanup:
-                try:
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        logger.info(f"Cleaned up: {os.path.basename(filepath)}")
-                except Exception as e:
-                    logger.error(f"Cannot remove {filepath}: {e}")
-
-            # Проверяем на ошибки в отчете
-            if report.startswith("ОШИБКА:"):
-                logger.error(f"Yandex GPT returned error: {report}")
-                return jsonify({'error': report}), 400
-
-            logger.info("Successfully completed file processing and report generation")
-            return jsonify({
-                'report': report,
-                'files_processed': len(uploaded_files),
-                'total_characters': len(combined_text),
-                'processing_method': 'merged' if len(uploaded_files) > 1 else 'single'
-            })
+                    now = time.monotonic()
+                    if now - started >= Config.JOB_EVENTS_MAX_DURATION:
+                        # Не держим поток веб-сервера всю задачу: клиент переподключится
+                        return
+                    if now - last_write >= Config.JOB_EVENTS_KEEPALIVE:
+                        last_write = now
+                        yield ": keepalive\n\n"
+                    time.sleep(Config.JOB_EVENTS_POLL_INTERVAL)
+            except GeneratorExit:
+                logger.debug(f"Event stream of job {job_id} closed by the client")
 
-        except Exception as e:
-            logger.error(f"Upload error: {e}")
-            # Экстренная очистка при любой ошибке
-            try:
-                if 'uploaded_files' in locals():
-                    for filepath in uploaded_files:
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
-            except:
-                pass
-            return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
+        return Response(stream_with_context(generate()),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
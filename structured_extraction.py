@@ -0,0 +1,175 @@
+import logging
+import re
+from array import array
+from collections import namedtuple
+from lazy_modules import lazy_import
+
+fitz = lazy_import('fitz')  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'\s+')
+
+# Таблица страницы: рамка (x0, y0, x1, y1), размер и ячейки построчно
+# одним плоским списком строк; рамки ячеек - плоский array('f') по 4 числа
+# (у пропущенных ячеек объединенных строк - нули)
+TableLayout = namedtuple('TableLayout', ['bbox', 'rows', 'cols', 'cells', 'cell_boxes'])
+
+
+class PageLayout:
+    """Структура страницы с текстовым слоем: блоки, строки и таблицы.
+
+    Хранится в плоских массивах (array), а не в словарях на каждый
+    span, как get_text('dict'): строка - это текст и четыре числа
+    рамки, поэтому раскладка сотен страниц занимает немного памяти и
+    дешево сериализуется (to_dict). Строки, попавшие в таблицы, в
+    блоках не повторяются.
+    """
+
+    __slots__ = ('page_num', 'width', 'height', 'block_boxes', 'line_texts', 'line_boxes',
+                 'line_blocks', 'line_sizes', 'tables')
+
+    def __init__(self, page_num, width, height):
+        self.page_num = page_num
+        self.width = width
+        self.height = height
+        self.block_boxes = array('f')
+        self.line_texts = []
+        self.line_boxes = array('f')
+        self.line_blocks = array('I')
+        self.line_sizes = array('f')
+        self.tables = []
+
+    def add_block(self, bbox):
+        self.block_boxes.extend(bbox)
+        return len(self.block_boxes) // 4 - 1
+
+    def add_line(self, block, text, bbox, size):
+        self.line_texts.append(text)
+        self.line_boxes.extend(bbox)
+        self.line_blocks.append(block)
+        self.line_sizes.append(size)
+
+    @property
+    def block_count(self):
+        return len(self.block_boxes) // 4
+
+    def block_box(self, block):
+        return tuple(self.block_boxes[block * 4:block * 4 + 4])
+
+    def line_box(self, line):
+        return tuple(self.line_boxes[line * 4:line * 4 + 4])
+
+    def to_dict(self, digits=1):
+        """JSON-совместимое представление: массивы вместо вложенных объектов"""
+        def flat(values):
+            return [round(value, digits) for value in values]
+
+        return {
+            'page': self.page_num + 1,
+            'size': [round(self.width, digits), round(self.height, digits)],
+            'blocks': flat(self.block_boxes),
+            'lines': {'text': self.line_texts, 'bbox': flat(self.line_boxes),
+                      'block': list(self.line_blocks), 'size': flat(self.line_sizes)},
+            'tables': [{'bbox': flat(table.bbox), 'rows': table.rows, 'cols': table.cols,
+                        'cells': table.cells, 'cell_bbox': flat(table.cell_boxes)}
+                       for table in self.tables],
+        }
+
+
+def _inside(bbox, rect):
+    """Центр рамки bbox внутри rect"""
+    x = (bbox[0] + bbox[2]) / 2
+    y = (bbox[1] + bbox[3]) / 2
+    return rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]
+
+
+def find_page_tables(page):
+    """Таблицы страницы (PyMuPDF find_tables) в виде TableLayout.
+
+    Поиск по линиям разметки дорогой, поэтому на страницах без
+    векторной графики он не выполняется.
+    """
+    if not page.get_cdrawings():
+        return []
+    tables = []
+    try:
+        found = page.find_tables()
+    except Exception as e:
+        logger.error(f"Table detection error on page {page.number + 1}: {e}")
+        return []
+    for table in found.tables:
+        rows = table.extract()
+        cols = table.col_count
+        cells = [WHITESPACE.sub(' ', cell or '').strip() for row in rows for cell in row]
+        cell_boxes = array('f')
+        for row in table.rows:
+            for cell in row.cells:
+                cell_boxes.extend(cell if cell is not None else (0.0, 0.0, 0.0, 0.0))
+        tables.append(TableLayout(tuple(table.bbox), len(rows), cols, cells, cell_boxes))
+    return tables
+
+
+def extract_layout(page, page_num, with_tables=True):
+    """Раскладка страницы PyMuPDF: блоки, строки и таблицы с координатами"""
+    layout = PageLayout(page_num, page.rect.width, page.rect.height)
+    if with_tables:
+        layout.tables = find_page_tables(page)
+    table_boxes = [table.bbox for table in layout.tables]
+
+    # Флаги как у get_text() по умолчанию, без изображений
+    flags = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+    for block in page.get_text('dict', flags=flags)['blocks']:
+        if block.get('type', 0) != 0:
+            continue
+        lines = []
+        for line in block['lines']:
+            if any(_inside(line['bbox'], box) for box in table_boxes):
+                continue
+            text = ''.join(span['text'] for span in line['spans'])
+            if not text.strip():
+                continue
+            size = max((span['size'] for span in line['spans']), default=0.0)
+            lines.append((text, line['bbox'], size))
+        if not lines:
+            continue
+        index = layout.add_block(block['bbox'])
+        for text, bbox, size in lines:
+            layout.add_line(index, text, bbox, size)
+    return layout
+
+
+def table_to_text(table):
+    """Компактная запись таблицы для промпта: строки через ' | ', без пустых столбцов"""
+    rows = [table.cells[row * table.cols:(row + 1) * table.cols] for row in range(table.rows)]
+    keep = [col for col in range(table.cols) if any(row[col] for row in rows)]
+    lines = []
+    for row in rows:
+        values = [row[col] for col in keep]
+        # Пустые ячейки в конце строки не пишем, текст последней ячейки не трогаем
+        while values and not values[-1]:
+            values.pop()
+        if values:
+            lines.append(' | '.join(values))
+    return f"[таблица {len(lines)}x{len(keep)}]\n" + '\n'.join(lines) + "\n[/таблица]"
+
+
+def layout_to_text(layout):
+    """Текст страницы из раскладки: блоки в исходном порядке, таблицы - компактно.
+
+    Таблица вставляется перед первым блоком, который начинается ниже ее
+    верхней границы, поэтому порядок чтения сохраняется.
+    """
+    blocks = [[] for _ in range(layout.block_count)]
+    for line, block in enumerate(layout.line_blocks):
+        blocks[block].append(layout.line_texts[line])
+
+    tables = sorted(layout.tables, key=lambda table: (table.bbox[1], table.bbox[0]))
+    parts = []
+    for block, lines in enumerate(blocks):
+        top = layout.block_boxes[block * 4 + 1]
+        while tables and tables[0].bbox[1] <= top:
+            parts.append(table_to_text(tables.pop(0)))
+        parts.append('\n'.join(lines))
+    parts.extend(table_to_text(table) for table in tables)
+    return '\n'.join(parts) + '\n' if parts else ''
@@ -0,0 +1,36 @@
+import re
+from config import Config
+
+LETTERS = re.compile(r'[^\W\d_]+')
+DIGITS = re.compile(r'\d+')
+SYMBOLS = re.compile(r'[^\w\s]+|_+')
+
+# Сколько символов числа и знаков препинания в среднем приходится на токен
+DIGITS_PER_TOKEN = 3.0
+SYMBOLS_PER_TOKEN = 4.0
+
+
+def _class_tokens(pattern, text, chars_per_token):
+    """Токены одного класса: серия режется на части, последняя часть неполная"""
+    runs = pattern.findall(text)
+    return sum(map(len, runs)) / chars_per_token + 0.5 * len(runs)
+
+
+def estimate_tokens(text):
+    """Локальная оценка числа токенов YandexGPT для текста.
+
+    Токенизатор модели недоступен локально (API токенизации - лишний
+    сетевой запрос на каждую проверку бюджета), поэтому текст делится
+    на слова, числа и серии знаков, и у каждого класса своя средняя
+    длина токена: слова режутся на части по LLM_CHARS_PER_TOKEN букв,
+    числа - по DIGITS_PER_TOKEN цифр. Пробелы отдельных токенов не
+    дают. На неполный последний токен каждой серии добавляется половина
+    токена, и итог округляется вверх, поэтому оценка скорее завышена и
+    бюджет не превышается.
+    """
+    if not text:
+        return 0
+    tokens = (_class_tokens(LETTERS, text, Config.LLM_CHARS_PER_TOKEN)
+              + _class_tokens(DIGITS, text, DIGITS_PER_TOKEN)
+              + _class_tokens(SYMBOLS, text, SYMBOLS_PER_TOKEN))
+    return int(tokens) + 1
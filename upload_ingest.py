@@ -0,0 +1,256 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import socket
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+
+from werkzeug.exceptions import ClientDisconnected, HTTPException
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+from config import Config
+from lazy_modules import lazy_import
+from metrics import observe
+from report_pipeline import PipelineError
+
+fitz = lazy_import('fitz')  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# Сигнатура PDF; по спецификации перед ней допускается немного мусора
+PDF_MAGIC = b'%PDF-'
+MAGIC_WINDOW = 1024
+
+# Объекты страниц, видимые в несжатой части файла
+PAGE_OBJECT = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+# Сколько байт предыдущего куска сохраняется для поиска на стыке
+SCAN_OVERLAP = 32
+
+IngestedUpload = namedtuple('IngestedUpload', ['paths', 'file_hashes', 'session_id', 'form'])
+
+
+class SpooledPDF:
+    """Приемник одного файла из multipart-потока (stream_factory werkzeug).
+
+    Пишет куски во временный файл каталога спулинга, по мере поступления
+    считает SHA-256, проверяет сигнатуру %PDF в начале, размер и дедлайн
+    загрузки, считает объекты страниц. Нарушение прерывает разбор
+    запроса сразу, не дожидаясь конца тела. Пароль проверяется в конце
+    (finish): файлы, зашифрованные только паролем владельца (запрет
+    печати или копирования), открываются без пароля и принимаются.
+    """
+
+    def __init__(self, ingestor, filename):
+        self.ingestor = ingestor
+        self.filename = filename
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.magic_found = False
+        self.tail = b''
+        self.page_objects = 0
+        self.file_hash = None
+        self.finished = False
+        self._file = tempfile.NamedTemporaryFile(dir=ingestor.spool_dir, prefix='upload_',
+                                                 suffix='.pdf', delete=False)
+        self.path = self._file.name
+
+    def write(self, data):
+        self.ingestor.check_deadline()
+
+        self.size += len(data)
+        if self.size > self.ingestor.max_file_bytes:
+            raise PipelineError(f'Файл {self.filename} больше '
+                                f'{self.ingestor.max_file_bytes // (1024 * 1024)} МБ', 413)
+
+        if not self.magic_found:
+            self.head += data[:MAGIC_WINDOW - len(self.head)]
+            self.magic_found = PDF_MAGIC in self.head
+            if not self.magic_found and len(self.head) >= MAGIC_WINDOW:
+                raise PipelineError(f'Файл {self.filename} не является PDF', 400)
+
+        self.scan(data)
+        self.digest.update(data)
+        self._file.write(data)
+        return len(data)
+
+    def scan(self, data):
+        """Подсчет объектов страниц с учетом стыка кусков"""
+        window = self.tail + data
+        skip = len(self.tail)
+        self.page_objects += sum(1 for m in PAGE_OBJECT.finditer(window) if m.end() > skip)
+        # Инкрементальные обновления повторяют объекты страниц, поэтому
+        # до конца файла отказываем только с двукратным запасом
+        if self.ingestor.pages_so_far + self.page_objects > 2 * self.ingestor.max_pages:
+            raise PipelineError(f'Превышен лимит в {self.ingestor.max_pages} страниц на загрузку', 413)
+        self.tail = window[-SCAN_OVERLAP:]
+
+    def finish(self):
+        """Конец части: проверка документа целиком через PyMuPDF"""
+        if self.finished:
+            return
+        self.finished = True
+        self._file.close()
+        self.file_hash = self.digest.hexdigest()
+
+        if not self.magic_found:
+            raise PipelineError(f'Файл {self.filename} не является PDF', 400)
+
+        try:
+            doc = fitz.open(self.path)
+        except Exception as e:
+            logger.warning(f"Rejected unreadable upload {self.filename}: {e}")
+            raise PipelineError(f'Файл {self.filename} поврежден или не является PDF', 400)
+        try:
+            if doc.needs_pass:
+                raise PipelineError(f'Файл {self.filename} защищен паролем', 400)
+            page_count = doc.page_count
+        finally:
+            doc.close()
+
+        # Сжатые потоки объектов не видны при сканировании, считаем точно
+        self.ingestor.pages_so_far += page_count
+        if self.ingestor.pages_so_far > self.ingestor.max_pages:
+            raise PipelineError(f'Превышен лимит в {self.ingestor.max_pages} страниц на загрузку', 413)
+        logger.info(f"Spooled {self.filename}: {self.size} bytes, {page_count} pages, sha256 {self.file_hash[:12]}")
+
+    # Интерфейс файла, который ожидает werkzeug.FileStorage
+    def seek(self, offset, whence=0):
+        # werkzeug перематывает контейнер в начало, когда часть получена целиком
+        if offset == 0 and whence == 0:
+            self.finish()
+            return 0
+        raise OSError("SpooledPDF supports only rewinding to the start")
+
+    def tell(self):
+        return 0 if self.finished else self.size
+
+    def read(self, size=-1):
+        raise OSError("SpooledPDF is write-only; use the spooled path")
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadIngestor:
+    """Потоковый прием загрузки PDF без буферизации тела запроса.
+
+    Тело multipart разбирается werkzeug.formparser по мере чтения из
+    сокета, каждый файл сразу пишется кусками в каталог спулинга через
+    SpooledPDF. Общий дедлайн и таймаут чтения сокета не дают медленному
+    клиенту надолго занять поток; при любой ошибке все частично
+    записанные файлы удаляются.
+    """
+
+    def __init__(self, upload_folder, spool_dir=None, max_file_bytes=None, max_files=None,
+                 max_pages=None, deadline=None, read_timeout=None):
+        self.upload_folder = upload_folder
+        self.spool_dir = spool_dir or Config.UPLOAD_SPOOL_DIR
+        self.max_file_bytes = max_file_bytes or Config.UPLOAD_MAX_FILE_BYTES
+        self.max_files = max_files or Config.UPLOAD_MAX_FILES
+        self.max_pages = max_pages or Config.UPLOAD_MAX_PAGES
+        self.deadline = deadline or Config.UPLOAD_DEADLINE
+        self.read_timeout = read_timeout or Config.UPLOAD_READ_TIMEOUT
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self.started = None
+        self.pages_so_far = 0
+
+    def check_deadline(self):
+        if time.monotonic() - self.started > self.deadline:
+            raise PipelineError('Превышено время загрузки файлов', 408)
+
+    def ingest(self, environ):
+        """Разбор запроса; возвращает IngestedUpload с путями в upload_folder"""
+        content_length = environ.get('CONTENT_LENGTH')
+        if content_length and int(content_length) > Config.MAX_CONTENT_LENGTH:
+            # Отказываем до чтения тела
+            raise PipelineError(f'Размер загрузки превышает '
+                                f'{Config.MAX_CONTENT_LENGTH // (1024 * 1024)} МБ', 413)
+
+        self.started = time.monotonic()
+        self.pages_so_far = 0
+        spooled = []
+
+        def stream_factory(total_content_length, content_type, filename, content_length=None):
+            if not filename:
+                # Пустое поле выбора файла
+                return io.BytesIO()
+            if len(spooled) >= self.max_files:
+                raise PipelineError(f'Можно загрузить не больше {self.max_files} файлов', 400)
+            if not (filename or '').lower().endswith('.pdf'):
+                raise PipelineError(f'Файл {filename} не является PDF', 400)
+            container = SpooledPDF(self, filename)
+            spooled.append(container)
+            return container
+
+        # Таймаут чтения на сокете клиента (gunicorn кладет его в environ)
+        sock = environ.get('gunicorn.socket')
+        previous_timeout = sock.gettimeout() if sock is not None else None
+        if sock is not None:
+            sock.settimeout(self.read_timeout)
+
+        try:
+            _, form, files = parse_form_data(
+                environ, stream_factory=stream_factory, silent=False,
+                max_content_length=Config.MAX_CONTENT_LENGTH,
+                max_form_memory_size=500 * 1024,
+                max_form_parts=self.max_files + 16)
+
+            uploads = [f for f in files.getlist('files') if f.filename]
+            if not uploads:
+                raise PipelineError('Не выбраны файлы', 400)
+            for upload in uploads:
+                upload.stream.finish()
+
+            session_id = str(uuid.uuid4())
+            paths, file_hashes = [], []
+            for i, upload in enumerate(uploads):
+                container = upload.stream
+                filename = secure_filename(upload.filename)
+                unique_filename = f"{session_id}_{i}_{filename}"  # Добавляем индекс для уникальности
+                filepath = os.path.join(self.upload_folder, unique_filename)
+                os.replace(container.path, filepath)
+                container.path = filepath
+                paths.append(filepath)
+                file_hashes.append(container.file_hash)
+                logger.info(f"Saved file {i + 1}: {unique_filename}")
+
+            # Файлы из полей с другими именами не нужны
+            for container in spooled:
+                if container.path not in paths:
+                    container.discard()
+            observe('upload', time.monotonic() - self.started, pages=self.pages_so_far,
+                    size=sum(upload.stream.size for upload in uploads))
+            return IngestedUpload(paths, file_hashes, session_id, form)
+
+        except Exception as e:
+            for container in spooled:
+                container.discard()
+            if isinstance(e, PipelineError):
+                logger.warning(f"Upload rejected: {e.message}")
+                raise
+            # Таймаут сокета werkzeug превращает в обрыв соединения
+            if isinstance(e, (socket.timeout, ClientDisconnected)):
+                raise PipelineError('Превышено время ожидания данных от клиента', 408)
+            if isinstance(e, HTTPException):
+                raise PipelineError(f'Некорректная загрузка: {e.description}', e.code or 400)
+            raise
+        finally:
+            if sock is not None:
+                try:
+                    sock.settimeout(previous_timeout)
+                except OSError:
+                    pass
@@ -0,0 +1,67 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = 'pending'
+STATE_WARMING = 'warming'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+
+class Warmup:
+    """Фоновый прогрев процесса воркера для проверки готовности (/ready).
+
+    Приложение импортируется без тяжелых библиотек, поэтому воркер
+    начинает слушать сразу, а загрузка OCR-стека идет в отдельном потоке.
+    Пока прогрев не закончен, /ready отвечает 503 и балансировщик не
+    направляет на воркер трафик; ошибка прогрева не мешает обработке
+    запросов - инициализация повторится лениво при первом обращении.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.state = STATE_PENDING
+        self.error = None
+        self.duration = None
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Запуск прогрева в текущем процессе (идемпотентно, с учетом fork)"""
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            self._started_pid = pid
+            self.state = STATE_WARMING
+            threading.Thread(target=self._run, name='warmup', daemon=True).start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.target()
+        except Exception as e:
+            self.error = str(e)
+            self.state = STATE_FAILED
+            logger.error(f"Worker warm-up failed: {e}")
+        else:
+            self.state = STATE_READY
+        self.duration = time.perf_counter() - start
+        logger.info(f"Worker {os.getpid()} warm-up finished in {self.duration:.2f}s ({self.state})")
+
+    @property
+    def ready(self):
+        return self._started_pid == os.getpid() and self.state == STATE_READY
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'state': self.state if self._started_pid == os.getpid() else STATE_PENDING,
+            'duration': round(self.duration, 3) if self.duration is not None else None,
+            'error': self.error
+        }
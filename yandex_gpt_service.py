@@ -1,57 +1,113 @@
+import json
 import requests
 import logging
+import time
 from config import Config
+from llm_cache import get_report_cache
+from llm_http_client import get_llm_client
+from metrics import observe
 
 logger = logging.getLogger(__name__)
 
 
+class YandexGPTError(Exception):
+    """Ошибка Yandex GPT API при потоковой генерации (сообщение начинается с 'ОШИБКА:')"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
 class YandexGPTService:
     def __init__(self):
         self.api_key = Config.YANDEX_API_KEY
         self.folder_id = Config.YANDEX_FOLDER_ID
-        self.base_url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+        self.base_url = Config.YANDEX_GPT_URL
 
-    def generate_report(self, system_prompt, user_prompt):
-        """Генерация отчета с помощью Yandex GPT API"""
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Api-Key {self.api_key}"
-            }
-
-            data = {
-                "modelUri": f"gpt://{self.folder_id}/yandexgpt/latest",
-                "completionOptions": {
-                    "stream": False,
-                    "temperature": 0.1,
-                    "maxTokens": 4000
+    @property
+    def client(self):
+        # Общий пул соединений и лимиты запросов процесса
+        return get_llm_client('yandex_gpt')
+
+    def _build_request(self, system_prompt, user_prompt, stream, max_tokens=None):
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Api-Key {self.api_key}"
+        }
+
+        data = {
+            "modelUri": f"gpt://{self.folder_id}/yandexgpt/latest",
+            "completionOptions": {
+                "stream": stream,
+                "temperature": 0.1,
+                "maxTokens": max_tokens or Config.LLM_MAX_TOKENS
+            },
+            "messages": [
+                {
+                    "role": "system",
+                    "text": system_prompt
                 },
-                "messages": [
-                    {
-                        "role": "system",
-                        "text": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "text": user_prompt
-                    }
-                ]
-            }
-
-            response = requests.post(
+                {
+                    "role": "user",
+                    "text": user_prompt
+                }
+            ]
+        }
+        return headers, data
+
+    @staticmethod
+    def _prompt_size(data):
+        """Размер сообщений запроса в байтах (для метрик)"""
+        return sum(len(message['text'].encode('utf-8')) for message in data['messages'])
+
+    def _cache_lookup(self, data, use_cache):
+        """(кэш, ключ, кэшированный ответ); кэш None, если он выключен или обойден"""
+        cache = get_report_cache()
+        if cache is None:
+            return None, None, None
+        if not use_cache:
+            cache.bypass()
+            return None, None, None
+        key = cache.fingerprint(data['modelUri'], data['completionOptions'], data['messages'])
+        return cache, key, cache.get(key)
+
+    def generate_report(self, system_prompt, user_prompt, max_tokens=None, use_cache=True):
+        """Генерация отчета с помощью Yandex GPT API.
+
+        При температуре 0.1 ответ на одинаковый запрос считается
+        воспроизводимым, поэтому успешные ответы берутся из кэша;
+        use_cache=False принудительно отправляет запрос в API.
+        """
+        headers, data = self._build_request(system_prompt, user_prompt, stream=False,
+                                            max_tokens=max_tokens)
+        cache, key, cached = self._cache_lookup(data, use_cache)
+        if cached is not None:
+            logger.info("Report served from LLM response cache")
+            return cached
+
+        start = time.perf_counter()
+        report = self._request_report(headers, data)
+        observe('llm.request', time.perf_counter() - start, size=self._prompt_size(data),
+                error=report.startswith("ОШИБКА:"))
+        if cache is not None and not report.startswith("ОШИБКА:"):
+            cache.set(key, report)
+        return report
+
+    def _request_report(self, headers, data):
+        try:
+            with self.client.post(
                 self.base_url,
                 headers=headers,
                 json=data,
                 timeout=120
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                logger.info("Successfully received response from Yandex GPT API")
-                return result['result']['alternatives'][0]['message']['text']
-            else:
-                logger.error(f"Yandex GPT API error: {response.status_code}")
-                return f"ОШИБКА: Yandex GPT API вернул код {response.status_code}"
+            ) as response:
+                if response.status_code == 200:
+                    result = response.json()
+                    logger.info("Successfully received response from Yandex GPT API")
+                    return result['result']['alternatives'][0]['message']['text']
+                else:
+                    logger.error(f"Yandex GPT API error: {response.status_code}")
+                    return f"ОШИБКА: Yandex GPT API вернул код {response.status_code}"
 
         except requests.exceptions.Timeout:
             logger.error("Yandex GPT API timeout")
@@ -62,3 +118,61 @@ class YandexGPTService:
         except Exception as e:
             logger.error(f"Error calling Yandex GPT API: {e}")
             return f"ОШИБКА: Неожиданная ошибка при обращении к Yandex GPT API: {str(e)}"
+
+    def stream_report(self, system_prompt, user_prompt, use_cache=True):
+        """Потоковая генерация отчета: генератор приращений текста.
+
+        API в режиме stream отдает JSON-объекты по одному на строку, в каждом
+        накопленный на текущий момент текст альтернативы. При ошибке
+        выбрасывается YandexGPTError. Ответ из кэша отдается одним куском.
+        """
+        headers, data = self._build_request(system_prompt, user_prompt, stream=True)
+        cache, key, cached = self._cache_lookup(data, use_cache)
+        if cached is not None:
+            logger.info("Report served from LLM response cache")
+            yield cached
+            return
+
+        start = time.perf_counter()
+        completed = False
+        try:
+            with self.client.post(self.base_url, headers=headers, json=data,
+                                  timeout=(10, 120), stream=True) as response:
+                if response.status_code != 200:
+                    logger.error(f"Yandex GPT API error: {response.status_code}")
+                    raise YandexGPTError(f"ОШИБКА: Yandex GPT API вернул код {response.status_code}")
+
+                text = ""
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        logger.error(f"Yandex GPT API stream error: {chunk['error']}")
+                        raise YandexGPTError(f"ОШИБКА: Yandex GPT API: {chunk['error'].get('message', chunk['error'])}")
+
+                    chunk_text = chunk['result']['alternatives'][0]['message']['text']
+                    # Обычно приходит накопленный текст; на случай дельт поддерживаем оба варианта
+                    if chunk_text.startswith(text):
+                        delta = chunk_text[len(text):]
+                        text = chunk_text
+                    else:
+                        delta = chunk_text
+                        text += chunk_text
+                    if delta:
+                        yield delta
+
+                logger.info(f"Streamed {len(text)} characters from Yandex GPT API")
+                completed = True
+                if cache is not None and text:
+                    cache.set(key, text)
+
+        except requests.exceptions.Timeout:
+            logger.error("Yandex GPT API timeout")
+            raise YandexGPTError("ОШИБКА: Превышено время ожидания ответа от Yandex GPT API")
+        except requests.exceptions.ConnectionError:
+            logger.error("Yandex GPT API connection error")
+            raise YandexGPTError("ОШИБКА: Не удается подключиться к Yandex GPT API")
+        finally:
+            observe('llm.stream', time.perf_counter() - start, size=self._prompt_size(data),
+                    error=not completed)